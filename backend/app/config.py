@@ -6,8 +6,24 @@ load_dotenv()
 class Settings:
     SUPABASE_URL = os.getenv("SUPABASE_URL", "http://127.0.0.1:54321")
     SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "")
+    # Legacy HS256 projects sign with this secret; newer projects publish JWKS instead
+    SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+    AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+    JWKS_CACHE_TTL_SECONDS = int(os.getenv("JWKS_CACHE_TTL_SECONDS", "600"))
     FRONTEND_URL = os.getenv("FRONTEND_URL")
     REDIS_HOST = os.getenv("REDIS_HOST")
+
+    # Matching: how many pre-ranked candidates go to the LLM scorer by default
+    PRERANK_TOP_N = int(os.getenv("PRERANK_TOP_N", "15"))
+    # Latency budget for a find-matches stream; unscored candidates are sent when it runs out
+    MATCH_DEADLINE_SECONDS = float(os.getenv("MATCH_DEADLINE_SECONDS", "20"))
+    # Skip LLM scoring while recent scoring calls fail or run slow this often
+    SCORING_BREAKER_WINDOW = int(os.getenv("SCORING_BREAKER_WINDOW", "20"))
+    SCORING_BREAKER_ERROR_RATE = float(os.getenv("SCORING_BREAKER_ERROR_RATE", "0.5"))
+    SCORING_BREAKER_LATENCY_SECONDS = float(os.getenv("SCORING_BREAKER_LATENCY_SECONDS", "15"))
+    SCORING_BREAKER_COOLDOWN_SECONDS = float(os.getenv("SCORING_BREAKER_COOLDOWN_SECONDS", "30"))
     
     # CORS settings
     ALLOWED_ORIGINS = [
@@ -1,5 +1,9 @@
+import hashlib
 import httpx
+import jwt
 import logging
+import time
+from collections import OrderedDict
 from typing import Any
 from fastapi import Header, HTTPException
 
@@ -7,8 +11,195 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Allow for small clock drift between us and Supabase when checking exp/nbf
+JWT_LEEWAY_SECONDS = 10
+# Algorithms accepted for JWKS keys; the algorithm always comes from the key, never the token header
+JWKS_ALGORITHMS = {"RS256", "ES256"}
+# An unknown kid forces a JWKS refetch at most this often, so clients can't make us hammer Supabase
+JWKS_MIN_REFRESH_SECONDS = 30
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared keep-alive client used for Supabase auth calls."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared auth client (used on shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class _TokenCache:
+    """Bounded TTL cache of verified tokens, keyed by token hash."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user_info = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user_info
+
+    def set(self, token: str, user_info: dict[str, Any], token_exp: float | None) -> None:
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            # Never serve a token from cache past its own expiry
+            expires_at = min(expires_at, token_exp)
+        key = self._key(token)
+        self._entries[key] = (expires_at, user_info)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_token_cache = _TokenCache(settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TTL_SECONDS)
+
+_jwks: jwt.PyJWKSet | None = None
+_jwks_fetched_at = 0.0
+_jwks_forced_at = 0.0
+
+
+async def _get_jwks(force_refresh: bool = False) -> jwt.PyJWKSet | None:
+    """Fetch the project's JWKS, cached for JWKS_CACHE_TTL_SECONDS.
+
+    Forced refreshes are throttled to one per JWKS_MIN_REFRESH_SECONDS.
+    """
+    global _jwks, _jwks_fetched_at, _jwks_forced_at
+    now = time.time()
+    stale = now - _jwks_fetched_at > settings.JWKS_CACHE_TTL_SECONDS
+    if force_refresh and now - _jwks_forced_at < JWKS_MIN_REFRESH_SECONDS:
+        force_refresh = False
+    if _jwks is not None and not stale and not force_refresh:
+        return _jwks
+    if force_refresh:
+        _jwks_forced_at = now
+
+    try:
+        response = await get_http_client().get(
+            f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+            headers={"apikey": settings.SUPABASE_ANON_KEY},
+        )
+        response.raise_for_status()
+        _jwks = jwt.PyJWKSet.from_dict(response.json())
+        _jwks_fetched_at = time.time()
+    except Exception as e:
+        # Keep serving the previous key set if we have one
+        logger.warning(f"Failed to fetch JWKS: {e}")
+    return _jwks
+
+
+async def warm_auth() -> None:
+    """Connect to Supabase and load the JWKS, so the first request verifies locally."""
+    if await _get_jwks() is None and not settings.SUPABASE_JWT_SECRET:
+        # Only remote verification is possible; at least have the connection open
+        await get_http_client().get(
+            f"{settings.SUPABASE_URL}/auth/v1/health",
+            headers={"apikey": settings.SUPABASE_ANON_KEY},
+        )
+
+
+async def _get_signing_key(token: str) -> tuple[Any, str] | None:
+    """Resolve the key and algorithm to verify a token locally, or None if unavailable.
+
+    The header only selects a key; the algorithm is fixed by that key. Raises
+    jwt.InvalidKeyError for a kid the (refreshed) JWKS doesn't contain.
+    """
+    header = jwt.get_unverified_header(token)
+
+    if header.get("alg") == "HS256":
+        if not settings.SUPABASE_JWT_SECRET:
+            return None
+        return settings.SUPABASE_JWT_SECRET, "HS256"
+
+    kid = header.get("kid")
+    if not kid:
+        return None
+
+    jwks = await _get_jwks()
+    for refresh in (False, True):
+        if refresh:
+            # Unknown kid usually means the keys were rotated
+            jwks = await _get_jwks(force_refresh=True)
+        if jwks is None:
+            return None
+        for key in jwks.keys:
+            if key.key_id == kid:
+                if key.algorithm_name not in JWKS_ALGORITHMS:
+                    raise jwt.InvalidKeyError(f"Unsupported key algorithm: {key.algorithm_name}")
+                return key.key, key.algorithm_name
+    raise jwt.InvalidKeyError(f"Unknown signing key: {kid}")
+
+
+def _claims_to_user(claims: dict[str, Any]) -> dict[str, Any]:
+    """Map JWT claims onto the shape returned by /auth/v1/user."""
+    return {
+        "id": claims.get("sub"),
+        "email": claims.get("email"),
+        "phone": claims.get("phone"),
+        "role": claims.get("role"),
+        "aud": claims.get("aud"),
+        "app_metadata": claims.get("app_metadata", {}),
+        "user_metadata": claims.get("user_metadata", {}),
+    }
+
+
+async def _verify_remote(token: str) -> dict[str, Any]:
+    """Fallback: ask Supabase to verify the token."""
+    logger.info(f"Verifying token with Supabase at {settings.SUPABASE_URL}")
+    try:
+        response = await get_http_client().get(
+            f"{settings.SUPABASE_URL}/auth/v1/user",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "apikey": settings.SUPABASE_ANON_KEY,
+            },
+        )
+        logger.info(f"Supabase auth response status: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Failed to connect to Supabase: {e}")
+        raise HTTPException(status_code=500, detail="Authentication service unavailable")
+
+    if response.status_code != 200:
+        logger.warning(f"Token verification failed: {response.status_code} - {response.text[:200]}")
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    return response.json()
+
+
 async def verify_token(authorization: str = Header(None)) -> dict[str, Any]:
-    """Verify the Supabase access token and return user info."""
+    """Verify the Supabase access token and return user info.
+
+    Tokens are verified locally against the JWT secret or the project's JWKS,
+    and cached until they expire. Supabase is only called when no local key
+    is available for the token.
+    """
     if not authorization:
         logger.warning("Request missing authorization header")
         raise HTTPException(status_code=401, detail="Missing authorization header")
@@ -18,29 +209,43 @@ async def verify_token(authorization: str = Header(None)) -> dict[str, Any]:
         raise HTTPException(status_code=401, detail="Invalid authorization format")
 
     token = authorization.replace("Bearer ", "")
-    logger.info(f"Verifying token with Supabase at {settings.SUPABASE_URL}")
+
+    if cached := _token_cache.get(token):
+        return cached
+
     logger.debug(f"Token (first 20 chars): {token[:20]}...")
 
-    # Verify token with Supabase
-    async with httpx.AsyncClient() as client:
+    try:
+        signing_key = await _get_signing_key(token)
+    except (jwt.PyJWTError, TypeError, ValueError) as e:
+        logger.warning(f"Malformed token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    if signing_key is not None:
+        key, alg = signing_key
         try:
-            response = await client.get(
-                f"{settings.SUPABASE_URL}/auth/v1/user",
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "apikey": settings.SUPABASE_ANON_KEY,
-                },
-                timeout=10.0
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[alg],
+                audience=settings.SUPABASE_JWT_AUDIENCE,
+                leeway=JWT_LEEWAY_SECONDS,
+                options={"require": ["exp", "sub"]},
             )
-            logger.info(f"Supabase auth response status: {response.status_code}")
-        except Exception as e:
-            logger.error(f"Failed to connect to Supabase: {e}")
-            raise HTTPException(status_code=500, detail="Authentication service unavailable")
-
-    if response.status_code != 200:
-        logger.warning(f"Token verification failed: {response.status_code} - {response.text[:200]}")
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+        except (jwt.PyJWTError, TypeError, ValueError) as e:
+            # PyJWT raises TypeError/ValueError for some key and algorithm mismatches
+            logger.warning(f"Token verification failed: {e}")
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        user_info = _claims_to_user(claims)
+        token_exp = float(claims["exp"])
+    else:
+        user_info = await _verify_remote(token)
+        try:
+            unverified = jwt.decode(token, options={"verify_signature": False})
+            token_exp = float(unverified["exp"]) if "exp" in unverified else None
+        except (jwt.PyJWTError, TypeError, ValueError):
+            token_exp = None
 
-    user_info = response.json()
+    _token_cache.set(token, user_info, token_exp)
     logger.info(f"Token verified successfully for user: {user_info.get('email', 'unknown')}")
     return user_info
@@ -1,11 +1,22 @@
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from app.config import settings
+from app.dependencies import close_http_client, warm_auth
 from app.routers import chat
+from app.services.circuit_breaker import scoring_breaker
+from app.services.match_runs import match_runs
+from clients import openai_client
+from clients.async_redis import close_async_redis
+from clients.llm_scheduler import llm_scheduler
+from clients.search_backend import SEARCH_BACKEND, get_search_backend
+from clients.score_cache import score_cache
 
 # Configure logging
 logging.basicConfig(
@@ -14,7 +25,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="SpareRoom Assistant API")
+# Startup doesn't wait longer than this for a slow upstream; it warms on first use instead
+WARMUP_TIMEOUT_SECONDS = 10.0
+
+
+async def _warm(name: str, warmup: Awaitable[Any]) -> None:
+    try:
+        await asyncio.wait_for(warmup, WARMUP_TIMEOUT_SECONDS)
+        logger.info(f"{name} ready")
+    except Exception as e:
+        logger.warning(f"{name} warmup failed, will connect on first use: {e!r}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm every outbound connection before serving, and close them on shutdown.
+
+    Uvicorn doesn't accept requests until startup finishes, so the first
+    request after a deploy finds the index schema loaded and pooled
+    connections to OpenAI, Redis and Supabase already open.
+    """
+    logger.info("=== SpareRoom API Starting ===")
+    logger.info(f"SUPABASE_URL: {settings.SUPABASE_URL}")
+    logger.info(f"FRONTEND_URL: {settings.FRONTEND_URL or 'Not set'}")
+    logger.info(f"Allowed CORS origins: {settings.ALLOWED_ORIGINS}")
+    logger.info("=== Configuration logged ===")
+
+    await asyncio.gather(
+        _warm(f"Search index ({SEARCH_BACKEND})", get_search_backend().connect()),
+        _warm("OpenAI", openai_client.warmup()),
+        _warm("Supabase auth", warm_auth()),
+    )
+    yield
+
+    await asyncio.gather(openai_client.aclose(), close_http_client(), close_async_redis())
+    logger.info("=== SpareRoom API stopped ===")
+
+
+app = FastAPI(title="SpareRoom Assistant API", lifespan=lifespan)
 
 # CORS configuration
 logger.info(f"CORS allowed origins: {settings.ALLOWED_ORIGINS}")
@@ -43,15 +91,6 @@ async def global_exception_handler(request: Request, exc: Exception):
         },
     )
 
-@app.on_event("startup")
-async def startup_event():
-    """Log configuration on startup."""
-    logger.info("=== SpareRoom API Starting ===")
-    logger.info(f"SUPABASE_URL: {settings.SUPABASE_URL}")
-    logger.info(f"FRONTEND_URL: {settings.FRONTEND_URL or 'Not set'}")
-    logger.info(f"Allowed CORS origins: {settings.ALLOWED_ORIGINS}")
-    logger.info("=== Configuration logged ===")
-
 @app.get("/health")
 async def health() -> dict[str, str]:
     """Health check endpoint."""
@@ -67,5 +106,17 @@ async def debug_config() -> dict[str, str]:
         "redis_host": (settings.REDIS_HOST[:20] + "...") if settings.REDIS_HOST else "Not set",
     }
 
+@app.get("/debug/metrics")
+async def debug_metrics() -> dict[str, Any]:
+    """Debug endpoint exposing in-process cache and scheduling counters."""
+    return {
+        "embedding_cache": openai_client.embedding_cache.stats(),
+        "score_cache": score_cache.stats(),
+        "openai_rate_limiter": openai_client.rate_limiter.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "match_runs": match_runs.stats(),
+        "scoring_breaker": scoring_breaker.stats(),
+    }
+
 # Include routers
 app.include_router(chat.router, prefix="/api")
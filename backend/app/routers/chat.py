@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends
+import asyncio
+
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional
 
 from app.dependencies import verify_token
 from app.services import chat_service, match_service
+from clients.llm_scheduler import set_current_user
 
 router = APIRouter()
 
@@ -19,10 +22,19 @@ class ChatRequest(BaseModel):
     """Request body for the chat endpoint."""
     message: str
     conversation_history: List[Message] = []
+    # The hardRules returned by the previous turn (as edited by the user); when
+    # omitted, rules are re-extracted from the whole conversation
+    hard_rules: Optional[List[Dict[str, Any]]] = None
 
 class ConversationRequest(BaseModel):
     """Request body for the find-matches endpoint."""
     conversation: List[Message]
+    # Number of pre-ranked candidates to send to the LLM scorer
+    top_n: Optional[int] = Field(default=None, ge=1, le=50)
+    # Rules from /chat, used to start retrieval before the preferences are generated
+    hard_rules: Optional[List[Dict[str, Any]]] = None
+    # Latency budget; unscored candidates are sent when it runs out (default MATCH_DEADLINE_SECONDS)
+    deadline_seconds: Optional[float] = Field(default=None, gt=0, le=120)
 
 # --- Endpoints ---
 
@@ -36,19 +48,29 @@ async def chat(
     This endpoint is stateless - conversation history comes from the frontend.
     Requires authentication via Bearer token.
     """
+    # OpenAI calls are queued fairly per user
+    set_current_user(user.get("id"))
     # Convert Pydantic models to dicts for the service layer
     conversation_history: List[Dict[str, str]] = [
         {"role": m.role, "content": m.content} for m in request.conversation_history
     ]
 
-    # Add new message to history for rule extraction
-    full_conversation = conversation_history + [{"role": "user", "content": request.message}]
-
-    # Extract rules from full conversation
-    rules = await chat_service.extract_rules_from_conversation(full_conversation)
-
-    # Generate response
-    assistant_message, search_suggested = await chat_service.generate_response(request.message, conversation_history, rules)
+    if request.hard_rules is None:
+        # Older clients: re-extract from the full conversation, then reply
+        full_conversation = conversation_history + [{"role": "user", "content": request.message}]
+        rules = await chat_service.extract_rules_from_conversation(full_conversation)
+        assistant_message, search_suggested = await chat_service.generate_response(
+            request.message, conversation_history, rules
+        )
+    else:
+        # Only the new message is extracted, and the reply doesn't wait for it: it is
+        # prompted with the rules known so far and sees the new message directly
+        rules, (assistant_message, search_suggested) = await asyncio.gather(
+            chat_service.update_rules(request.message, request.hard_rules),
+            chat_service.generate_response(request.message, conversation_history, request.hard_rules),
+        )
+        # The reply could only nudge on the old rules; the button can use the new ones
+        search_suggested = search_suggested or chat_service.should_suggest_search(rules, conversation_history)
 
     return {
         "assistantMessage": assistant_message,
@@ -59,21 +81,57 @@ async def chat(
 
 
 
+@router.post("/chat-stream")
+async def chat_stream(
+    request: ChatRequest,
+    user: Dict[str, Any] = Depends(verify_token)
+):
+    """Streaming variant of /chat: assistant tokens are sent as they are generated.
+
+    Events: token*, rules, searchSuggested (in any order), then done.
+    Requires authentication via Bearer token.
+    """
+    set_current_user(user.get("id"))
+    conversation_history: List[Dict[str, str]] = [
+        {"role": m.role, "content": m.content} for m in request.conversation_history
+    ]
+
+    return StreamingResponse(
+        chat_service.stream_chat(request.message, conversation_history, request.hard_rules),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+
 @router.post("/find-matches-stream")
 async def find_matches_stream(
     request: ConversationRequest,
+    http_request: Request,
     user: Dict[str, Any] = Depends(verify_token)
 ):
     """Streaming RAG pipeline: returns results as they are scored.
 
+    A new request from the same user cancels their previous one, and
+    scoring stops when the client disconnects.
     Requires authentication via Bearer token.
     """
+    set_current_user(user.get("id"))
     conversation = [
         {"role": m.role, "content": m.content} for m in request.conversation
     ]
     
     return StreamingResponse(
-        match_service.stream_matches(conversation),
+        match_service.stream_matches(
+            conversation,
+            top_n=request.top_n,
+            hard_rules=request.hard_rules,
+            user_id=user.get("id"),
+            is_disconnected=http_request.is_disconnected,
+            deadline_seconds=request.deadline_seconds,
+        ),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
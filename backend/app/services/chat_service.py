@@ -1,11 +1,16 @@
+import json
+import asyncio
+import logging
 from datetime import date
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, AsyncGenerator
 
 # Note: We assume clients are available at the top level for now, 
 # but eventually they might move to app/clients.
 # For now we import from the root 'clients' package.
 from clients import openai_client
 
+logger = logging.getLogger(__name__)
+
 SYSTEM_PROMPT = """You are a helpful SpareRoom assistant helping users find rooms to rent in London.
 
 Today's date: {today}
@@ -33,18 +38,38 @@ CONVERSATION FLOW:
 Be friendly and natural. The goal is to help, not interrogate."""
 
 async def extract_rules_from_conversation(conversation: List[Dict[str, str]]) -> List[Dict[str, Any]]:
-    """Extract rules from the full conversation history."""
+    """Extract rules from the full conversation history.
+
+    Cost grows with the conversation; used only when the client doesn't
+    send its current rules (see update_rules).
+    """
     all_user_text = " ".join(
         m["content"] for m in conversation if m["role"] == "user"
     )
     return await openai_client.extract_rules(all_user_text, [])
 
-async def generate_response(
+async def update_rules(message: str, existing_rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Apply the new message to the existing rules (only the message is sent, not the history)."""
+    return await openai_client.extract_rules(message, existing_rules)
+
+def should_suggest_search(rules: List[Dict[str, Any]], conversation_history: List[Dict[str, str]]) -> bool:
+    """Heuristic for suggesting search.
+
+    Suggest search if we have budget + location OR decent conversation
+    depth (> 2 exchanges, i.e. 4 messages of history) + some rules.
+    """
+    has_budget = any(r['field'] == 'max_budget' for r in rules)
+    has_location = any(r['field'] in ['target_location', 'max_commute', 'location', 'postcode'] for r in rules)
+    if has_budget and has_location:
+        return True
+    return len(conversation_history) >= 4 and len(rules) > 0
+
+def build_response_messages(
     message: str,
     conversation_history: List[Dict[str, str]],
     rules: List[Dict[str, Any]]
-) -> tuple[str, bool]:
-    """Generate assistant response based on conversation history and rules."""
+) -> tuple[List[Dict[str, str]], bool]:
+    """Build the assistant prompt; also returns whether it nudges the user to search."""
     rules_text = ", ".join([f"{r['field']}: {r['value']}" for r in rules]) or "None yet"
     today = date.today().strftime("%A, %d %B %Y")
     system = SYSTEM_PROMPT.format(rules=rules_text, today=today)
@@ -59,18 +84,7 @@ async def generate_response(
     # Add the current message
     messages.append({"role": "user", "content": message})
 
-    # Heuristic for suggesting search:
-    # 1. We have at least 2 exchanges (4 messages including history)
-    # 2. We have some rules extracted (at least budget is usually key)
-    has_budget = any(r['field'] == 'max_budget' for r in rules)
-    has_location = any(r['field'] in ['target_location', 'max_commute', 'location', 'postcode'] for r in rules)
-    
-    # Suggest search if we have budget + location OR decent conversation depth (> 2 exchanges) + some rules
-    search_suggested = False
-    if has_budget and has_location:
-        search_suggested = True
-    elif len(conversation_history) >= 4 and len(rules) > 0:
-        search_suggested = True
+    search_suggested = should_suggest_search(rules, conversation_history)
 
     # If search is suggested, instruct the LLM to nudge the user
     if search_suggested:
@@ -79,6 +93,79 @@ async def generate_response(
             "content": "You have gathered enough information (budget, location, etc). Explicitly suggest that the user clicks the 'Find Matches' button now to see available properties."
         })
 
+    return messages, search_suggested
+
+async def generate_response(
+    message: str,
+    conversation_history: List[Dict[str, str]],
+    rules: List[Dict[str, Any]]
+) -> tuple[str, bool]:
+    """Generate assistant response based on conversation history and rules."""
+    messages, search_suggested = build_response_messages(message, conversation_history, rules)
+
     response_text = await openai_client.chat(messages)
 
     return response_text, search_suggested
+
+async def stream_chat(
+    message: str,
+    conversation_history: List[Dict[str, str]],
+    hard_rules: Optional[List[Dict[str, Any]]]
+) -> AsyncGenerator[str, None]:
+    """Streaming chat turn as SSE events.
+
+    `token` events carry the reply as it is generated. `rules` (the updated
+    hardRules) and `searchSuggested` are sent once extraction finishes, which
+    runs alongside the reply, so they may arrive before, between or after
+    tokens. `done` carries the full reply.
+    """
+    if hard_rules is None:
+        # Older clients: rules come from the full conversation, before the reply starts
+        full_conversation = conversation_history + [{"role": "user", "content": message}]
+        known_rules = await extract_rules_from_conversation(full_conversation)
+    else:
+        known_rules = hard_rules
+    messages, nudged = build_response_messages(message, conversation_history, known_rules)
+
+    events: asyncio.Queue[Optional[Dict[str, Any]]] = asyncio.Queue()
+    reply: List[str] = []
+
+    async def send_tokens() -> None:
+        try:
+            async for token in openai_client.chat_stream(messages):
+                reply.append(token)
+                await events.put({"type": "token", "content": token})
+        except Exception as e:
+            logger.error(f"Chat stream failed: {e}")
+            await events.put({"type": "error", "detail": "Response generation failed"})
+        finally:
+            await events.put(None)
+
+    async def send_rules() -> None:
+        rules = known_rules
+        try:
+            if hard_rules is not None:
+                rules = await update_rules(message, hard_rules)
+        except Exception as e:
+            # Keep the rules the client already has rather than failing the turn
+            logger.warning(f"Rule extraction failed, keeping previous rules: {e}")
+        finally:
+            await events.put({"type": "rules", "hardRules": rules})
+            suggested = nudged or should_suggest_search(rules, conversation_history)
+            await events.put({"type": "searchSuggested", "searchSuggested": suggested})
+            await events.put(None)
+
+    tasks = [asyncio.create_task(send_tokens()), asyncio.create_task(send_rules())]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event = await events.get()
+            if event is None:
+                remaining -= 1
+                continue
+            yield f"data: {json.dumps(event)}\n\n"
+        yield f"data: {json.dumps({'type': 'done', 'assistantMessage': ''.join(reply)})}\n\n"
+    finally:
+        # The client may disconnect mid-stream; stop both calls
+        for task in tasks:
+            task.cancel()
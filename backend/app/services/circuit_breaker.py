@@ -0,0 +1,106 @@
+import time
+import logging
+import statistics
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Don't judge the upstream on fewer calls than this
+MIN_CALLS = 5
+
+
+class CircuitBreaker:
+    """Trips when recent calls fail or run slow too often, and stays open for a cooldown.
+
+    Judged on a rolling window of the last `window` calls: the breaker opens
+    when the error rate or the median latency is above its threshold. After
+    the cooldown the window is cleared and calls are let through again, so
+    the next `MIN_CALLS` decide whether it re-opens.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int,
+        max_error_rate: float,
+        max_latency_seconds: float,
+        cooldown_seconds: float,
+    ) -> None:
+        self.name = name
+        self.max_error_rate = max_error_rate
+        self.max_latency_seconds = max_latency_seconds
+        self.cooldown_seconds = cooldown_seconds
+        # (succeeded, seconds) per call
+        self._calls: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self.trips = 0
+        self.rejected = 0
+
+    def _error_rate(self) -> float:
+        return sum(not ok for ok, _ in self._calls) / len(self._calls) if self._calls else 0.0
+
+    def _median_latency(self) -> float:
+        return statistics.median(seconds for _, seconds in self._calls) if self._calls else 0.0
+
+    def is_open(self) -> bool:
+        if self._opened_at is None:
+            return False
+        if time.monotonic() - self._opened_at < self.cooldown_seconds:
+            return True
+        logger.info(f"Circuit {self.name} closing after {self.cooldown_seconds:.0f}s cooldown")
+        self._opened_at = None
+        self._calls.clear()
+        return False
+
+    def allow(self) -> bool:
+        """Whether to make the call at all; counts the ones turned away."""
+        if self.is_open():
+            self.rejected += 1
+            return False
+        return True
+
+    def record(self, succeeded: bool, seconds: float) -> None:
+        """Record a finished (or abandoned) call and trip the breaker if the window is unhealthy."""
+        self._calls.append((succeeded, seconds))
+        if self._opened_at is not None or len(self._calls) < MIN_CALLS:
+            return
+        error_rate, latency = self._error_rate(), self._median_latency()
+        if error_rate > self.max_error_rate or latency > self.max_latency_seconds:
+            logger.warning(
+                f"Circuit {self.name} open for {self.cooldown_seconds:.0f}s: "
+                f"error rate {error_rate:.0%}, median latency {latency:.1f}s"
+            )
+            self._opened_at = time.monotonic()
+            self.trips += 1
+
+    def record_abandoned(self, seconds: float) -> None:
+        """Record a call given up on after `seconds`, which only bounds its latency from below.
+
+        It counts as a failure once it has run past the latency threshold, so
+        a caller with a short deadline doesn't trip the breaker on its own.
+        """
+        if seconds >= self.max_latency_seconds:
+            self.record(False, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": self.is_open(),
+            "calls_in_window": len(self._calls),
+            "error_rate": round(self._error_rate(), 3),
+            "median_latency_seconds": round(self._median_latency(), 3),
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+# Listing scoring (the slow vision calls); find-matches skips it while this is open
+scoring_breaker = CircuitBreaker(
+    "scoring",
+    window=settings.SCORING_BREAKER_WINDOW,
+    max_error_rate=settings.SCORING_BREAKER_ERROR_RATE,
+    max_latency_seconds=settings.SCORING_BREAKER_LATENCY_SECONDS,
+    cooldown_seconds=settings.SCORING_BREAKER_COOLDOWN_SECONDS,
+)
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How often a running find-matches checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class RunCancelled(Exception):
+    """Raised inside a run that was stopped because its client left or started a new one."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class MatchRun:
+    """One find-matches stream, which can be stopped from outside.
+
+    Anything the stream waits on goes through `wait`, so a cancellation
+    interrupts it at once rather than at the next event it sends.
+    """
+
+    def __init__(self, user_id: Optional[str]) -> None:
+        self.user_id = user_id
+        self.reason: Optional[str] = None
+        self._cancelled = asyncio.Event()
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str) -> None:
+        if not self.cancelled:
+            self.reason = reason
+            self._cancelled.set()
+
+    def watch(self, is_disconnected: Callable[[], Awaitable[bool]]) -> None:
+        """Cancel the run once `is_disconnected()` (e.g. Request.is_disconnected) says the client left.
+
+        Starlette only notices a disconnect when the next event fails to
+        send, which can be many seconds of scoring away.
+        """
+        async def poll() -> None:
+            while not self.cancelled:
+                if await is_disconnected():
+                    self.cancel("disconnected")
+                    return
+                await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+        self._watcher = asyncio.create_task(poll())
+
+    async def wait(self, awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Await `awaitable` unless the run is cancelled first (RunCancelled) or `timeout` passes (TimeoutError).
+
+        Either way `awaitable` is cancelled.
+        """
+        task = asyncio.ensure_future(awaitable)
+        cancelled = asyncio.create_task(self._cancelled.wait())
+        try:
+            await asyncio.wait([task, cancelled], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancelled.cancel()
+            unfinished = not task.done()
+            if unfinished:
+                task.cancel()
+        if unfinished:
+            if self.cancelled:
+                raise RunCancelled(self.reason or "cancelled")
+            raise TimeoutError()
+        return task.result()
+
+    def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+
+
+class MatchRuns:
+    """The live find-matches run of each user, and what stopping runs early has saved.
+
+    Starting a run for a user replaces (cancels) the one they already had,
+    so clicking "Find Matches" again doesn't leave the old run scoring.
+    """
+
+    def __init__(self) -> None:
+        self._active: Dict[str, MatchRun] = {}
+        self.started = 0
+        self.completed = 0
+        self.stopped: Counter[str] = Counter()
+        self.scoring_calls = 0
+        # Scoring calls cancelled before they returned, by why they were cancelled
+        self.calls_saved: Counter[str] = Counter()
+
+    def begin(self, user_id: Optional[str] = None) -> MatchRun:
+        run = MatchRun(user_id)
+        if user_id is not None:
+            if previous := self._active.get(user_id):
+                logger.info(f"Replacing find-matches run for user {user_id}")
+                previous.cancel("replaced")
+            self._active[user_id] = run
+        self.started += 1
+        return run
+
+    def end(self, run: MatchRun, completed: bool) -> None:
+        run.close()
+        if run.user_id is not None and self._active.get(run.user_id) is run:
+            del self._active[run.user_id]
+        if completed:
+            self.completed += 1
+        else:
+            self.stopped[run.reason or "closed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self._active),
+            "started": self.started,
+            "completed": self.completed,
+            "stopped": dict(self.stopped),
+            "scoring_calls": self.scoring_calls,
+            "scoring_calls_saved": sum(self.calls_saved.values()),
+            "scoring_calls_saved_by_reason": dict(self.calls_saved),
+        }
+
+
+match_runs = MatchRuns()
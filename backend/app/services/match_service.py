@@ -1,9 +1,32 @@
+import time
 import asyncio
 import json
-from typing import Any, List, Dict, Optional, AsyncGenerator
+import logging
+from typing import Any, Awaitable, Callable, List, Dict, Optional, AsyncGenerator
 
+from redis.exceptions import ResponseError
+
+from app.config import settings
+from app.services.circuit_breaker import scoring_breaker
+from app.services.match_runs import RunCancelled, match_runs
+from app.services.ranking_service import prerank
+from app.services.stage_graph import StageGraph
 from clients import openai_client
-from clients.redis_client import redis_client
+from clients.rate_limiter import UpstreamTimer, upstream_timer
+from clients.search_backend import ListingFilter, VectorSizeChanged, get_search_backend
+from clients.score_cache import (
+    score_cache,
+    conversation_fingerprint,
+    preferences_fingerprint,
+)
+
+logger = logging.getLogger(__name__)
+
+# Scored results waiting to be sent; when a slow client lets it fill up, scoring tasks wait
+SCORE_QUEUE_SIZE = 8
+
+# Redis by default; SEARCH_BACKEND=numpy searches a local snapshot in-process
+search_backend = get_search_backend()
 
 # Filtering helpers
 def _matches_yes(value: Any) -> bool:
@@ -20,8 +43,34 @@ def _matches_value(listing_val: Any, ideal_val: str) -> bool:
     return ideal_val.lower() in str(listing_val).lower()
 
 
+BOOLEAN_FILTER_FIELDS = ["pets_ok", "couples_ok", "bills_included", "parking"]
+TAG_FILTER_FIELDS = ["property_type", "furnishings"]
+
+
+def build_filter(ideal: Dict[str, Any]) -> Optional[ListingFilter]:
+    """Build the search pre-filter equivalent to filter_by_ideal.
+
+    Tag values are indexed lowercase; rent is filtered on the monthly
+    rent_pcm field, so weekly rents are compared correctly.
+    """
+    filters = ListingFilter(
+        max_rent=ideal.get("max_rent") or None,
+        min_rent=ideal.get("min_rent") or None,
+        required_yes=tuple(field for field in BOOLEAN_FILTER_FIELDS if ideal.get(field) == "Yes"),
+        tags=tuple(
+            (field, str(value).strip().lower())
+            for field in TAG_FILTER_FIELDS
+            if (value := ideal.get(field))
+        ),
+    )
+    return None if filters.is_empty() else filters
+
+
 def filter_by_ideal(listings: List[Dict[str, Any]], ideal: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Filter listings based on ideal listing criteria."""
+    """Filter listings based on ideal listing criteria.
+
+    Used when the index predates the filter fields and pre-filtering fails.
+    """
     filtered = listings
 
     # Rent filters
@@ -32,77 +81,379 @@ def filter_by_ideal(listings: List[Dict[str, Any]], ideal: Dict[str, Any]) -> Li
         filtered = [l for l in filtered if l.get("price", 0) >= min_rent]
 
     # Boolean filters: strict "Yes" requirement
-    boolean_fields = ["pets_ok", "couples_ok", "bills_included", "parking"]
-    for field in boolean_fields:
+    for field in BOOLEAN_FILTER_FIELDS:
         if ideal.get(field) == "Yes":
             filtered = [l for l in filtered if _matches_yes(l.get(field))]
 
     # String match filters: fuzzy contains check
-    string_fields = ["property_type", "furnishings"]
-    for field in string_fields:
+    for field in TAG_FILTER_FIELDS:
         if value := ideal.get(field):
             filtered = [l for l in filtered if _matches_value(l.get(field), value)]
 
     return filtered
 
 
-async def _prepare_candidates(conversation: List[Dict[str, str]]) -> tuple[Dict[str, Any], str, List[Dict[str, Any]]]:
-    """Common pipeline steps 1-3: Generate Ideal -> Vector Search -> Filter."""
-    # 1. Generate ideal listing and summary in parallel
+async def _generate_preferences(
+    conversation: List[Dict[str, str]],
+    generation: int
+) -> tuple[Dict[str, Any], str]:
+    """Generate ideal listing and summary, memoised per conversation.
+
+    Re-running the same conversation must yield the same preferences,
+    otherwise every cached score would miss on the preferences fingerprint.
+    """
+    key = score_cache.preferences_key(generation, conversation_fingerprint(conversation))
+    if cached := await score_cache.get_preferences(key):
+        return cached
+
     ideal, summary = await asyncio.gather(
         openai_client.generate_ideal_listing(conversation),
         openai_client.summarize_conversation(conversation)
     )
+    await score_cache.set_preferences(key, ideal, summary)
+    return ideal, summary
+
+
+# Boolean hardRules from /chat and the ideal-listing field each one requires
+RULE_BOOLEAN_FIELDS = {
+    "pets_allowed": "pets_ok",
+    "couples_ok": "couples_ok",
+    "bills_included": "bills_included",
+    "parking": "parking",
+}
+
+
+def ideal_from_rules(rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Draft ideal listing from the hardRules the client already has from /chat.
+
+    Covers only what the rules state; the generated ideal listing replaces it.
+    """
+    ideal: Dict[str, Any] = {}
+    for rule in rules:
+        field, value = rule.get("field"), rule.get("value")
+        is_true = value is True or _matches_yes(value)
+        if field == "max_budget":
+            try:
+                ideal["max_rent"] = int(float(value))
+            except (TypeError, ValueError):
+                pass
+        elif field in RULE_BOOLEAN_FIELDS and is_true:
+            ideal[RULE_BOOLEAN_FIELDS[field]] = "Yes"
+        elif field == "furnished" and is_true:
+            ideal["furnishings"] = "Furnished"
+    return ideal
+
+
+def draft_query(conversation: List[Dict[str, str]]) -> str:
+    """Text to embed before the summary exists: the user's own turns."""
+    return " ".join(m["content"] for m in conversation if m["role"] == "user")
+
+
+async def _search(query_text: str, ideal: Dict[str, Any], dimensions: int) -> List[Dict[str, Any]]:
+    """Embed the query and run a vector search pre-filtered on the ideal listing's hard requirements."""
+    try:
+        return await _search_embedded(query_text, ideal, dimensions)
+    except VectorSizeChanged as e:
+        # Re-indexed at a new size since startup: embed again at the size it expects now
+        logger.warning(f"Search index vector size changed, re-embedding the query: {e}")
+        return await _search_embedded(query_text, ideal, e.dims)
+
+
+async def _search_embedded(query_text: str, ideal: Dict[str, Any], dimensions: int) -> List[Dict[str, Any]]:
+    query_embedding = await openai_client.embed(query_text, dimensions=dimensions)
+    try:
+        return await search_backend.search(query_embedding, top_k=50, filters=build_filter(ideal))
+    except ResponseError as e:
+        logger.warning(f"Pre-filtered search failed, filtering in Python instead: {e}")
+        candidates = await search_backend.search(query_embedding, top_k=50)
+        return filter_by_ideal(candidates, ideal)
 
-    # 2. Vector search
-    query_embedding = await openai_client.embed(summary)
-    candidates = redis_client.search(query_embedding, top_k=50)
 
-    # 3. Filter based on ideal listing
-    filtered = filter_by_ideal(candidates, ideal)
-    
-    return ideal, summary, filtered
+class _Scorer:
+    """One scoring task per listing, started as soon as that listing is known to need a score.
 
+    Cached scores resolve immediately; the rest go to the LLM unless the
+    scoring circuit breaker is open. Each task puts `(listing id, outcome)`
+    on the bounded `results` queue.
+    """
 
+    def __init__(self, generation: int, ideal: Dict[str, Any], summary: str) -> None:
+        self.generation = generation
+        self.ideal = ideal
+        self.summary = summary
+        self.preferences_hash = preferences_fingerprint(ideal, summary)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Listings whose score is known, even if it is still waiting for room in the queue
+        self.settled: set[str] = set()
+        # Upstream timing of each LLM call, so the breaker judges OpenAI and not our own queueing
+        self.upstream: Dict[str, UpstreamTimer] = {}
+        self.results: asyncio.Queue = asyncio.Queue(maxsize=SCORE_QUEUE_SIZE)
 
+    def _keys(self, listings: List[Dict[str, Any]]) -> List[str]:
+        return [score_cache.score_key(self.generation, listing, self.preferences_hash) for listing in listings]
 
+    async def cached(self, listings: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Scores already in the cache, by listing id; nothing is sent to the LLM."""
+        cached_scores = await score_cache.get_scores(self._keys(listings))
+        return {listing["id"]: score for listing, score in zip(listings, cached_scores) if score is not None}
 
-async def stream_matches(conversation: List[Dict[str, str]]) -> AsyncGenerator[str, None]:
-    """Streaming RAG pipeline: returns results as they are scored."""
-    
-    # 1-3. Prepare candidates
-    ideal, summary, to_score = await _prepare_candidates(conversation)
+    async def start(self, listings: List[Dict[str, Any]]) -> None:
+        new = [listing for listing in listings if listing["id"] not in self.tasks]
+        if not new:
+            return
+        keys = self._keys(new)
+        cached_scores = await score_cache.get_scores(keys)
+        for listing, key, cached in zip(new, keys, cached_scores):
+            if cached is not None:
+                self.settled.add(listing["id"])
+            self.tasks[listing["id"]] = asyncio.create_task(self._score(listing, key, cached))
 
-    # Send initial data with candidates (unscored)
-    yield f"data: {json.dumps({'type': 'init', 'total': len(to_score), 'idealListing': ideal, 'summary': summary})}\n\n"
+    async def _score(self, listing: Dict[str, Any], key: str, cached: Optional[Dict[str, Any]]) -> None:
+        outcome = await self._outcome(listing, key, cached)
+        self.settled.add(listing["id"])
+        await self.results.put((listing["id"], outcome))
 
-    # 4. Score listings in parallel, yielding results as they complete
-    async def score_one(listing: Dict[str, Any], index: int) -> Optional[Dict[str, Any]]:
+    async def _outcome(
+        self,
+        listing: Dict[str, Any],
+        key: str,
+        cached: Optional[Dict[str, Any]]
+    ) -> Optional[tuple[Dict[str, Any], bool]]:
+        if cached is not None:
+            return cached, True
+        if not scoring_breaker.allow():
+            return None
+        match_runs.scoring_calls += 1
+        with upstream_timer() as timer:
+            self.upstream[listing["id"]] = timer
+            try:
+                score = await openai_client.score_listing(
+                    conversation_summary=self.summary,
+                    ideal_listing=self.ideal,
+                    listing_summary=listing["summary"],
+                    image_urls=listing.get("image_urls", [])
+                )
+            except Exception as e:
+                # The client has already retried anything retryable
+                logger.error(f"Scoring failed for listing {listing.get('id')}: {e}")
+                scoring_breaker.record(False, timer.elapsed())
+                return None
+        scoring_breaker.record(True, timer.elapsed())
+        await score_cache.set_score(key, score)
+        return score, False
+
+    def keep_only(self, listing_ids: set[str], reason: str) -> int:
+        """Cancel scoring for listings not in `listing_ids`; returns how many were dropped.
+
+        LLM calls that hadn't returned yet are counted as saved, under `reason`.
+        Calls abandoned at the deadline while with OpenAI (not while still
+        queued) are reported to the circuit breaker.
+        """
+        dropped = [listing_id for listing_id in self.tasks if listing_id not in listing_ids]
+        for listing_id in dropped:
+            task = self.tasks.pop(listing_id)
+            if listing_id not in self.settled:
+                match_runs.calls_saved[reason] += 1
+                timer = self.upstream.get(listing_id)
+                if reason == "deadline" and timer is not None and timer.sent_at is not None:
+                    scoring_breaker.record_abandoned(timer.elapsed())
+            task.cancel()
+        return len(dropped)
+
+
+async def stream_matches(
+    conversation: List[Dict[str, str]],
+    top_n: Optional[int] = None,
+    hard_rules: Optional[List[Dict[str, Any]]] = None,
+    user_id: Optional[str] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    deadline_seconds: Optional[float] = None
+) -> AsyncGenerator[str, None]:
+    """Streaming RAG pipeline: returns results as they are scored.
+
+    Stages run as a dependency graph rather than a chain:
+
+        preferences (ideal + summary LLM calls) -> summary search -> final candidates
+        draft search (user turns + hardRules)   -> preview, speculative scoring
+
+    The draft search needs no LLM call, so a `preview` of candidates can be
+    sent while the preferences are generated. Once they arrive, draft
+    candidates that pass the ideal listing's filters start scoring while the
+    summary search runs; the summary search decides the final candidates
+    and speculative scores outside them are cancelled. Only the top_n
+    pre-ranked candidates are scored. The `done` event carries per-stage
+    timings.
+
+    The stream finishes within `deadline_seconds` (MATCH_DEADLINE_SECONDS by
+    default). When time runs out, outstanding scoring is cancelled and the
+    candidates without a score are sent in pre-ranked order in an
+    `unscored` event; if the preferences or summary search aren't ready,
+    the draft search's candidates are used. While the scoring circuit
+    breaker is open only cached scores are used. `done.degraded` says why
+    (`deadline`, `circuit_open`, `preferences_failed`, `search_failed`), or
+    is null.
+
+    A new run for the same `user_id` replaces this one (which then sends a
+    `cancelled` event), and `is_disconnected` is polled so a closed tab
+    stops the scoring calls straight away.
+    """
+    limit = top_n or settings.PRERANK_TOP_N
+    deadline = time.monotonic() + (deadline_seconds or settings.MATCH_DEADLINE_SECONDS)
+    draft_ideal = ideal_from_rules(hard_rules or [])
+    graph = StageGraph()
+    run = match_runs.begin(user_id)
+    if is_disconnected is not None:
+        run.watch(is_disconnected)
+    scorer: Optional[_Scorer] = None
+    completed = False
+    degraded: Optional[str] = "circuit_open" if scoring_breaker.is_open() else None
+
+    def time_left() -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    try:
+        generation = await score_cache.generation()
+        dimensions = graph.stage("dimensions", search_backend.vector_dimensions)
+        preferences = graph.stage("preferences", lambda: _generate_preferences(conversation, generation))
+        refined = graph.stage(
+            "search",
+            lambda prefs, dims: _search(prefs[1], prefs[0], dims),
+            preferences, dimensions
+        )
+        draft = None
+        if query := draft_query(conversation):
+            draft = graph.stage("draft_search", lambda dims: _search(query, draft_ideal, dims), dimensions)
+
+            # Preview from the draft search while the preferences are still being generated
+            try:
+                await run.wait(asyncio.wait([draft, refined], return_when=asyncio.FIRST_COMPLETED), timeout=time_left())
+            except TimeoutError:
+                pass
+            if draft.done() and not refined.done() and not draft.exception():
+                preview = prerank(draft.result(), draft_ideal)[:limit]
+                graph.mark("preview")
+                yield f"data: {json.dumps({'type': 'preview', 'preranked': preview})}\n\n"
+
+        ideal, summary = draft_ideal, ""
         try:
-            score = await openai_client.score_listing(
-                conversation_summary=summary,
-                ideal_listing=ideal,
-                listing_summary=listing["summary"],
-                image_urls=listing.get("image_urls", [])
-            )
-            return {
-                "index": index,
-                "listing": listing,
+            ideal, summary = await run.wait(preferences, timeout=time_left())
+            scorer = _Scorer(generation, ideal, summary)
+
+            # Speculatively score draft candidates that already satisfy the ideal listing
+            if degraded is None and draft is not None and draft.done() and not draft.exception() and not refined.done():
+                likely = prerank(filter_by_ideal(draft.result(), ideal), ideal)[:limit]
+                await scorer.start(likely)
+                graph.mark("speculative_scoring")
+
+            # The summary search decides what is scored
+            candidates = await run.wait(refined, timeout=time_left())
+        except RunCancelled:
+            raise
+        except Exception as e:
+            # Fall back to the draft search rather than send nothing
+            if draft is None or not draft.done() or draft.cancelled() or draft.exception():
+                raise
+            if isinstance(e, TimeoutError):
+                degraded = "deadline"
+            elif preferences.done() and not preferences.cancelled() and preferences.exception():
+                degraded = "preferences_failed"
+            else:
+                degraded = "search_failed"
+            logger.warning(f"find-matches using the draft search ({degraded}): {e!r}")
+            candidates = filter_by_ideal(draft.result(), ideal)
+            if scorer is None:
+                scorer = _Scorer(generation, ideal, summary)
+
+        to_score = prerank(candidates, ideal)[:limit]
+        speculative = len(scorer.tasks)
+        wasted = scorer.keep_only({listing["id"] for listing in to_score}, "speculative")
+        if degraded is None:
+            await scorer.start(to_score)
+        else:
+            scorer.keep_only(set(), degraded)
+
+        # Send initial data with candidates in pre-ranked order (unscored)
+        init = {
+            'type': 'init',
+            'total': len(to_score),
+            'idealListing': ideal,
+            'summary': summary,
+            'preranked': to_score,
+        }
+        graph.mark("init")
+        yield f"data: {json.dumps(init)}\n\n"
+
+        index_of = {listing["id"]: i for i, listing in enumerate(to_score)}
+        listing_of = {listing["id"]: listing for listing in to_score}
+        scored: set[str] = set()
+
+        def score_event(listing_id: str, score: Dict[str, Any], cached: bool) -> str:
+            if not scored:
+                graph.mark("first_score")
+            scored.add(listing_id)
+            result = {
+                "index": index_of[listing_id],
+                "listing": listing_of[listing_id],
                 "score": score["overall_score"],
-                "reasoning": score
+                "reasoning": score,
+                "cached": cached
             }
-        except Exception as e:
-            print(f"Scoring error: {e}")
-            return None
+            return f"data: {json.dumps({'type': 'score', 'match': result})}\n\n"
+
+        if degraded is not None:
+            # No LLM scoring, but cached scores cost nothing
+            for listing_id, score in (await scorer.cached(to_score)).items():
+                yield score_event(listing_id, score, True)
 
-    # Create tasks for all listings
-    tasks = [asyncio.create_task(score_one(listing, i)) for i, listing in enumerate(to_score)]
+        # Yield results as they complete (cached ones first) until the deadline
+        remaining = set(scorer.tasks)
+        while remaining:
+            try:
+                if scorer.results.empty():
+                    listing_id, outcome = await run.wait(scorer.results.get(), timeout=time_left())
+                else:
+                    listing_id, outcome = scorer.results.get_nowait()
+            except TimeoutError:
+                degraded = "deadline"
+                # Scores that finished just as time ran out still go out
+                while not scorer.results.empty():
+                    listing_id, outcome = scorer.results.get_nowait()
+                    if listing_id in remaining and outcome:
+                        remaining.discard(listing_id)
+                        yield score_event(listing_id, *outcome)
+                scorer.keep_only(scored, "deadline")
+                break
+            if listing_id not in remaining:
+                # Finished speculatively before the final cut dropped it
+                continue
+            remaining.discard(listing_id)
+            if outcome:
+                yield score_event(listing_id, *outcome)
 
-    # Yield results as they complete
-    for coro in asyncio.as_completed(tasks):
-        result = await coro
-        if result:
-            yield f"data: {json.dumps({'type': 'score', 'match': result})}\n\n"
+        # Whatever has no score keeps its pre-ranked (vector distance + heuristics) order
+        unscored = [
+            {"index": index_of[listing["id"]], "listing": listing}
+            for listing in to_score if listing["id"] not in scored
+        ]
+        if unscored:
+            reason = degraded or "scoring_failed"
+            yield f"data: {json.dumps({'type': 'unscored', 'reason': reason, 'listings': unscored})}\n\n"
 
-    # Send done signal
-    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+        # Send done signal
+        graph.mark("done")
+        graph.log("find-matches")
+        completed = True
+        stats = {"speculative": speculative, "speculative_wasted": wasted, "unscored": len(unscored)}
+        done = {'type': 'done', 'timings': graph.timings, 'stats': stats, 'degraded': degraded}
+        yield f"data: {json.dumps(done)}\n\n"
+    except RunCancelled as e:
+        logger.info(f"find-matches stopped early: {e.reason}")
+        if e.reason == "replaced":
+            # This client may still be reading; tell it the stream won't finish
+            yield f"data: {json.dumps({'type': 'cancelled', 'reason': e.reason})}\n\n"
+    finally:
+        # Stop everything still running if the client disconnects
+        graph.cancel()
+        if scorer is not None:
+            scorer.keep_only(set(), run.reason or "closed")
+        match_runs.end(run, completed)
@@ -0,0 +1,104 @@
+import re
+from typing import Any, List, Dict, Optional
+
+# Relative weight of each pre-ranking signal (sums to 1)
+VECTOR_WEIGHT = 0.4
+RENT_WEIGHT = 0.2
+SOFT_MATCH_WEIGHT = 0.25
+POSTCODE_WEIGHT = 0.15
+
+# Score used when a signal can't be computed, so it neither helps nor hurts
+NEUTRAL = 0.5
+
+BOOLEAN_FIELDS = ["pets_ok", "couples_ok", "bills_included", "parking"]
+STRING_FIELDS = ["property_type", "furnishings", "gender", "living_room", "occupation", "room_type"]
+
+_POSTCODE_RE = re.compile(r"^([A-Z]{1,2})(\d{1,2}[A-Z]?)")
+
+
+def _is_yes(value: Any) -> bool:
+    return str(value).lower().strip() in ["yes", "y", "true", "1"]
+
+
+def _postcode_parts(postcode: Any) -> Optional[tuple[str, str]]:
+    """Split a postcode into (area, district), e.g. 'SW17 0AB' -> ('SW', 'SW17')."""
+    if not postcode:
+        return None
+    match = _POSTCODE_RE.match(str(postcode).upper().replace(" ", ""))
+    if not match:
+        return None
+    return match.group(1), match.group(1) + match.group(2)
+
+
+def _vector_scores(listings: List[Dict[str, Any]]) -> List[float]:
+    """Min-max normalised similarity: nearest candidate 1, furthest 0."""
+    distances = [float(l.get("vector_distance") or 0) for l in listings]
+    lo, hi = min(distances), max(distances)
+    if hi == lo:
+        return [1.0] * len(listings)
+    return [(hi - d) / (hi - lo) for d in distances]
+
+
+def _rent_score(listing: Dict[str, Any], ideal: Dict[str, Any]) -> float:
+    """Headroom under max_rent: cheaper relative to budget scores higher."""
+    max_rent = ideal.get("max_rent")
+    price = listing.get("price") or 0
+    if not max_rent or price <= 0:
+        return NEUTRAL
+    return min(1.0, max(0.0, (max_rent - price) / max_rent))
+
+
+def _soft_match_score(listing: Dict[str, Any], ideal: Dict[str, Any]) -> float:
+    """Fraction of the user's stated preferences the listing matches."""
+    checks: List[bool] = []
+    for field in BOOLEAN_FIELDS:
+        wanted = ideal.get(field)
+        if wanted in ("Yes", "No") and listing.get(field):
+            checks.append(_is_yes(listing[field]) == (wanted == "Yes"))
+    for field in STRING_FIELDS:
+        wanted = ideal.get(field)
+        if wanted and listing.get(field):
+            checks.append(str(wanted).lower() in str(listing[field]).lower())
+    if not checks:
+        return NEUTRAL
+    return sum(checks) / len(checks)
+
+
+def _postcode_score(listing: Dict[str, Any], ideal: Dict[str, Any]) -> float:
+    """Same district scores 1, same area 0.5, elsewhere 0."""
+    wanted = _postcode_parts(ideal.get("postcode"))
+    actual = _postcode_parts(listing.get("postcode"))
+    if not wanted or not actual:
+        return NEUTRAL
+    if wanted[1] == actual[1]:
+        return 1.0
+    if wanted[0] == actual[0]:
+        return 0.5
+    return 0.0
+
+
+def prerank(
+    listings: List[Dict[str, Any]],
+    ideal: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """Order candidates with a cheap deterministic score before LLM scoring.
+
+    Combines vector distance, rent headroom, soft preference matches and
+    postcode proximity. Each listing is annotated with `prerank_score`.
+    """
+    if not listings:
+        return []
+
+    ranked: List[Dict[str, Any]] = []
+    for listing, vector_score in zip(listings, _vector_scores(listings)):
+        score = (
+            VECTOR_WEIGHT * vector_score
+            + RENT_WEIGHT * _rent_score(listing, ideal)
+            + SOFT_MATCH_WEIGHT * _soft_match_score(listing, ideal)
+            + POSTCODE_WEIGHT * _postcode_score(listing, ideal)
+        )
+        ranked.append({**listing, "prerank_score": round(score * 100, 1)})
+
+    # Stable sort keeps vector order for ties
+    ranked.sort(key=lambda l: l["prerank_score"], reverse=True)
+    return ranked
@@ -0,0 +1,60 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class StageGraph:
+    """Run pipeline stages as soon as their inputs are ready, timing each one.
+
+    A stage is a coroutine function plus the stages it depends on; it starts
+    when all of them have finished and receives their results as arguments.
+    Timings are milliseconds since the graph was created, so the critical
+    path can be read straight off them.
+    """
+
+    def __init__(self) -> None:
+        self._t0 = time.monotonic()
+        self._tasks: List[asyncio.Task] = []
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def _now_ms(self) -> float:
+        return round((time.monotonic() - self._t0) * 1000, 1)
+
+    def stage(self, name: str, fn: Callable[..., Awaitable[Any]], *deps: "asyncio.Task[Any]") -> "asyncio.Task[Any]":
+        """Schedule `fn(*dep_results)` to run once every dependency has finished."""
+        async def run() -> Any:
+            inputs = [await dep for dep in deps]
+            start = self._now_ms()
+            try:
+                return await fn(*inputs)
+            except Exception as e:
+                logger.warning(f"Stage {name} failed: {e}")
+                raise
+            finally:
+                self.timings[name] = {"start_ms": start, "end_ms": self._now_ms()}
+
+        task = asyncio.create_task(run(), name=name)
+        # Optional stages may never be awaited; their failure is already logged
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks.append(task)
+        return task
+
+    def mark(self, name: str) -> None:
+        """Record a point in time (e.g. first result sent)."""
+        now = self._now_ms()
+        self.timings[name] = {"start_ms": now, "end_ms": now}
+
+    def cancel(self) -> None:
+        """Cancel stages that are still running (e.g. the client went away)."""
+        for task in self._tasks:
+            task.cancel()
+
+    def log(self, label: str) -> None:
+        stages = ", ".join(
+            f"{name} {t['start_ms']:.0f}-{t['end_ms']:.0f}ms"
+            for name, t in sorted(self.timings.items(), key=lambda item: item[1]["start_ms"])
+        )
+        logger.info(f"{label} timings: {stages}")
@@ -0,0 +1,166 @@
+"""Benchmark: memory, latency and recall for shortened and quantized embeddings.
+
+Starts from a full-precision catalog (a float32, full-size snapshot exported
+with `python -m clients.numpy_search export`) and, for each dims x dtype
+setting, derives the vectors the way the embeddings API's `dimensions`
+parameter would (leading dims, re-normalized). Each setting is searched:
+
+    numpy  in-process exact search over a snapshot in that encoding
+    redis  a temporary HNSW index in that datatype (float32/float16 only)
+
+and compared with brute-force search over the full-precision vectors, so
+recall@k measures what shortening, quantization and HNSW lose together.
+Redis memory is the vector index size plus the sampled size of the hashes;
+the temporary indexes are dropped afterwards.
+
+A synthetic catalog has no Matryoshka structure, so shortened random
+vectors lose far more recall than real embeddings do; use --synthetic only
+to check memory and latency.
+
+Usage (from backend/):
+    uv run python -m benchmarks.embedding_config_benchmark --dims 1536 512 256 --dtypes float32 float16 int8
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+from redisvl.index import SearchIndex
+from redisvl.query import VectorQuery
+from redisvl.schema import IndexSchema
+
+from benchmarks.search_backend_benchmark import make_queries, percentiles, synthetic_catalog
+from clients.async_redis import redis_url
+from clients.numpy_search import NUMPY_INDEX_PATH, SNAPSHOT_DTYPES, NumpySearch, shorten, write_snapshot
+
+REDIS_DTYPES = {"float32", "float16"}
+BENCH_PREFIX = "benchvec"
+MEMORY_SAMPLE_KEYS = 100
+
+
+def _recall(truth: list[list[str]], found: list[list[str]]) -> float:
+    return statistics.mean(len(set(t) & set(f)) / len(t) for t, f in zip(truth, found) if t)
+
+
+def _brute_force(matrix: np.ndarray, ids: list[str], queries: np.ndarray, top_k: int) -> list[list[str]]:
+    similarities = queries @ matrix.T
+    top = np.argsort(-similarities, axis=1)[:, :top_k]
+    return [[ids[i] for i in row] for row in top]
+
+
+async def _bench_numpy(path: str, queries: np.ndarray, top_k: int) -> tuple[int, list[float], list[list[str]]]:
+    backend = NumpySearch(path)
+    vectors = await backend.connect()
+    memory = vectors.nbytes + (os.path.getsize(os.path.join(path, "scales.npy")) if vectors.dtype == np.int8 else 0)
+    latencies: list[float] = []
+    found: list[list[str]] = []
+    for query in queries.tolist():
+        start = time.perf_counter()
+        results = await backend.search(query, top_k=top_k, return_fields=["flatshare_id"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append([result["id"] for result in results])
+    return memory, latencies, found
+
+
+def _bench_redis(url: str, matrix: np.ndarray, ids: list[str], dtype: str, queries: np.ndarray,
+                 top_k: int) -> tuple[int, list[float], list[list[str]]]:
+    name = f"{BENCH_PREFIX}_{matrix.shape[1]}_{dtype}"
+    schema = IndexSchema.from_dict({
+        "index": {"name": name, "prefix": name, "storage_type": "hash"},
+        "fields": [
+            {"name": "flatshare_id", "type": "tag"},
+            {"name": "json_vector", "type": "vector", "attrs": {
+                "dims": matrix.shape[1], "algorithm": "hnsw", "distance_metric": "cosine", "datatype": dtype,
+            }},
+        ],
+    })
+    index = SearchIndex(schema=schema, redis_url=url)
+    index.create(overwrite=True, drop=True)
+    try:
+        records = [
+            {"flatshare_id": flatshare_id, "json_vector": row.astype(dtype).tobytes()}
+            for flatshare_id, row in zip(ids, matrix)
+        ]
+        keys = index.load(records, id_field="flatshare_id")
+        while float(index.info().get("percent_indexed", 1)) < 1:
+            time.sleep(0.1)
+
+        info = index.info()
+        sample = random.Random(0).sample(keys, min(MEMORY_SAMPLE_KEYS, len(keys)))
+        per_key = statistics.mean(index.client.memory_usage(key) or 0 for key in sample)
+        memory = int(float(info["vector_index_sz_mb"]) * 1024 * 1024 + per_key * len(keys))
+
+        latencies: list[float] = []
+        found: list[list[str]] = []
+        for query in queries:
+            vector_query = VectorQuery(
+                vector=query.tolist(),
+                vector_field_name="json_vector",
+                dtype=dtype,
+                return_fields=["flatshare_id"],
+                num_results=top_k,
+            )
+            start = time.perf_counter()
+            results = index.query(vector_query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append([doc["flatshare_id"] for doc in results])
+        return memory, latencies, found
+    finally:
+        index.delete(drop=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot", default=NUMPY_INDEX_PATH, help="Full-precision snapshot")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use a random catalog of this many listings")
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 512, 256])
+    parser.add_argument("--dtypes", nargs="+", choices=SNAPSHOT_DTYPES, default=SNAPSHOT_DTYPES)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--noise", type=float, default=0.02, help="Std-dev of noise added to each query row")
+    parser.add_argument("--no-redis", action="store_true", help="Only benchmark the numpy backend")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        matrix, rows = synthetic_catalog(args.synthetic, max(args.dims), random.Random(42))
+    else:
+        source = NumpySearch(args.snapshot)
+        vectors = await source.connect()
+        if vectors.dtype != np.float32:
+            parser.error(f"{args.snapshot} is {vectors.dtype}; export a float32 snapshot as the baseline")
+        matrix, rows = shorten(vectors), source._rows
+    ids = [row["flatshare_id"] for row in rows]
+    full_dims = matrix.shape[1]
+    queries = make_queries(matrix, args.queries, args.noise)
+    truth = _brute_force(matrix, ids, queries, args.top_k)
+    url = None if args.no_redis else redis_url()
+    print(f"{len(ids)} listings, {full_dims} dims, {args.queries} queries, recall@{args.top_k} vs full float32")
+    if url is None:
+        print("REDIS_HOST not set (or --no-redis): numpy only")
+
+    print(f"{'dims':>5} {'dtype':>8} {'backend':>7} {'memory MB':>10} {'B/listing':>10} {'latency':>28} {'recall':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for dims in args.dims:
+            if dims > full_dims:
+                print(f"skipping {dims} dims: the baseline only has {full_dims}")
+                continue
+            shortened = shorten(matrix, dims)
+            short_queries = shorten(queries, dims)
+            for dtype in args.dtypes:
+                path = os.path.join(tmp, f"{dims}_{dtype}")
+                write_snapshot(path, shortened, rows, dtype)
+                results = [("numpy", *await _bench_numpy(path, short_queries, args.top_k))]
+                if url is not None and dtype in REDIS_DTYPES:
+                    results.append(("redis", *_bench_redis(url, shortened, ids, dtype, short_queries, args.top_k)))
+                for backend, memory, latencies, found in results:
+                    print(f"{dims:>5} {dtype:>8} {backend:>7} {memory / 1024 / 1024:>10.1f} "
+                          f"{memory / len(ids):>10.0f} {percentiles(latencies):>28} {_recall(truth, found):>7.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Benchmark: LLM calls and latency per search with and without pre-ranking.
+
+OpenAI and Redis are replaced by in-process fakes with simulated latency, so
+the numbers reflect the pipeline's fan-out (and the rate limiter's
+concurrency ceilings) rather than network conditions.
+
+Usage (from backend/):
+    uv run python -m benchmarks.prerank_benchmark --searches 5 --top-n 5 10 15 50
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+from typing import Any
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.pop("REDIS_HOST", None)
+
+import httpx
+
+from app.services import match_service
+from clients import openai_client
+from clients.score_cache import score_cache
+
+POSTCODES = ["SW17", "SW11", "SW4", "E1", "E2", "E14", "N1", "N7", "SE1", "SE15", "W2", "NW1"]
+PROPERTY_TYPES = ["House share", "Flat share", "Studio"]
+FAKE_IDEAL = {"max_rent": 1500, "postcode": "SW17", "furnishings": "Furnished", "pets_ok": "No"}
+
+
+class _FakeRaw:
+    """Mimics openai's LegacyAPIResponse."""
+
+    def __init__(self, content: str) -> None:
+        self.headers = httpx.Headers({})
+        self._content = content
+
+    def parse(self) -> Any:
+        message = SimpleNamespace(content=self._content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _fake_listings(n: int, rng: random.Random) -> list[dict[str, Any]]:
+    return [
+        {
+            "id": str(100000 + i),
+            "price": rng.randint(550, 1600),
+            "postcode": rng.choice(POSTCODES),
+            "property_type": rng.choice(PROPERTY_TYPES),
+            "furnishings": rng.choice(["Furnished", "Unfurnished"]),
+            "pets_ok": rng.choice(["Yes", "No"]),
+            "couples_ok": rng.choice(["Yes", "No"]),
+            "bills_included": rng.choice(["Yes", "No"]),
+            "parking": rng.choice(["Yes", "No"]),
+            "summary": f"Double room {i}",
+            "image_urls": [f"https://example.com/{i}/{j}.jpg" for j in range(3)],
+            "vector_distance": round(rng.uniform(0.1, 0.6), 4),
+        }
+        for i in range(n)
+    ]
+
+
+def install_fakes(latency: float, rng: random.Random, counter: dict[str, int]) -> None:
+    async def create(model: str, messages: list[dict[str, Any]], **kwargs: Any) -> _FakeRaw:
+        system = messages[0]["content"]
+        if "evaluating a room listing" in system:
+            counter["score_calls"] += 1
+            # Vision calls are the slow ones
+            await asyncio.sleep(latency * rng.uniform(0.6, 1.8))
+            return _FakeRaw(json.dumps({"overall_score": rng.randint(30, 95)}))
+        await asyncio.sleep(latency * 0.4)
+        if "ideal room listing" in system:
+            return _FakeRaw(json.dumps(FAKE_IDEAL))
+        return _FakeRaw("Looking for a furnished double room in SW17 under 1500")
+
+    async def embeddings_create(model: str, input: list[str], **kwargs: Any) -> Any:
+        await asyncio.sleep(latency * 0.1)
+        data = [SimpleNamespace(embedding=[0.0] * 8) for _ in input]
+        return SimpleNamespace(headers=httpx.Headers({}), parse=lambda: SimpleNamespace(data=data))
+
+    openai_client.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=create))),
+        embeddings=SimpleNamespace(with_raw_response=SimpleNamespace(create=embeddings_create)),
+    )
+
+
+async def run_search(search_id: int, top_n: int | None) -> None:
+    conversation = [{"role": "user", "content": f"search {search_id} top_n {top_n}: furnished room in SW17 under 1500"}]
+    async for _ in match_service.stream_matches(conversation, top_n=top_n):
+        pass
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=50, help="KNN results per search")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean simulated scoring latency (s)")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[5, 10, 15, 50])
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    counter = {"score_calls": 0}
+    install_fakes(args.latency, rng, counter)
+    listings = _fake_listings(args.candidates, rng)
+    async def search(embedding: list[float], top_k: int = 50, filters: Any = None) -> list[dict[str, Any]]:
+        # Stand-in for the Redis pre-filter
+        return match_service.filter_by_ideal([dict(l) for l in listings], FAKE_IDEAL)[:top_k]
+
+    match_service.search_backend.search = search  # type: ignore[method-assign]
+
+    async def vector_dimensions() -> int:
+        return 8
+
+    match_service.search_backend.vector_dimensions = vector_dimensions  # type: ignore[method-assign]
+
+    print(f"{'top_n':>6} {'llm calls/search':>17} {'latency/search (s)':>19}")
+    for top_n in args.top_n:
+        counter["score_calls"] = 0
+        start = time.perf_counter()
+        for i in range(args.searches):
+            # Measure cold searches; cached scores would hide the fan-out
+            await score_cache.invalidate()
+            await run_search(i, top_n)
+        elapsed = time.perf_counter() - start
+        print(f"{top_n:>6} {counter['score_calls'] / args.searches:>17.1f} {elapsed / args.searches:>19.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Benchmark: event-loop lag while vector searches run concurrently.
+
+Compares the old path (synchronous redisvl SearchIndex.query called from a
+coroutine) with the async RedisClient. A ticker coroutine sleeps 5ms in a
+loop and records how late it wakes up; blocking calls show up as lag.
+
+Needs a Redis with the idx_flatshares_json index (REDIS_* env vars).
+
+Usage (from backend/):
+    uv run python -m benchmarks.redis_loop_lag_benchmark --concurrency 20 --searches 10
+"""
+
+import time
+import asyncio
+import argparse
+import statistics
+
+import numpy as np
+from redisvl.index import SearchIndex
+from redisvl.query import VectorQuery
+
+from clients.async_redis import redis_url
+from clients.redis_client import INDEX_NAME, redis_client
+
+TICK_SECONDS = 0.005
+
+
+async def _ticker(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+def _random_vector(dims: int = 1536) -> list[float]:
+    vector = np.random.rand(dims).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+async def _run(name: str, search, concurrency: int, searches: int) -> None:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(stop, lags))
+
+    async def worker() -> None:
+        for _ in range(searches):
+            await search(_random_vector())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+
+    lags_ms = sorted(l * 1000 for l in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    total = concurrency * searches
+    print(
+        f"{name:>6}: {total} searches in {elapsed:.2f}s ({total / elapsed:.0f}/s) | "
+        f"loop lag mean {statistics.mean(lags_ms):.1f}ms p99 {p99:.1f}ms max {lags_ms[-1]:.1f}ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--searches", type=int, default=10, help="Searches per concurrent worker")
+    args = parser.parse_args()
+
+    sync_index = SearchIndex.from_existing(INDEX_NAME, redis_url=redis_url())
+
+    async def sync_search(vector: list[float]) -> None:
+        # What RedisClient.search used to do: a blocking call on the event loop
+        query = VectorQuery(vector=vector, vector_field_name="json_vector", return_fields=["flatshare_id", "json_data"], num_results=50)
+        sync_index.query(query)
+
+    await redis_client.connect()
+
+    await _run("sync", sync_search, args.concurrency, args.searches)
+    await _run("async", redis_client.search, args.concurrency, args.searches)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
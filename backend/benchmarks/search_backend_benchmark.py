@@ -0,0 +1,120 @@
+"""Benchmark: search latency of the NumPy backend against Redis.
+
+Runs the same queries (snapshot rows plus noise, so they land near real
+listings) through both backends, with and without a pre-filter, and reports
+p50/p95 latency and how many of Redis's top-k the exact search also returns.
+Redis's HNSW is approximate, so the overlap is Redis's recall.
+
+Without REDIS_HOST only the NumPy backend runs. Without a snapshot, pass
+--synthetic N to benchmark a random catalog of N listings.
+
+Usage (from backend/):
+    uv run python -m clients.numpy_search export
+    uv run python -m benchmarks.search_backend_benchmark --queries 200
+    uv run python -m benchmarks.search_backend_benchmark --synthetic 20000
+"""
+
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+from clients.async_redis import redis_url
+from clients.numpy_search import NUMPY_INDEX_PATH, NumpySearch, shorten, write_snapshot
+from clients.redis_client import redis_client
+from clients.search_backend import ListingFilter
+
+FILTERS = {
+    "none": None,
+    "rent+furnished": ListingFilter(max_rent=1200, tags=(("furnishings", "furnished"),)),
+    "rent+bills+pets": ListingFilter(max_rent=1500, required_yes=("bills_included", "pets_ok")),
+}
+
+
+def synthetic_catalog(n: int, dims: int, rng: random.Random) -> tuple[np.ndarray, list[dict[str, str]]]:
+    """Random unit vectors with plausible filter fields."""
+    matrix = shorten(np.random.default_rng(0).standard_normal((n, dims)))
+    rows = [
+        {
+            "flatshare_id": str(100000 + i),
+            "rent_pcm": str(rng.randint(500, 1800)),
+            "furnishings": rng.choice(["furnished", "unfurnished", "part furnished"]),
+            "bills_included": rng.choice(["yes", "no"]),
+            "pets_ok": rng.choice(["yes", "no"]),
+            "summary": f"Double room {i}",
+        }
+        for i in range(n)
+    ]
+    return matrix, rows
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float) -> np.ndarray:
+    """Normalized queries near random catalog rows."""
+    rng = np.random.default_rng(1)
+    rows = np.asarray(vectors[rng.integers(0, len(vectors), count)], dtype=np.float32)
+    return shorten(rows + rng.standard_normal(rows.shape).astype(np.float32) * noise)
+
+
+async def _time(search, queries: list[list[float]], top_k: int, filters) -> tuple[list[float], list[list[str]]]:
+    latencies: list[float] = []
+    ids: list[list[str]] = []
+    for query in queries:
+        start = time.perf_counter()
+        results = await search(query, top_k=top_k, filters=filters)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([result["id"] for result in results])
+    return latencies, ids
+
+
+def percentiles(latencies: list[float]) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"p50 {statistics.median(ordered):6.2f}ms p95 {p95:6.2f}ms"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--snapshot", default=NUMPY_INDEX_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark a random catalog of this many listings")
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--noise", type=float, default=0.02, help="Std-dev of noise added to each query row")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.snapshot
+        if args.synthetic:
+            path = tmp
+            write_snapshot(path, *synthetic_catalog(args.synthetic, args.dims, random.Random(42)))
+
+        backend = NumpySearch(path)
+        start = time.perf_counter()
+        vectors = await backend.connect()
+        print(f"numpy: loaded {len(vectors)} x {vectors.shape[1]} in {(time.perf_counter() - start) * 1000:.0f}ms")
+        queries = make_queries(vectors, args.queries, args.noise).tolist()
+        use_redis = not args.synthetic and redis_url() is not None
+        if use_redis:
+            await redis_client.connect()
+
+        for name, filters in FILTERS.items():
+            await backend.search(queries[0], top_k=args.top_k, filters=filters)
+            numpy_latencies, numpy_ids = await _time(backend.search, queries, args.top_k, filters)
+            line = f"{name:>16} | numpy {percentiles(numpy_latencies)}"
+            if use_redis:
+                redis_latencies, redis_ids = await _time(redis_client.search, queries, args.top_k, filters)
+                overlap = [
+                    len(set(exact) & set(approx)) / len(exact)
+                    for exact, approx in zip(numpy_ids, redis_ids) if exact
+                ]
+                line += (f" | redis {percentiles(redis_latencies)}"
+                         f" | redis recall@{args.top_k} {statistics.mean(overlap or [1.0]):.3f}")
+            print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,7 @@
+from .embedding_cache import EmbeddingCache
 from .openai_client import OpenAIClient, openai_client
 
-__all__ = ["OpenAIClient", "openai_client"]
+__all__ = ["EmbeddingCache", "OpenAIClient", "openai_client"]
 
 # Redis client requires redis-stack server with RediSearch module
 # Import explicitly when needed: from clients.redis_client import redis_client
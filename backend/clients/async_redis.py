@@ -0,0 +1,49 @@
+"""Shared async Redis connection pool for vector search and caches."""
+
+import os
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Callers wait for a free connection (up to POOL_TIMEOUT) instead of opening unbounded sockets
+MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+POOL_TIMEOUT_SECONDS = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", "2"))
+SOCKET_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "5"))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", "3"))
+HEALTH_CHECK_INTERVAL_SECONDS = 30
+
+_redis: Redis | None = None
+
+
+def redis_url() -> str | None:
+    """Build the Redis URL from env vars, or None if Redis is not configured."""
+    if not os.getenv("REDIS_HOST"):
+        return None
+    return f"redis://default:{os.getenv('REDIS_PASSWORD')}@{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT')}"
+
+
+def get_async_redis() -> Redis | None:
+    """Return the process-wide async Redis client, or None if Redis is not configured."""
+    global _redis
+    if _redis is None and (url := redis_url()):
+        pool = BlockingConnectionPool.from_url(
+            url,
+            max_connections=MAX_CONNECTIONS,
+            timeout=POOL_TIMEOUT_SECONDS,
+            socket_timeout=SOCKET_TIMEOUT_SECONDS,
+            socket_connect_timeout=CONNECT_TIMEOUT_SECONDS,
+            socket_keepalive=True,
+            health_check_interval=HEALTH_CHECK_INTERVAL_SECONDS,
+        )
+        _redis = Redis(connection_pool=pool)
+    return _redis
+
+
+async def close_async_redis() -> None:
+    """Close the shared client and its pool (used on shutdown)."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose(close_connection_pool=True)
+        _redis = None
@@ -0,0 +1,126 @@
+"""Two-tier embedding cache: in-process LRU backed by a shared Redis tier."""
+
+import os
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+from redis.asyncio import Redis
+from dotenv import load_dotenv
+
+from .async_redis import get_async_redis
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "embcache"
+DEFAULT_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache keyed by (model, dimensions, text).
+
+    Vectors are held as float32 in a bounded in-process LRU and in Redis with
+    a TTL, so repeated texts are embedded once per deployment rather than
+    once per request. Redis errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        redis: Redis | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._redis = redis
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, dimensions: int, text: str) -> str:
+        """Hash (model, dimensions, text) into a cache key."""
+        payload = json.dumps([model, dimensions, text], ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"{CACHE_PREFIX}:{digest}"
+
+    @property
+    def redis(self) -> Redis | None:
+        """The Redis tier, or None if Redis is not configured."""
+        return self._redis or get_async_redis()
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get_many(self, keys: list[str]) -> list[list[float] | None]:
+        """Look up vectors for keys; None marks a miss in both tiers."""
+        results: list[list[float] | None] = [None] * len(keys)
+        redis_lookups: list[int] = []
+
+        for i, key in enumerate(keys):
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                results[i] = vector.tolist()
+                self.memory_hits += 1
+            else:
+                redis_lookups.append(i)
+
+        if redis_lookups and self.redis is not None:
+            try:
+                raw = await self.redis.mget([keys[i] for i in redis_lookups])
+            except Exception as e:
+                logger.warning(f"Embedding cache read failed: {e}")
+                raw = [None] * len(redis_lookups)
+            for i, blob in zip(redis_lookups, raw):
+                if blob is None:
+                    continue
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self._remember(keys[i], vector)
+                results[i] = vector.tolist()
+                self.redis_hits += 1
+
+        self.misses += sum(1 for r in results if r is None)
+        return results
+
+    async def set_many(self, items: dict[str, list[float]]) -> None:
+        """Store vectors in both tiers."""
+        if not items:
+            return
+        blobs: dict[str, bytes] = {}
+        for key, embedding in items.items():
+            vector = np.asarray(embedding, dtype=np.float32)
+            self._remember(key, vector)
+            blobs[key] = vector.tobytes()
+
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, blob in blobs.items():
+                    pipe.set(key, blob, ex=self.ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters and current in-process size."""
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,245 @@
+"""Process-wide fair-share scheduling of OpenAI calls across users and kinds of work.
+
+Each model has a fixed number of concurrent call slots (the rate limiter's
+concurrency ceiling). When one frees up it goes to the waiting call with:
+
+1. the highest priority class: interactive chat, then summaries (preferences,
+   embeddings), then per-listing scoring;
+2. within a class, the user furthest behind their fair share, by start-time
+   fair queuing weighted per user and charged by estimated tokens;
+3. and, for scoring, a user under LLM_SCORING_CAP_PER_USER scoring calls in
+   flight ahead of one at or over it, so one user's fan-out can't fill every
+   slot. The cap only defers: with nobody under it waiting, a free slot still
+   goes to a capped user rather than sit idle.
+
+The user is taken from a context variable set at the API boundary
+(`set_current_user`); tasks started afterwards inherit it.
+"""
+
+import os
+import time
+import asyncio
+import itertools
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, AsyncIterator
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Scoring calls one user may have running at once, across models, while others are waiting
+SCORING_CAP_PER_USER = int(os.getenv("LLM_SCORING_CAP_PER_USER", "4"))
+# Fair-share weights, e.g. LLM_USER_WEIGHTS="<user id>=2,<user id>=0.5"; everyone else has 1
+DEFAULT_WEIGHT = 1.0
+# Recent waits kept per priority class for the percentiles in stats()
+WAIT_SAMPLES = 1000
+# Calls made outside a request (scripts, benchmarks) share one flow
+ANONYMOUS = "anonymous"
+# Past this many (class, user) flows, idle users' fair-queuing state is dropped
+MAX_TRACKED_FLOWS = 1000
+
+_current_user: ContextVar[str | None] = ContextVar("llm_user", default=None)
+
+
+class Priority(IntEnum):
+    """Lower runs first."""
+
+    INTERACTIVE = 0
+    SUMMARY = 1
+    SCORING = 2
+
+
+def set_current_user(user_id: str | None) -> None:
+    """Attribute OpenAI calls made from here on (including tasks started later) to `user_id`."""
+    _current_user.set(user_id)
+
+
+def current_user() -> str:
+    return _current_user.get() or ANONYMOUS
+
+
+def _parse_weights(value: str | None) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            user, weight = part.split("=", 1)
+            weights[user.strip()] = float(weight)
+    return weights
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    finish_tag: float
+    seq: int
+    user: str = field(compare=False)
+    start_tag: float = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    deferred: bool = field(default=False, compare=False)
+
+
+class _ModelQueue:
+    """Call slots for one model, handed out in scheduling order."""
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.waiters: list[_Waiter] = []
+
+
+class LLMScheduler:
+    """Hands out per-model call slots by priority class, then weighted fair share per user."""
+
+    def __init__(self, scoring_cap: int = SCORING_CAP_PER_USER, weights: dict[str, float] | None = None) -> None:
+        self.scoring_cap = scoring_cap
+        self.weights = weights if weights is not None else _parse_weights(os.getenv("LLM_USER_WEIGHTS"))
+        self._queues: dict[str, _ModelQueue] = {}
+        self._scoring_in_flight: Counter[str] = Counter()
+        # Start-time fair queuing state per priority class: virtual time and each user's last finish tag
+        self._virtual_time: dict[int, float] = {}
+        self._last_finish: dict[tuple[int, str], float] = {}
+        self._seq = itertools.count()
+        self._waits: dict[int, deque[float]] = {p: deque(maxlen=WAIT_SAMPLES) for p in Priority}
+        self.dispatched: Counter[str] = Counter()
+        self.capped = 0
+
+    def queue(self, model: str, concurrency: int) -> _ModelQueue:
+        if model not in self._queues:
+            self._queues[model] = _ModelQueue(concurrency)
+        return self._queues[model]
+
+    def _over_cap(self, waiter: _Waiter) -> bool:
+        return waiter.priority == Priority.SCORING and self._scoring_in_flight[waiter.user] >= self.scoring_cap
+
+    def _dispatch(self, queue: _ModelQueue) -> None:
+        while queue.in_flight < queue.concurrency and queue.waiters:
+            candidates = [w for w in queue.waiters if not w.future.done()]
+            if not candidates:
+                queue.waiters = candidates
+                return
+            eligible = [w for w in candidates if not self._over_cap(w)]
+            if eligible:
+                for w in candidates:
+                    if not w.deferred and self._over_cap(w):
+                        w.deferred = True
+                        self.capped += 1
+            else:
+                # Only capped users are waiting: don't leave the slot idle
+                eligible = candidates
+            waiter = min(eligible)
+            queue.waiters = [w for w in candidates if w is not waiter]
+            queue.in_flight += 1
+            if waiter.priority == Priority.SCORING:
+                self._scoring_in_flight[waiter.user] += 1
+            self._virtual_time[waiter.priority] = waiter.start_tag
+            self._waits[waiter.priority].append(time.monotonic() - waiter.enqueued_at)
+            self.dispatched[Priority(waiter.priority).name.lower()] += 1
+            waiter.future.set_result(None)
+
+    def _prune(self) -> None:
+        """Forget users whose last finish tag is behind the virtual clock; they'd restart from it anyway."""
+        self._last_finish = {
+            flow: finish for flow, finish in self._last_finish.items()
+            if finish > self._virtual_time.get(flow[0], 0.0)
+        }
+
+    def _release(self, queue: _ModelQueue, priority: int, user: str) -> None:
+        queue.in_flight -= 1
+        if priority == Priority.SCORING:
+            self._scoring_in_flight[user] -= 1
+            if not self._scoring_in_flight[user]:
+                del self._scoring_in_flight[user]
+            # The freed scoring allowance may unblock this user on another model
+            for other in self._queues.values():
+                self._dispatch(other)
+        else:
+            self._dispatch(queue)
+
+    @asynccontextmanager
+    async def slot(self, model: str, concurrency: int, priority: Priority, cost: float) -> AsyncIterator[None]:
+        """Hold one of `model`'s call slots for the duration of the block.
+
+        `cost` (estimated tokens) is what the call is charged against its
+        user's fair share.
+        """
+        queue = self.queue(model, concurrency)
+        user = current_user()
+        flow = (int(priority), user)
+        start_tag = max(self._virtual_time.get(priority, 0.0), self._last_finish.get(flow, 0.0))
+        finish_tag = start_tag + cost / self.weights.get(user, DEFAULT_WEIGHT)
+        self._last_finish[flow] = finish_tag
+        if len(self._last_finish) > MAX_TRACKED_FLOWS:
+            self._prune()
+        waiter = _Waiter(
+            priority=int(priority),
+            finish_tag=finish_tag,
+            seq=next(self._seq),
+            user=user,
+            start_tag=start_tag,
+            enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        queue.waiters.append(waiter)
+        self._dispatch(queue)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller was cancelled: hand the slot on
+                self._release(queue, waiter.priority, user)
+            else:
+                queue.waiters = [w for w in queue.waiters if w is not waiter]
+            raise
+        try:
+            yield
+        finally:
+            self._release(queue, waiter.priority, user)
+
+    def in_flight(self, model: str) -> int:
+        return self._queues[model].in_flight if model in self._queues else 0
+
+    def stats(self) -> dict[str, Any]:
+        def percentile(samples: deque[float], q: float) -> float:
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3) if ordered else 0.0
+
+        depth: Counter[str] = Counter()
+        waiting_users: set[str] = set()
+        for queue in self._queues.values():
+            for waiter in queue.waiters:
+                if not waiter.future.done():
+                    depth[Priority(waiter.priority).name.lower()] += 1
+                    waiting_users.add(waiter.user)
+        return {
+            "queue_depth": dict(depth),
+            "waiting_users": len(waiting_users),
+            "scoring_in_flight_by_user": dict(self._scoring_in_flight),
+            "scoring_cap_per_user": self.scoring_cap,
+            # Scoring calls that waited because their user was at the cap
+            "scoring_cap_deferrals": self.capped,
+            "dispatched": dict(self.dispatched),
+            "wait_seconds": {
+                Priority(priority).name.lower(): {
+                    "p50": percentile(samples, 0.5),
+                    "p95": percentile(samples, 0.95),
+                    "max": round(max(samples), 3) if samples else 0.0,
+                }
+                for priority, samples in self._waits.items()
+            },
+            "models": {
+                model: {
+                    "concurrency": queue.concurrency,
+                    "in_flight": queue.in_flight,
+                    "queued": sum(not w.future.done() for w in queue.waiters),
+                }
+                for model, queue in self._queues.items()
+            },
+        }
+
+
+llm_scheduler = LLMScheduler()
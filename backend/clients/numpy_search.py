@@ -0,0 +1,249 @@
+"""In-process exact vector search over a local snapshot of the listings index.
+
+The catalog is a few thousand listings, so a brute-force scan in NumPy is a
+few milliseconds and needs no redis-stack or network hop. A snapshot is a
+directory holding:
+
+    vectors.npy    (n, dims) embeddings, rows L2-normalized, memory-mapped;
+                   float32, float16, or int8 with a per-row scale
+    scales.npy     int8 only: float32 (n,) scale restoring each row's magnitude
+    listings.json  one object per row with the same hash fields Redis returns
+
+Build one from a populated Redis index (from backend/):
+    uv run python -m clients.numpy_search export --path search_index [--dims 256] [--dtype int8]
+then run the API with SEARCH_BACKEND=numpy. Shortening keeps the leading
+dims and re-normalizes, which is what the embeddings API's `dimensions`
+parameter does, so query embeddings requested at the same size match.
+"""
+
+import os
+import json
+import asyncio
+import argparse
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .redis_client import CANDIDATE_FIELDS, VECTOR_FIELD, Listing, RedisClient
+
+if TYPE_CHECKING:
+    from .search_backend import ListingFilter
+
+load_dotenv()
+
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "search_index")
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+LISTINGS_FILE = "listings.json"
+# Must match the indexer's INDEX_PREFIX (scraping/listing_schema.py)
+KEY_PREFIX = "doc:"
+EXPORT_BATCH_SIZE = 500
+SNAPSHOT_DTYPES = ["float32", "float16", "int8"]
+INT8_MAX = 127
+
+
+def shorten(matrix: np.ndarray, dims: int | None = None) -> np.ndarray:
+    """Keep the leading `dims` columns and L2-normalize each row (float32)."""
+    matrix = np.asarray(matrix[:, :dims] if dims else matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Encode normalized rows as `dtype`; int8 also returns the per-row scales."""
+    if dtype != "int8":
+        return matrix.astype(dtype), None
+    # Symmetric per-row quantization: each row's largest component maps to +-127
+    scales = np.abs(matrix).max(axis=1) / INT8_MAX
+    scales[scales == 0] = 1
+    quantized = np.round(matrix / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class NumpySearch:
+    """Exact cosine top-k over a memory-mapped embedding matrix.
+
+    Filters are evaluated as boolean masks over per-field columns built once
+    at load, and only the surviving rows are scored. Results have the same
+    shape as RedisClient.search.
+    """
+
+    def __init__(self, path: str = NUMPY_INDEX_PATH) -> None:
+        self.path = path
+        self._vectors: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+        self._rows: list[dict[str, str]] = []
+        self._rent_pcm: np.ndarray | None = None
+        self._tag_columns: dict[str, np.ndarray] = {}
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self) -> np.ndarray:
+        """Map the snapshot into memory and build the filter columns."""
+        async with self._connect_lock:
+            if self._vectors is None:
+                await asyncio.to_thread(self._load)
+        assert self._vectors is not None
+        return self._vectors
+
+    def _load(self) -> None:
+        vectors = np.load(os.path.join(self.path, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(self.path, LISTINGS_FILE)) as f:
+            rows = json.load(f)
+        if len(rows) != len(vectors):
+            raise ValueError(f"Snapshot at {self.path} has {len(vectors)} vectors but {len(rows)} listings")
+        self._rows = rows
+        self._rent_pcm = np.array([float(row.get("rent_pcm") or 0) for row in rows], dtype=np.float32)
+        self._tag_columns = {}
+        self._scales = np.load(os.path.join(self.path, SCALES_FILE)) if vectors.dtype == np.int8 else None
+        self._vectors = vectors
+
+    def _tag_column(self, field: str) -> np.ndarray:
+        # Redis tag matching is case-insensitive; compare lowercase values
+        if field not in self._tag_columns:
+            self._tag_columns[field] = np.array([str(row.get(field) or "").strip().lower() for row in self._rows])
+        return self._tag_columns[field]
+
+    def _mask(self, filters: "ListingFilter") -> np.ndarray:
+        assert self._rent_pcm is not None
+        mask = np.ones(len(self._rows), dtype=bool)
+        if filters.max_rent:
+            mask &= (self._rent_pcm > 0) & (self._rent_pcm <= filters.max_rent)
+        if filters.min_rent:
+            mask &= self._rent_pcm >= filters.min_rent
+        for field in filters.required_yes:
+            mask &= self._tag_column(field) == "yes"
+        for field, value in filters.tags:
+            mask &= self._tag_column(field) == value
+        return mask
+
+    async def search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 50,
+        filters: "ListingFilter | None" = None,
+        return_fields: list[str] | None = None
+    ) -> list[Listing]:
+        """Exact top-k by cosine distance, with the filters applied before scoring.
+
+        Runs inline: a scan of a few thousand rows costs less than handing
+        it to a thread.
+        """
+        vectors = self._vectors if self._vectors is not None else await self.connect()
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+
+        scales = self._scales
+        candidates = None
+        if filters is not None and not filters.is_empty():
+            candidates = np.flatnonzero(self._mask(filters))
+            vectors = vectors[candidates]
+            scales = scales[candidates] if scales is not None else None
+        if len(vectors) == 0 or top_k <= 0:
+            return []
+
+        # float16/int8 rows are widened to float32 for the product
+        similarities = vectors @ query / query_norm
+        if scales is not None:
+            similarities *= scales
+        k = min(top_k, len(similarities))
+        # argpartition finds the k best in O(n); only those k are sorted
+        top = np.argpartition(-similarities, k - 1)[:k] if k < len(similarities) else np.arange(k)
+        top = top[np.argsort(-similarities[top], kind="stable")]
+
+        fields = return_fields or CANDIDATE_FIELDS
+        results: list[Listing] = []
+        for position in top:
+            row = self._rows[int(candidates[position] if candidates is not None else position)]
+            doc: dict[str, Any] = {field: row[field] for field in fields if field in row}
+            doc["vector_distance"] = 1.0 - float(similarities[position])
+            results.append(RedisClient._parse_result(doc))
+        return results
+
+    async def vector_dimensions(self) -> int:
+        """Size of the snapshot's vectors, which query embeddings must match."""
+        vectors = self._vectors if self._vectors is not None else await self.connect()
+        return int(vectors.shape[1])
+
+    async def ping(self) -> bool:
+        """Check the snapshot is loaded or loadable."""
+        return self._vectors is not None or os.path.exists(os.path.join(self.path, VECTORS_FILE))
+
+
+def export_snapshot(path: str = NUMPY_INDEX_PATH, dims: int | None = None, dtype: str = "float32") -> int:
+    """Copy every indexed listing out of Redis into a snapshot directory; returns the row count.
+
+    `dims` shortens the vectors (it can't exceed the index's size); `dtype`
+    is the snapshot encoding, whatever the index stores.
+    """
+    from redis import Redis
+    from redisvl.index import SearchIndex
+
+    from .async_redis import redis_url
+    from .redis_client import INDEX_NAME
+
+    url = redis_url()
+    if url is None:
+        raise RuntimeError("REDIS_HOST is not configured")
+    attrs = SearchIndex.from_existing(INDEX_NAME, redis_url=url).schema.fields[VECTOR_FIELD].attrs
+    index_dtype = attrs.datatype.value.lower()  # type: ignore[attr-defined]
+    if dims and dims > attrs.dims:  # type: ignore[attr-defined]
+        raise ValueError(f"The index stores {attrs.dims}-dim vectors; can't export {dims}")  # type: ignore[attr-defined]
+    client = Redis.from_url(url)
+    keys = list(client.scan_iter(match=f"{KEY_PREFIX}*", count=EXPORT_BATCH_SIZE))
+    fields = [VECTOR_FIELD, *CANDIDATE_FIELDS]
+
+    vectors: list[np.ndarray] = []
+    rows: list[dict[str, str]] = []
+    for start in range(0, len(keys), EXPORT_BATCH_SIZE):
+        pipe = client.pipeline(transaction=False)
+        for key in keys[start:start + EXPORT_BATCH_SIZE]:
+            pipe.hmget(key, fields)
+        for values in pipe.execute():
+            vector, *metadata = values
+            if not vector:
+                continue
+            vectors.append(np.frombuffer(vector, dtype=index_dtype))
+            rows.append({
+                field: value.decode() for field, value in zip(CANDIDATE_FIELDS, metadata) if value is not None
+            })
+    client.close()
+
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, attrs.dims), dtype=np.float32)  # type: ignore[attr-defined]
+    write_snapshot(path, shorten(matrix, dims), rows, dtype)
+    return len(rows)
+
+
+def write_snapshot(path: str, matrix: np.ndarray, rows: list[dict[str, str]], dtype: str = "float32") -> None:
+    """Write normalized float32 rows and their metadata as a snapshot encoded as `dtype`."""
+    vectors, scales = quantize(matrix, dtype)
+    os.makedirs(path, exist_ok=True)
+    files = {VECTORS_FILE: vectors, LISTINGS_FILE: rows}
+    if scales is not None:
+        files[SCALES_FILE] = scales
+    elif os.path.exists(os.path.join(path, SCALES_FILE)):
+        os.remove(os.path.join(path, SCALES_FILE))
+    # Write then rename, so a running server never maps a half-written file
+    for name, data in files.items():
+        target = os.path.join(path, name)
+        if name == LISTINGS_FILE:
+            with open(f"{target}.tmp", "w") as f:
+                json.dump(data, f)
+        else:
+            with open(f"{target}.tmp", "wb") as f:
+                np.save(f, data)
+        os.replace(f"{target}.tmp", target)
+
+
+numpy_search = NumpySearch()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local NumPy search snapshot.")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--path", default=NUMPY_INDEX_PATH, help="Snapshot directory")
+    parser.add_argument("--dims", type=int, help="Shorten vectors to this many dimensions")
+    parser.add_argument("--dtype", choices=SNAPSHOT_DTYPES, default="float32")
+    args = parser.parse_args()
+    count = export_snapshot(args.path, args.dims, args.dtype)
+    print(f"Exported {count} listings to {args.path}")
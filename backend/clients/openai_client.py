@@ -2,43 +2,188 @@
 
 import os
 import json
-from typing import Any
+import asyncio
+from typing import Any, AsyncIterator
 
+import httpx
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from .embedding_cache import EmbeddingCache
+from .llm_scheduler import Priority
+from .rate_limiter import RateLimiter
+
 load_dotenv()
 
 EMBEDDING_MODEL = "text-embedding-3-small"
+# Full size; the search index may store shortened embeddings (see search backends)
+EMBEDDING_DIMENSIONS = 1536
 CHAT_MODEL = "gpt-4o-mini"
 VISION_MODEL = "gpt-4o"
+# OpenAI caps the number of inputs per embeddings request
+EMBEDDING_BATCH_LIMIT = 2048
+# Rough token accounting for rate-limit budgeting
+CHARS_PER_TOKEN = 4
+LOW_DETAIL_IMAGE_TOKENS = 85
+DEFAULT_COMPLETION_TOKENS = 1000
+# Vision scoring calls can take tens of seconds; connecting should not
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+CONNECT_TIMEOUT_SECONDS = 5.0
+# Keep idle connections long enough to survive gaps between a user's requests
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+# Connections opened at startup, so the first requests skip the TLS handshake
+WARM_CONNECTIONS = 4
+
+
+def _estimate_tokens(messages: list[dict[str, Any]], max_tokens: int | None) -> int:
+    """Estimate prompt + completion tokens the way OpenAI counts them against TPM."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(part.get("text", ""))
+    return chars // CHARS_PER_TOKEN + images * LOW_DETAIL_IMAGE_TOKENS + (max_tokens or DEFAULT_COMPLETION_TOKENS)
 
 
 class OpenAIClient:
     """Async client for OpenAI API interactions."""
 
-    def __init__(self) -> None:
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(
+        self,
+        embedding_cache: EmbeddingCache | None = None,
+        rate_limiter: RateLimiter | None = None
+    ) -> None:
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.client = self._build_client()
+
+    def _build_client(self) -> AsyncOpenAI:
+        # One pooled connection per call the rate limiter lets run at once
+        connections = sum(self.rate_limiter.concurrency.values())
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=connections,
+                keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        # Retries are handled by the rate limiter so they respect the shared budget
+        return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, http_client=http_client)
 
-    async def embed(self, text: str) -> list[float]:
-        """Generate embedding for a single text."""
-        response = await self.client.embeddings.create(model=EMBEDDING_MODEL, input=text)
-        return response.data[0].embedding
+    async def warmup(self) -> None:
+        """Open WARM_CONNECTIONS pooled connections with a request that costs no tokens."""
+        await asyncio.gather(*(self.client.models.retrieve(CHAT_MODEL) for _ in range(WARM_CONNECTIONS)))
 
-    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
-        """Generate embeddings for multiple texts."""
-        response = await self.client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
-        return [item.embedding for item in response.data]
+    async def aclose(self) -> None:
+        """Close the connection pool (used on shutdown); a fresh one is ready if the app starts again."""
+        await self.client.close()
+        self.client = self._build_client()
+
+    async def _create_completion(
+        self,
+        model: str,
+        messages: list[dict[str, Any]],
+        priority: Priority,
+        **kwargs: Any
+    ) -> Any:
+        """Rate-limited, scheduled chat.completions.create."""
+        tokens = _estimate_tokens(messages, kwargs.get("max_tokens"))
+        return await self.rate_limiter.call(
+            model,
+            tokens,
+            lambda: self.client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,  # type: ignore[arg-type]
+                **kwargs
+            ),
+            priority=priority,
+        )
+
+    async def _create_embeddings(self, model: str, input: list[str], dimensions: int) -> Any:
+        """Rate-limited embeddings.create."""
+        tokens = sum(len(t) for t in input) // CHARS_PER_TOKEN + 1
+        return await self.rate_limiter.call(
+            model,
+            tokens,
+            lambda: self.client.embeddings.with_raw_response.create(
+                model=model,
+                input=input,
+                dimensions=dimensions
+            ),
+            priority=Priority.SUMMARY,
+        )
+
+    async def embed(self, text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list[float]:
+        """Generate embedding for a single text."""
+        return (await self.embed_batch([text], dimensions))[0]
+
+    async def embed_batch(self, texts: list[str], dimensions: int = EMBEDDING_DIMENSIONS) -> list[list[float]]:
+        """Generate embeddings for multiple texts, only sending cache misses upstream.
+
+        `dimensions` shortens the embedding (text-embedding-3 models); it must
+        match the search index's vector size.
+        """
+        keys = [EmbeddingCache.make_key(EMBEDDING_MODEL, dimensions, t) for t in texts]
+        results = await self.embedding_cache.get_many(keys)
+
+        # Deduplicate misses so repeated texts are embedded once
+        missing: dict[str, str] = {}
+        for key, text, cached in zip(keys, texts, results):
+            if cached is None:
+                missing.setdefault(key, text)
+
+        fresh: dict[str, list[float]] = {}
+        miss_keys = list(missing)
+        for start in range(0, len(miss_keys), EMBEDDING_BATCH_LIMIT):
+            chunk = miss_keys[start:start + EMBEDDING_BATCH_LIMIT]
+            response = await self._create_embeddings(
+                model=EMBEDDING_MODEL,
+                input=[missing[k] for k in chunk],
+                dimensions=dimensions
+            )
+            for key, item in zip(chunk, response.data):
+                fresh[key] = item.embedding
+        await self.embedding_cache.set_many(fresh)
+
+        return [cached if cached is not None else fresh[key] for key, cached in zip(keys, results)]
 
     async def chat(self, messages: list[dict[str, str]], max_tokens: int = 200) -> str:
         """Generate a chat completion."""
-        response = await self.client.chat.completions.create(
+        response = await self._create_completion(
             model=CHAT_MODEL,
-            messages=messages,  # type: ignore[arg-type]
+            priority=Priority.INTERACTIVE,
+            messages=messages,
             max_tokens=max_tokens
         )
         return response.choices[0].message.content or ""
 
+    async def chat_stream(self, messages: list[dict[str, str]], max_tokens: int = 200) -> AsyncIterator[str]:
+        """Generate a chat completion, yielding content as it arrives.
+
+        The request is rate limited like any other; the slot is released once
+        the response starts, not when the stream ends.
+        """
+        stream = await self._create_completion(
+            model=CHAT_MODEL,
+            priority=Priority.INTERACTIVE,
+            messages=messages,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        # Closing the stream (also on early exit) releases the HTTP connection
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and (content := chunk.choices[0].delta.content):
+                    yield content
+
     async def summarize_conversation(self, conversation: list[dict[str, str]]) -> str:
         """Extract structured information from a conversation."""
         system = """Extract the information from the conversation in a structured format.
@@ -69,8 +214,9 @@ Be concise and factual. Extract the data in the following format (JSON):
 
         conv_text = "\n".join([f"{m['role']}: {m['content']}" for m in conversation])
 
-        response = await self.client.chat.completions.create(
+        response = await self._create_completion(
             model=CHAT_MODEL,
+            priority=Priority.SUMMARY,
             messages=[
                 {"role": "system", "content": system},
                 {"role": "user", "content": conv_text}
@@ -110,8 +256,9 @@ For target_location, look for workplace, office, university, or places they ment
 
         conv_text = "\n".join([f"{m['role']}: {m['content']}" for m in conversation])
 
-        response = await self.client.chat.completions.create(
+        response = await self._create_completion(
             model=CHAT_MODEL,
+            priority=Priority.SUMMARY,
             messages=[
                 {"role": "system", "content": system},
                 {"role": "user", "content": conv_text}
@@ -158,8 +305,9 @@ Return the COMPLETE updated list (keep existing rules unless user contradicts th
 
         rules_json = json.dumps(existing_rules) if existing_rules else "[]"
 
-        response = await self.client.chat.completions.create(
+        response = await self._create_completion(
             model=CHAT_MODEL,
+            priority=Priority.INTERACTIVE,
             messages=[
                 {"role": "system", "content": system},
                 {"role": "user", "content": f"Current rules: {rules_json}\n\nNew message: {message}"}
@@ -194,8 +342,9 @@ Return the COMPLETE updated list (keep existing rules unless user contradicts th
         # Format for LLM
         terms_text = "\n".join([f"- {lid}: {term}" for lid, term in terms_to_parse.items()])
 
-        response = await self.client.chat.completions.create(
+        response = await self._create_completion(
             model=CHAT_MODEL,
+            priority=Priority.SCORING,
             messages=[
                 {"role": "system", "content": """Parse minimum tenancy terms to months. Return JSON object with listing IDs as keys and month values (integers or null).
 Example input:
@@ -284,11 +433,12 @@ Be critical and realistic. 50 is average, 70+ is good, 90+ is excellent. A beaut
                     "image_url": {"url": url, "detail": "low"}
                 })
 
-        response = await self.client.chat.completions.create(
+        response = await self._create_completion(
             model=VISION_MODEL if image_urls else CHAT_MODEL,
+            priority=Priority.SCORING,
             messages=[
                 {"role": "system", "content": system},
-                {"role": "user", "content": user_content}  # type: ignore[arg-type]
+                {"role": "user", "content": user_content}
             ],
             response_format={"type": "json_object"},
             max_tokens=500
@@ -0,0 +1,278 @@
+"""Adaptive per-model rate limiting and retry for OpenAI calls."""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+import httpx
+import openai
+
+from .llm_scheduler import LLMScheduler, Priority, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+DEFAULT_CONCURRENCY = 16
+# Per-model concurrency ceilings, overridable with e.g. OPENAI_CONCURRENCY="gpt-4o=8,gpt-4o-mini=32"
+DEFAULT_MODEL_CONCURRENCY = {
+    "gpt-4o": 8,
+    "gpt-4o-mini": 16,
+    "text-embedding-3-small": 4,
+}
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+_upstream_timer: ContextVar["UpstreamTimer | None"] = ContextVar("upstream_timer", default=None)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class UpstreamTimer:
+    """When the current attempt's request was sent, excluding time queued, throttled or backing off."""
+
+    def __init__(self) -> None:
+        self.sent_at: float | None = None
+
+    def elapsed(self) -> float:
+        """Seconds the latest attempt has been with OpenAI (0 if nothing was sent)."""
+        return time.monotonic() - self.sent_at if self.sent_at is not None else 0.0
+
+
+@contextmanager
+def upstream_timer() -> Iterator[UpstreamTimer]:
+    """Time the upstream part of the RateLimiter calls made (in this task) within the block."""
+    timer = UpstreamTimer()
+    token = _upstream_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _upstream_timer.reset(token)
+
+
+def _parse_concurrency(value: str | None) -> dict[str, int]:
+    limits = dict(DEFAULT_MODEL_CONCURRENCY)
+    for part in (value or "").split(","):
+        if "=" in part:
+            model, limit = part.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+def parse_reset(value: str | None) -> float | None:
+    """Parse OpenAI reset durations such as '1s', '6m0s' or '20ms' into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+class TokenBucket:
+    """Token bucket that refills its full capacity over one minute.
+
+    Capacity is unknown (unlimited) until the first rate-limit headers arrive.
+    """
+
+    def __init__(self, capacity: float | None = None) -> None:
+        self.capacity = capacity
+        self.level = capacity or 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.capacity is not None:
+            rate = self.capacity / 60.0
+            self.level = min(self.capacity, self.level + (now - self._updated) * rate)
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if available now)."""
+        if self.capacity is None:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.capacity / 60.0)
+
+    def consume(self, amount: float) -> None:
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: float | None, remaining: float | None) -> None:
+        """Adopt the server's view of the budget."""
+        self._refill()
+        if limit is not None:
+            self.capacity = limit
+        if remaining is not None:
+            self.level = remaining
+        elif self.capacity is not None:
+            self.level = min(self.level, self.capacity)
+
+
+class ModelBudget:
+    """Request/token buckets and a concurrency ceiling for one model."""
+
+    def __init__(self, concurrency: int) -> None:
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.concurrency = concurrency
+        self.lock = asyncio.Lock()
+        self.paused_until = 0.0
+
+
+class RateLimiter:
+    """Gates every OpenAI call through per-model RPM/TPM budgets.
+
+    Budgets are learned from the `x-ratelimit-*` response headers. Retryable
+    failures (429, 5xx, timeouts, connection errors) are retried with
+    jittered exponential backoff, honouring `retry-after` when present.
+    Which waiting call gets the next of a model's concurrency slots is up to
+    the scheduler (priority class, then per-user fair share).
+    """
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        concurrency: dict[str, int] | None = None,
+        scheduler: LLMScheduler | None = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.concurrency = concurrency or _parse_concurrency(os.getenv("OPENAI_CONCURRENCY"))
+        self.scheduler = scheduler or llm_scheduler
+        self._budgets: dict[str, ModelBudget] = {}
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def budget(self, model: str) -> ModelBudget:
+        if model not in self._budgets:
+            self._budgets[model] = ModelBudget(self.concurrency.get(model, DEFAULT_CONCURRENCY))
+        return self._budgets[model]
+
+    async def _reserve(self, budget: ModelBudget, tokens: int) -> None:
+        # Holding the lock while waiting keeps callers in FIFO order
+        async with budget.lock:
+            while True:
+                delay = max(
+                    budget.paused_until - time.monotonic(),
+                    budget.requests.delay_for(1),
+                    budget.tokens.delay_for(tokens),
+                )
+                if delay <= 0:
+                    budget.requests.consume(1)
+                    budget.tokens.consume(tokens)
+                    return
+                self.throttled_seconds += delay
+                await asyncio.sleep(delay)
+
+    def _update_from_headers(self, budget: ModelBudget, headers: httpx.Headers) -> None:
+        def number(name: str) -> float | None:
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        budget.requests.sync(number("x-ratelimit-limit-requests"), number("x-ratelimit-remaining-requests"))
+        budget.tokens.sync(number("x-ratelimit-limit-tokens"), number("x-ratelimit-remaining-tokens"))
+
+    @staticmethod
+    def _is_retryable(exc: Exception) -> bool:
+        if isinstance(exc, openai.RateLimitError):
+            # Out of credit is not going to fix itself
+            return getattr(exc, "code", None) != "insufficient_quota"
+        return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError))
+
+    @staticmethod
+    def _retry_after(exc: Exception) -> float | None:
+        response = getattr(exc, "response", None)
+        if response is None:
+            return None
+        if ms := response.headers.get("retry-after-ms"):
+            try:
+                return float(ms) / 1000
+            except ValueError:
+                pass
+        if seconds := response.headers.get("retry-after"):
+            try:
+                return float(seconds)
+            except ValueError:
+                pass
+        if isinstance(exc, openai.RateLimitError):
+            return parse_reset(response.headers.get("x-ratelimit-reset-requests")) or parse_reset(
+                response.headers.get("x-ratelimit-reset-tokens")
+            )
+        return None
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def call(
+        self,
+        model: str,
+        tokens: int,
+        fn: Callable[[], Awaitable[Any]],
+        priority: Priority = Priority.SUMMARY,
+    ) -> Any:
+        """Run `fn` (a raw-response API call) within the model's budget and return the parsed result."""
+        budget = self.budget(model)
+        attempt = 0
+        while True:
+            # Scheduled first, so the token budget is also spent in priority order
+            async with self.scheduler.slot(model, budget.concurrency, priority, tokens):
+                await self._reserve(budget, tokens)
+                self.calls += 1
+                if timer := _upstream_timer.get():
+                    timer.sent_at = time.monotonic()
+                try:
+                    raw = await fn()
+                except Exception as e:
+                    if not self._is_retryable(e) or attempt >= self.max_retries:
+                        self.failures += 1
+                        raise
+                    delay = self._backoff(attempt, self._retry_after(e))
+                    if isinstance(e, openai.RateLimitError):
+                        # Stop every caller for this model, not just this one
+                        budget.paused_until = max(budget.paused_until, time.monotonic() + delay)
+                    logger.warning(f"OpenAI {model} call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                    self.retries += 1
+                    attempt += 1
+                else:
+                    self._update_from_headers(budget, raw.headers)
+                    return raw.parse()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "models": {
+                model: {
+                    "concurrency": b.concurrency,
+                    "in_flight": self.scheduler.in_flight(model),
+                    "rpm_limit": b.requests.capacity,
+                    "rpm_remaining": round(b.requests.level, 1),
+                    "tpm_limit": b.tokens.capacity,
+                    "tpm_remaining": round(b.tokens.level, 1),
+                }
+                for model, b in self._budgets.items()
+            },
+        }
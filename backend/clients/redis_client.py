@@ -1,114 +1,228 @@
 """Redis client for vector search."""
 
 import os
-import re
-import json
-from typing import Any
+import asyncio
+from typing import TYPE_CHECKING, Any, TypedDict
 
-from redisvl.index import SearchIndex
+from redisvl.index import AsyncSearchIndex
 from redisvl.query import VectorQuery
+from redisvl.query.filter import FilterExpression, Num, Tag
+from redis.exceptions import ResponseError
 from dotenv import load_dotenv
 
+from .async_redis import get_async_redis
+
+if TYPE_CHECKING:
+    from .search_backend import ListingFilter
+
 load_dotenv()
 
-REDIS_URL = f"redis://default:{os.getenv('REDIS_PASSWORD')}@{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT')}"
 INDEX_NAME = "idx_flatshares_json"
+VECTOR_FIELD = "json_vector"
+QUERY_TIMEOUT_SECONDS = float(os.getenv("REDIS_QUERY_TIMEOUT_SECONDS", "3"))
+# Connections opened at startup so the first searches don't pay TCP/TLS setup
+WARM_CONNECTIONS = 4
+LISTING_URL = "https://spareroom.co.uk/flatshare/flatshare_detail.pl?flatshare_id="
+
+# Hash fields needed to pre-rank, score and display a candidate. The indexer
+# (scraping/listing_schema.py) normalizes these once, so nothing is parsed per query;
+# the long `detail` text and the `json_data` blob are left in Redis.
+CANDIDATE_FIELDS = [
+    "flatshare_id", "title", "summary", "rent", "rent_pcm", "rent_period",
+    "deposit_gbp", "min_term_months", "location", "postcode", "image_urls",
+    "available", "bills_included", "couples_ok", "furnishings", "gender",
+    "living_room", "minimum_term", "occupation", "num_flatmates", "parking",
+    "pets_ok", "property_type", "room_type",
+]
+
+
+class Listing(TypedDict, total=False):
+    """Candidate listing as returned by search (only the requested fields are set)."""
+
+    id: str
+    url: str
+    title: str
+    summary: str
+    rent: str
+    # Monthly rent; rent_period says whether the advertised `rent` was weekly
+    price: int
+    rent_period: str
+    deposit: int
+    min_term_months: int
+    location: str
+    postcode: str
+    imageUrl: str | None
+    image_urls: list[str]
+    available: str
+    bills_included: str
+    couples_ok: str
+    furnishings: str
+    gender: str
+    living_room: str
+    minimum_term: str
+    occupation: str
+    num_flatmates: str
+    parking: str
+    pets_ok: str
+    property_type: str
+    room_type: str
+    vector_distance: float
+
+
+def to_filter_expression(filters: "ListingFilter | None") -> FilterExpression | None:
+    """Translate a ListingFilter into a RediSearch filter expression."""
+    if filters is None:
+        return None
+    clauses: list[FilterExpression] = []
+    if filters.max_rent:
+        clauses.append((Num("rent_pcm") > 0) & (Num("rent_pcm") <= filters.max_rent))
+    if filters.min_rent:
+        clauses.append(Num("rent_pcm") >= filters.min_rent)
+    for field in filters.required_yes:
+        clauses.append(Tag(field) == "yes")
+    for field, value in filters.tags:
+        clauses.append(Tag(field) == value)
+
+    if not clauses:
+        return None
+    expression = clauses[0]
+    for clause in clauses[1:]:
+        expression = expression & clause
+    return expression
+
+
+class VectorSizeChanged(Exception):
+    """The index was rebuilt with a different vector size; embed the query again at `dims`."""
+
+    def __init__(self, dims: int) -> None:
+        super().__init__(f"Index now stores {dims}-dim vectors")
+        self.dims = dims
+
+
+def _is_vector_size_error(error: ResponseError) -> bool:
+    # e.g. "query vector blob size (6144) does not match index's expected size (3072)"
+    return "blob size" in str(error)
 
 
 class RedisClient:
-    """Client for Redis vector search operations."""
+    """Async client for Redis vector search operations.
 
-    def __init__(self) -> None:
-        self._index: SearchIndex | None = None
+    Queries run on the shared async connection pool so they never block the
+    event loop. Call connect() at startup to load the index schema up front;
+    the schema's vector dims and datatype decide how queries are embedded
+    and encoded, so a re-indexed catalog needs no backend config change.
+    A query rejected for its vector size reloads the schema (see search).
+    """
 
-    @property
-    def index(self) -> SearchIndex:
-        """Lazy-load the Redis index."""
-        if self._index is None:
-            self._index = SearchIndex.from_existing(INDEX_NAME, redis_url=REDIS_URL)
+    def __init__(self) -> None:
+        self._index: AsyncSearchIndex | None = None
+        self._dims = 0
+        self._dtype = "float32"
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self, reload: bool = False) -> AsyncSearchIndex:
+        """Load the index schema over the shared pool and warm a connection.
+
+        With `reload`, the schema is read again even if already loaded.
+        """
+        async with self._connect_lock:
+            if self._index is None or reload:
+                client = get_async_redis()
+                if client is None:
+                    raise RuntimeError("REDIS_HOST is not configured")
+                index = await AsyncSearchIndex.from_existing(INDEX_NAME, redis_client=client)
+                attrs = index.schema.fields[VECTOR_FIELD].attrs
+                self._dims = attrs.dims  # type: ignore[attr-defined]
+                self._dtype = attrs.datatype.value.lower()  # type: ignore[attr-defined]
+                self._index = index
+                # Concurrent pings each check out their own pooled connection
+                await asyncio.gather(*(client.ping() for _ in range(WARM_CONNECTIONS)))
         return self._index
 
-    def search(self, query_embedding: list[float], top_k: int = 50) -> list[dict[str, Any]]:
-        """Vector similarity search."""
+    async def search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 50,
+        filters: "ListingFilter | None" = None,
+        return_fields: list[str] | None = None
+    ) -> list[Listing]:
+        """Vector similarity search, bounded by QUERY_TIMEOUT_SECONDS.
+
+        With filters, Redis applies them before the KNN so every result is
+        already eligible. Only `return_fields` (default
+        CANDIDATE_FIELDS) are transferred and decoded.
+
+        If Redis rejects the query vector's size, the index was rebuilt since
+        the schema was loaded: the schema is reloaded and the query retried
+        once, or VectorSizeChanged is raised when the embedding itself has the
+        wrong number of dimensions.
+        """
+        index = self._index or await self.connect()
+        try:
+            results = await self._query(index, query_embedding, top_k, filters, return_fields)
+        except ResponseError as e:
+            if not _is_vector_size_error(e):
+                raise
+            index = await self.connect(reload=True)
+            if len(query_embedding) != self._dims:
+                raise VectorSizeChanged(self._dims) from e
+            # Same dims, different datatype: the reloaded schema encodes it right
+            results = await self._query(index, query_embedding, top_k, filters, return_fields)
+        return [self._parse_result(doc) for doc in results]
+
+    async def _query(
+        self,
+        index: AsyncSearchIndex,
+        query_embedding: list[float],
+        top_k: int,
+        filters: "ListingFilter | None",
+        return_fields: list[str] | None
+    ) -> list[dict[str, Any]]:
         query = VectorQuery(
             vector=query_embedding,
-            vector_field_name="json_vector",
-            return_fields=["flatshare_id", "json_data", "images", "rent", "postcode"],
-            num_results=top_k
+            vector_field_name=VECTOR_FIELD,
+            dtype=self._dtype,
+            return_fields=return_fields or CANDIDATE_FIELDS,
+            num_results=top_k,
+            filter_expression=to_filter_expression(filters)
         )
-        results = self.index.query(query)
-        return [self._parse_result(doc) for doc in results]
+        return await asyncio.wait_for(index.query(query), timeout=QUERY_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _parse_result(doc: dict[str, Any]) -> Listing:
+        """Map the returned hash fields onto a Listing (only fields that were requested)."""
+        listing: Listing = {}
+        for field, value in doc.items():
+            if field == "flatshare_id":
+                listing["id"] = value
+                listing["url"] = f"{LISTING_URL}{value}"
+            elif field == "rent_pcm":
+                listing["price"] = int(float(value or 0))
+            elif field == "deposit_gbp":
+                listing["deposit"] = int(float(value or 0))
+            elif field == "min_term_months":
+                listing["min_term_months"] = int(float(value or 0))
+            elif field == "image_urls":
+                images = value.split("\n") if value else []
+                listing["image_urls"] = images
+                listing["imageUrl"] = images[0] if images else None
+            elif field == "vector_distance":
+                listing["vector_distance"] = float(value or 0)
+            elif field in Listing.__annotations__:
+                listing[field] = value
+        return listing
+
+    async def vector_dimensions(self) -> int:
+        """Size of the indexed vectors, which query embeddings must match."""
+        if self._index is None:
+            await self.connect()
+        return self._dims
 
-    def _parse_result(self, doc: dict[str, Any]) -> dict[str, Any]:
-        """Parse Redis doc into listing dict."""
-        data: dict[str, Any] = json.loads(doc.get("json_data", "{}"))
-        images = self._parse_images(doc.get("images", "[]"))
-
-        return {
-            "id": doc.get("flatshare_id"),
-            "title": f"{data.get('room_type', 'Room')} in {data.get('location', 'London')}",
-            "price": self._parse_rent(data.get("rent")),
-            "location": data.get("location", ""),
-            "postcode": data.get("postcode", ""),
-            "imageUrl": images[0] if images else None,
-            "image_urls": images,
-            "summary": self._build_summary(data),
-            "url": f"https://spareroom.co.uk/flatshare/flatshare_detail.pl?flatshare_id={doc.get('flatshare_id')}",
-            "available": data.get("available"),
-            "bills_included": data.get("bills_included"),
-            "couples_ok": data.get("couples_ok"),
-            "deposit": data.get("deposit"),
-            "detail": data.get("detail"),
-            "furnishings": data.get("furnishings"),
-            "gender": data.get("gender"),
-            "living_room": data.get("living_room"),
-            "minimum_term": data.get("minimum_term"),
-            "occupation": data.get("occupation"),
-            "num_flatmates": data.get("num_flatmates"),
-            "parking": data.get("parking"),
-            "pets_ok": data.get("pets_ok"),
-            "property_type": data.get("property_type"),
-            "room_type": data.get("room_type"),
-            "vector_distance": doc.get("vector_distance", 0),
-        }
-
-    def _parse_rent(self, rent_str: Any) -> int:
-        """Parse rent string to integer."""
-        if not rent_str:
-            return 0
-        match = re.search(r'[\d,]+', str(rent_str).replace(',', ''))
-        return int(float(match.group())) if match else 0
-
-    def _parse_images(self, images_str: str) -> list[str]:
-        """Parse images JSON to list of URLs."""
-        if not images_str or images_str == "Unknown":
-            return []
-        try:
-            images = json.loads(images_str)
-            return images[:5] if isinstance(images, list) else []
-        except (json.JSONDecodeError, TypeError):
-            return []
-
-    def _build_summary(self, data: dict[str, Any]) -> str:
-        """Build a summary from listing data."""
-        parts: list[str] = []
-        if data.get("room_type"):
-            parts.append(data["room_type"])
-        if data.get("location"):
-            parts.append(f"in {data['location']}")
-        if data.get("rent"):
-            parts.append(f"- {data['rent']}")
-        if data.get("detail"):
-            detail = str(data["detail"])[:150]
-            if len(str(data.get("detail", ""))) > 150:
-                detail += "..."
-            parts.append(f". {detail}")
-        return " ".join(parts) if parts else "No description available"
-
-    def ping(self) -> bool:
+    async def ping(self) -> bool:
         """Check Redis connection."""
         try:
-            return self.index is not None
+            client = get_async_redis()
+            return client is not None and bool(await client.ping())
         except Exception:
             return False
 
@@ -0,0 +1,162 @@
+"""Cache of LLM listing scores keyed by (listing, preferences) fingerprint."""
+
+import os
+import time
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any
+
+from redis.asyncio import Redis
+
+from .async_redis import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "scorecache"
+# Bumped by the indexer on a full rebuild; incremental upserts change the listing fingerprint instead
+GENERATION_KEY = f"{CACHE_PREFIX}:generation"
+DEFAULT_TTL_SECONDS = int(os.getenv("SCORE_CACHE_TTL_SECONDS", str(24 * 3600)))
+# In-process fallback when Redis is not configured
+LOCAL_MAX_ENTRIES = 5000
+
+# Fields that vary per query rather than per listing
+_VOLATILE_LISTING_FIELDS = {"vector_distance", "prerank_score"}
+
+
+def _fingerprint(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _canonical(value: Any) -> Any:
+    """Drop nulls and normalise whitespace/case so equivalent preferences hash equal."""
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_canonical(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    return value
+
+
+def listing_fingerprint(listing: dict[str, Any]) -> str:
+    """Hash of the listing contents the scorer sees."""
+    return _fingerprint({k: v for k, v in listing.items() if k not in _VOLATILE_LISTING_FIELDS})
+
+
+def preferences_fingerprint(ideal: dict[str, Any], summary: str) -> str:
+    """Canonical hash of the ideal listing and conversation summary."""
+    return _fingerprint({"ideal": _canonical(ideal), "summary": _canonical(summary)})
+
+
+def conversation_fingerprint(conversation: list[dict[str, str]]) -> str:
+    """Hash of a conversation, used to memoise the ideal listing and summary."""
+    return _fingerprint([[m["role"], m["content"]] for m in conversation])
+
+
+class ScoreCache:
+    """Memoises listing scores so repeat searches skip the LLM for unchanged candidates.
+
+    Keys combine the index generation, listing id, listing contents and the
+    user's preferences. A full re-index bumps the generation, which invalidates
+    every entry at once. Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS, redis: Redis | None = None) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._redis = redis
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._local_generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def redis(self) -> Redis | None:
+        return self._redis or get_async_redis()
+
+    async def generation(self) -> int:
+        """Current index generation."""
+        if self.redis is None:
+            return self._local_generation
+        try:
+            return int(await self.redis.get(GENERATION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"Score cache generation read failed: {e}")
+            return -1
+
+    async def invalidate(self) -> None:
+        """Invalidate all cached scores (called after a re-index)."""
+        self._local.clear()
+        self._local_generation += 1
+        if self.redis is not None:
+            await self.redis.incr(GENERATION_KEY)
+
+    @staticmethod
+    def score_key(generation: int, listing: dict[str, Any], preferences_hash: str) -> str:
+        return f"{CACHE_PREFIX}:{generation}:{listing.get('id')}:{listing_fingerprint(listing)}:{preferences_hash}"
+
+    @staticmethod
+    def preferences_key(generation: int, conversation_hash: str) -> str:
+        return f"{CACHE_PREFIX}:{generation}:prefs:{conversation_hash}"
+
+    async def _mget(self, keys: list[str]) -> list[Any]:
+        if not keys:
+            return []
+        if self.redis is None:
+            now = time.time()
+            raw: list[str | None] = []
+            for key in keys:
+                entry = self._local.get(key)
+                raw.append(entry[1] if entry and entry[0] > now else None)
+        else:
+            try:
+                raw = await self.redis.mget(keys)
+            except Exception as e:
+                logger.warning(f"Score cache read failed: {e}")
+                raw = [None] * len(keys)
+        return [json.loads(r) if r is not None else None for r in raw]
+
+    async def _set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        if self.redis is None:
+            self._local[key] = (time.time() + self.ttl_seconds, payload)
+            self._local.move_to_end(key)
+            while len(self._local) > LOCAL_MAX_ENTRIES:
+                self._local.popitem(last=False)
+            return
+        try:
+            await self.redis.set(key, payload, ex=self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Score cache write failed: {e}")
+
+    async def get_scores(self, keys: list[str]) -> list[dict[str, Any] | None]:
+        """Look up cached scores; None marks a miss."""
+        results = await self._mget(keys)
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    async def set_score(self, key: str, score: dict[str, Any]) -> None:
+        await self._set(key, score)
+
+    async def get_preferences(self, key: str) -> tuple[dict[str, Any], str] | None:
+        """Look up a memoised (ideal listing, summary) pair."""
+        cached = (await self._mget([key]))[0]
+        return (cached["ideal"], cached["summary"]) if cached else None
+
+    async def set_preferences(self, key: str, ideal: dict[str, Any], summary: str) -> None:
+        await self._set(key, {"ideal": ideal, "summary": summary})
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+score_cache = ScoreCache()
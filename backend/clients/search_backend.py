@@ -0,0 +1,71 @@
+"""Search backend interface shared by the Redis and in-process NumPy engines."""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from dotenv import load_dotenv
+
+from .redis_client import Listing, VectorSizeChanged
+
+load_dotenv()
+
+# "redis" (RediSearch KNN) or "numpy" (exact search over a local snapshot)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "redis")
+
+
+@dataclass(frozen=True)
+class ListingFilter:
+    """Hard requirements applied before the KNN, independent of the backend.
+
+    Rents are monthly (the rent_pcm field); tag values are lowercase, as indexed.
+    """
+
+    max_rent: float | None = None
+    min_rent: float | None = None
+    # Tag fields that must be "yes"
+    required_yes: tuple[str, ...] = ()
+    # (tag field, value) pairs that must match exactly
+    tags: tuple[tuple[str, str], ...] = field(default=())
+
+    def is_empty(self) -> bool:
+        return not (self.max_rent or self.min_rent or self.required_yes or self.tags)
+
+
+class SearchBackend(Protocol):
+    """What match_service needs from a vector search engine."""
+
+    async def connect(self) -> Any:
+        """Load the index up front so the first search doesn't pay for it."""
+        ...
+
+    async def search(
+        self,
+        query_embedding: list[float],
+        top_k: int = 50,
+        filters: ListingFilter | None = None,
+        return_fields: list[str] | None = None
+    ) -> list[Listing]:
+        """Top-k listings by cosine distance, ascending, with the filters applied first.
+
+        Raises VectorSizeChanged if the index now expects a different embedding size.
+        """
+        ...
+
+    async def vector_dimensions(self) -> int:
+        """Embedding size the index was built with; query embeddings must match it."""
+        ...
+
+    async def ping(self) -> bool:
+        ...
+
+
+def get_search_backend(name: str = SEARCH_BACKEND) -> SearchBackend:
+    """Return the process-wide backend selected by SEARCH_BACKEND."""
+    if name == "redis":
+        from .redis_client import redis_client
+        return redis_client
+    if name == "numpy":
+        from .numpy_search import numpy_search
+        return numpy_search
+    raise ValueError(f"Unknown SEARCH_BACKEND: {name!r} (expected 'redis' or 'numpy')")
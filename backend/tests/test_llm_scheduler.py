@@ -0,0 +1,46 @@
+import asyncio
+import unittest
+
+from clients.llm_scheduler import LLMScheduler, Priority, set_current_user
+
+
+class ScoringCapTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.scheduler = LLMScheduler(scoring_cap=4, weights={})
+        self.release = asyncio.Event()
+        self.started: list[str] = []
+
+    async def _score(self, user, count, concurrency):
+        """Start `count` scoring calls for `user`, each holding its slot until `release` is set."""
+        async def call():
+            set_current_user(user)
+            async with self.scheduler.slot("m", concurrency, Priority.SCORING, cost=100):
+                self.started.append(user)
+                await self.release.wait()
+
+        tasks = [asyncio.create_task(call()) for _ in range(count)]
+        await asyncio.sleep(0)
+        return tasks
+
+    async def test_lone_user_is_not_capped(self):
+        tasks = await self._score("a", 15, concurrency=20)
+
+        self.assertEqual(self.scheduler.in_flight("m"), 15)
+        self.assertEqual(self.scheduler.stats()["scoring_cap_deferrals"], 0)
+        self.release.set()
+        await asyncio.gather(*tasks)
+
+    async def test_capped_user_yields_freed_slots(self):
+        tasks = await self._score("a", 10, concurrency=6)
+        tasks += await self._score("b", 2, concurrency=6)
+
+        # "a" took every slot while alone, but is over the cap once "b" waits
+        self.assertEqual(self.started, ["a"] * 6)
+        self.release.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(self.started[6:8], ["b", "b"])
+        self.assertEqual(self.scheduler.in_flight("m"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
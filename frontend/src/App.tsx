@@ -26,6 +26,7 @@ function AppContent() {
     blacklistedIds,
     scoringProgress,
     searchSuggested,
+    streamingReply,
     setActiveTab,
     sendMessage,
     searchListings,
@@ -115,6 +116,7 @@ function AppContent() {
             onSearch={searchListings}
             loading={chatLoading || listingsLoading}
             searchSuggested={searchSuggested}
+            streamingReply={streamingReply}
           />
         </Box>
         <Box sx={{ width: '40%', height: '100%', overflow: 'auto' }}>
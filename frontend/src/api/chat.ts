@@ -1,4 +1,5 @@
 import { apiClient } from "./client";
+import type { Rule } from "../types";
 
 export interface Message {
     role: "user" | "assistant" | "system";
@@ -7,10 +8,18 @@ export interface Message {
 
 export interface ChatResponse {
     assistantMessage: string;
-    hardRules: any[];
+    hardRules: Rule[];
     searchSuggested?: boolean;
 }
 
+// Events from /chat-stream: tokens as generated; rules and searchSuggested once extracted
+export type ChatStreamEvent =
+    | { type: "token"; content: string }
+    | { type: "rules"; hardRules: Rule[] }
+    | { type: "searchSuggested"; searchSuggested: boolean }
+    | { type: "error"; detail: string }
+    | { type: "done"; assistantMessage: string };
+
 export interface MatchResponse {
     idealListing: any;
     summary: string;
@@ -18,20 +27,42 @@ export interface MatchResponse {
 }
 
 export const chatApi = {
-    sendMessage: async (message: string, history: Message[], token: string): Promise<ChatResponse> => {
+    sendMessage: async (message: string, history: Message[], rules: Rule[], token: string): Promise<ChatResponse> => {
+        // Current rules let the backend extract only what the new message changes
         return apiClient.post<ChatResponse>("/chat", {
             message,
             conversation_history: history,
+            hard_rules: rules,
         }, token);
     },
 
+    sendMessageStream: async (
+        message: string,
+        history: Message[],
+        rules: Rule[],
+        onEvent: (event: ChatStreamEvent) => void,
+        token: string
+    ): Promise<void> => {
+        return apiClient.streamPost("/chat-stream", {
+            message,
+            conversation_history: history,
+            hard_rules: rules,
+        }, onEvent, token);
+    },
+
 
 
     findMatchesStream: async (
         conversation: Message[],
+        rules: Rule[],
         onMessage: (data: any) => void,
-        token: string
+        token: string,
+        signal?: AbortSignal
     ): Promise<void> => {
-        return apiClient.streamPost("/find-matches-stream", { conversation }, onMessage, token);
+        // Rules let the backend start retrieval before it has summarised the conversation.
+        // Aborting closes the connection, which stops the backend's scoring calls.
+        return apiClient.streamPost(
+            "/find-matches-stream", { conversation, hard_rules: rules }, onMessage, token, signal
+        );
     }
 };
@@ -31,7 +31,13 @@ export const apiClient = {
         return response.json();
     },
 
-    async streamPost(endpoint: string, body: any, onMessage: (data: any) => void, token?: string): Promise<void> {
+    async streamPost(
+        endpoint: string,
+        body: any,
+        onMessage: (data: any) => void,
+        token?: string,
+        signal?: AbortSignal
+    ): Promise<void> {
         const headers: HeadersInit = {
             "Content-Type": "application/json",
             "Accept": "text/event-stream",
@@ -44,6 +50,7 @@ export const apiClient = {
             method: "POST",
             headers,
             body: JSON.stringify(body),
+            signal,
         });
 
         if (!response.ok) {
@@ -9,15 +9,17 @@ interface ChatPanelProps {
   onSearch: () => void;
   loading: boolean;
   searchSuggested: boolean;
+  // Partial assistant reply while it streams in
+  streamingReply?: string | null;
 }
 
-export default function ChatPanel({ messages, onSend, onSearch, loading, searchSuggested }: ChatPanelProps) {
+export default function ChatPanel({ messages, onSend, onSearch, loading, searchSuggested, streamingReply }: ChatPanelProps) {
   const [input, setInput] = useState('');
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages]);
+  }, [messages, streamingReply]);
 
   const handleSend = () => {
     if (input.trim() && !loading) {
@@ -97,7 +99,28 @@ export default function ChatPanel({ messages, onSend, onSearch, loading, searchS
           </Box>
         ))}
 
-        {loading && (
+        {streamingReply && (
+          <Box sx={{ display: 'flex', justifyContent: 'flex-start', mb: 2 }}>
+            <Paper
+              elevation={0}
+              sx={{
+                p: 2,
+                maxWidth: '75%',
+                bgcolor: 'background.default',
+                color: 'text.primary',
+                borderRadius: 2,
+                border: '1px solid',
+                borderColor: 'divider',
+              }}
+            >
+              <Typography variant="body2" sx={{ lineHeight: 1.6 }}>
+                {streamingReply}
+              </Typography>
+            </Paper>
+          </Box>
+        )}
+
+        {loading && !streamingReply && (
           <Box sx={{ display: 'flex', justifyContent: 'flex-start', mb: 2 }}>
             <Paper
               elevation={0}
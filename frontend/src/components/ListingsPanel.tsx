@@ -72,6 +72,8 @@ export interface ListingWithScore extends Listing {
   score?: number;
   reasoning?: string;
   priceLabel?: string;
+  // Not scored before the search's deadline; ranked by similarity and stated preferences
+  unscored?: boolean;
 }
 
 interface ListingsPanelProps {
@@ -274,6 +276,14 @@ export default function ListingsPanel({
                             sx={{ fontWeight: 600, fontSize: '0.7rem', height: 22 }}
                           />
                         )}
+                        {!listing.score && listing.unscored && (
+                          <Chip
+                            label="Not scored"
+                            size="small"
+                            variant="outlined"
+                            sx={{ fontSize: '0.7rem', height: 22 }}
+                          />
+                        )}
                       </Box>
 
                       <Typography variant="body1" color="primary" fontWeight={700} sx={{ mb: 0.5 }}>
@@ -3,7 +3,7 @@ import { useAuth } from '../contexts/AuthContext';
 import { useConversation } from './useConversation';
 import { useSavedListings } from './useSavedListings';
 import { useRules } from './useRules';
-import { chatApi, ChatResponse, MatchResponse } from '../api/chat';
+import { chatApi, ChatStreamEvent, MatchResponse } from '../api/chat';
 import { normalizeRent } from '../utils/rent';
 import type { ChatMessage } from '../types';
 import { ListingWithScore } from '../components/ListingsPanel';
@@ -32,6 +32,8 @@ export function useChatController() {
     const [activeTab, setActiveTab] = useState(0);
     const [scoringProgress, setScoringProgress] = useState<{ scored: number; total: number }>({ scored: 0, total: 0 });
     const [searchSuggested, setSearchSuggested] = useState(false);
+    // Assistant reply as it streams in, until it is saved as a message
+    const [streamingReply, setStreamingReply] = useState<string | null>(null);
 
     // AbortController refs to cancel in-flight requests
     const chatAbortRef = useRef<AbortController | null>(null);
@@ -50,9 +52,13 @@ export function useChatController() {
     };
 
     const handleStreamUpdate = (data: any) => {
-        if (data.type === 'init') {
+        if (data.type === 'preview') {
+            // Early candidates from the user's own words, replaced by 'init'
+            setListings((data.preranked || []).map(normalizeRent));
+        } else if (data.type === 'init') {
             setScoringProgress({ scored: 0, total: data.total });
-            setListings([]); // Clear old listings
+            // Show candidates in pre-ranked order until their scores arrive
+            setListings((data.preranked || []).map(normalizeRent));
         } else if (data.type === 'score') {
             const match = data.match;
             const newListing: ListingWithScore = {
@@ -62,17 +68,40 @@ export function useChatController() {
             };
 
             setListings(prev => {
-                const updated = [...prev, newListing];
-                // Sort by score descending
+                const updated = [...prev.filter(l => l.id !== newListing.id), newListing];
+                // Sort by score descending (stable, so unscored keep pre-ranked order)
                 return updated.sort((a, b) => (b.score || 0) - (a.score || 0));
             });
 
             setScoringProgress(prev => ({ ...prev, scored: prev.scored + 1 }));
+        } else if (data.type === 'unscored') {
+            // Ran out of time (or scoring is unavailable): these keep their pre-ranked order
+            const ids = new Set((data.listings || []).map((u: any) => u.listing.id));
+            setListings(prev => prev.map(l => (ids.has(l.id) ? { ...l, unscored: true } : l)));
         } else if (data.type === 'done') {
             setListingsLoading(false);
         }
     };
 
+    // Start a find-matches stream, aborting any previous one so its scoring stops
+    const startMatchStream = (matchRules: typeof rules, token: string) => {
+        matchAbortRef.current?.abort();
+        const controller = new AbortController();
+        matchAbortRef.current = controller;
+        return chatApi.findMatchesStream(
+            getConversationHistory(),
+            matchRules,
+            handleStreamUpdate,
+            token,
+            controller.signal
+        );
+    };
+
+    const isAbort = (err: unknown) => err instanceof DOMException && err.name === 'AbortError';
+
+    // Stop scoring if the user leaves mid-search
+    useEffect(() => () => matchAbortRef.current?.abort(), []);
+
     const searchListings = async () => {
         if (!conversation || !session?.access_token) return;
 
@@ -80,11 +109,7 @@ export function useChatController() {
         setScoringProgress({ scored: 0, total: 0 });
 
         try {
-            await chatApi.findMatchesStream(
-                getConversationHistory(),
-                handleStreamUpdate,
-                session.access_token
-            );
+            await startMatchStream(rules, session.access_token);
 
             // Post-search feedback from assistant
             await addMessages([{
@@ -93,16 +118,15 @@ export function useChatController() {
             }]);
 
         } catch (err) {
+            // A newer search replaced this one and owns the loading state now
+            if (isAbort(err)) return;
             console.error('Search failed:', err);
             // Optionally notify user via a toast or message
-        } finally {
-            // Note: handleStreamUpdate handles loading=false on 'done' event, 
-            // but we ensure it's reset on error too.
-            // However, we don't want to conflict if the stream is still closing?
-            // With await, the stream is done or errored.
-            setListingsLoading(false);
-            setSearchSuggested(false);
         }
+        // Note: handleStreamUpdate handles loading=false on 'done' event,
+        // but we ensure it's reset on error too.
+        setListingsLoading(false);
+        setSearchSuggested(false);
     };
 
     const sendMessage = async (text: string) => {
@@ -125,26 +149,39 @@ export function useChatController() {
         setChatLoading(true);
 
         try {
-            // 3. Call API
-            const chatData: ChatResponse = await chatApi.sendMessage(
+            // 3. Stream the reply; rules and the search hint arrive as separate events
+            let assistantMessage = null as string | null;
+            let rulesSaved: Promise<unknown> = Promise.resolve();
+            await chatApi.sendMessageStream(
                 text,
                 conversationHistory,
+                rules,
+                (event: ChatStreamEvent) => {
+                    if (event.type === 'token') {
+                        setStreamingReply(prev => (prev ?? '') + event.content);
+                    } else if (event.type === 'rules') {
+                        rulesSaved = saveRules(event.hardRules);
+                    } else if (event.type === 'searchSuggested') {
+                        if (event.searchSuggested) setSearchSuggested(true);
+                    } else if (event.type === 'done') {
+                        assistantMessage = event.assistantMessage;
+                    } else if (event.type === 'error') {
+                        console.error('Chat stream error:', event.detail);
+                    }
+                },
                 session.access_token
             );
+            await rulesSaved;
+
+            if (!assistantMessage) {
+                throw new Error('Chat stream ended without a reply');
+            }
 
             // 4. Add assistant response
             await addMessages([
-                { role: 'assistant', content: chatData.assistantMessage }
+                { role: 'assistant', content: assistantMessage }
             ]);
 
-            if (chatData.hardRules) {
-                await saveRules(chatData.hardRules);
-            }
-
-            if (chatData.searchSuggested) {
-                setSearchSuggested(true);
-            }
-
             // AUTO-SEARCH REMOVED: Search is now manually triggered via searchListings
             // or we could prompt the user via UI state.
 
@@ -154,6 +191,7 @@ export function useChatController() {
                 { role: 'assistant', content: 'Sorry, something went wrong.' }
             ]);
         } finally {
+            setStreamingReply(null);
             setChatLoading(false);
         }
     };
@@ -170,13 +208,10 @@ export function useChatController() {
                 setListingsLoading(true);
                 setScoringProgress({ scored: 0, total: 0 });
 
-                await chatApi.findMatchesStream(
-                    getConversationHistory(),
-                    handleStreamUpdate,
-                    session.access_token
-                );
+                await startMatchStream(newRules, session.access_token);
             }
         } catch (err) {
+            if (isAbort(err)) return;
             console.error('Failed to update rules:', err);
             setListingsLoading(false);
         }
@@ -222,6 +257,7 @@ export function useChatController() {
         listingsLoading,
         scoringProgress,
         searchSuggested,
+        streamingReply,
         blacklistedIds: blacklistedIds(),
 
         // Actions
@@ -38,6 +38,8 @@ export interface Listing {
   title: string;
   price: number;
   priceLabel?: string;
+  rent?: string;
+  rent_period?: 'pw' | 'pcm';
   location: string;
   postcode?: string;
   summary: string;
@@ -0,0 +1,67 @@
+"""Benchmark listing parser engines over saved detail pages.
+
+Usage: python scraping/benchmark_parsers.py [pages...] [--repeat N] [--workers N]
+
+Pages are HTML files saved from listing detail pages (get_listing.py writes
+listing_response.txt). Each engine's output is compared with html.parser,
+the reference implementation.
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from listing_parser import DEFAULT_ENGINE, ENGINES, get_parser, parse_listing
+
+
+def available_engines():
+    engines = []
+    for engine in ENGINES:
+        try:
+            get_parser(engine)
+        except ImportError:
+            print(f"Skipping {engine} (not installed)")
+            continue
+        engines.append(engine)
+    return engines
+
+
+def run(engine, pages, workers):
+    """Parse every page once, returning (results, seconds)."""
+    ids = [str(i) for i in range(len(pages))]
+    started = time.perf_counter()
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_listing, ids, pages, [engine] * len(pages), chunksize=8))
+    else:
+        results = [parse_listing(flatshare_id, html, engine) for flatshare_id, html in zip(ids, pages)]
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", default=["listing_response.txt"])
+    parser.add_argument("--repeat", type=int, default=50, help="times each page is parsed")
+    parser.add_argument("--workers", type=int, default=0, help="also time a process pool of this size")
+    args = parser.parse_args()
+
+    fixtures = []
+    for path in args.pages:
+        with open(path, encoding="utf-8") as f:
+            fixtures.append(f.read())
+    pages = fixtures * args.repeat
+
+    print(f"{len(fixtures)} page(s) x {args.repeat}")
+    print(f"{'engine':>12} {'workers':>8} {'pages/s':>10} {'identical':>10}")
+    reference = None
+    for engine in available_engines():
+        for workers in sorted({0, args.workers}):
+            results, seconds = run(engine, pages, workers)
+            if reference is None and engine == DEFAULT_ENGINE:
+                reference = results
+            identical = results == reference
+            print(f"{engine:>12} {workers:>8} {len(pages) / seconds:>10.1f} {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""SQLite crawl state, so daily crawls only fetch what changed.
+
+Records every flatshare_id with when it was first seen, last seen live (in
+search results or by a successful detail fetch) and last fetched, plus the
+parsed listing and its content hash.
+Search results are sorted by day, so paging can stop at the first page with
+no new listings; detail pages are only fetched for new listings and ones due
+for a refresh. Each fetch is committed as it happens and the current search
+offset is kept per run, so an interrupted crawl resumes where it stopped.
+"""
+
+import json
+import time
+import hashlib
+import sqlite3
+
+STATE_PATH = 'scraping/crawl_state.db'
+# Known listings are re-fetched this often to pick up edits
+REFRESH_AFTER_SECONDS = 7 * 24 * 3600
+# Listings not seen in search results or fetched for this long are treated as gone
+ACTIVE_SECONDS = 30 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    flatshare_id TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_fetched REAL,
+    content_hash TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    next_offset INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def listing_hash(listing):
+    return hashlib.sha256(json.dumps(listing, sort_keys=True).encode()).hexdigest()
+
+
+class CrawlState:
+    def __init__(self, path=STATE_PATH, refresh_after=REFRESH_AFTER_SECONDS, active_for=ACTIVE_SECONDS):
+        self.refresh_after = refresh_after
+        self.active_for = active_for
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.run_id = None
+        self.run_started = None
+
+    def close(self):
+        self.db.close()
+
+    def start_run(self):
+        """Resume the last unfinished run, or start a new one. Returns the offset to page from."""
+        row = self.db.execute(
+            "SELECT id, started_at, next_offset FROM runs WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if row:
+            self.run_id, self.run_started, next_offset = row
+            print(f"Resuming crawl from offset {next_offset}")
+            return next_offset
+        self.run_started = time.time()
+        with self.db:
+            self.run_id = self.db.execute("INSERT INTO runs (started_at) VALUES (?)", (self.run_started,)).lastrowid
+        return 0
+
+    def page_done(self, next_offset):
+        with self.db:
+            self.db.execute("UPDATE runs SET next_offset = ? WHERE id = ?", (next_offset, self.run_id))
+
+    def finish_run(self):
+        with self.db:
+            self.db.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), self.run_id))
+
+    def mark_seen(self, flatshare_ids):
+        """Record IDs from a search page; returns the ones never seen before."""
+        now = time.time()
+        known = self._known(flatshare_ids)
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO listings (flatshare_id, first_seen, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT (flatshare_id) DO UPDATE SET last_seen = excluded.last_seen",
+                [(flatshare_id, now, now) for flatshare_id in flatshare_ids],
+            )
+        return [flatshare_id for flatshare_id in flatshare_ids if flatshare_id not in known]
+
+    def _known(self, flatshare_ids):
+        if not flatshare_ids:
+            return set()
+        placeholders = ",".join("?" * len(flatshare_ids))
+        rows = self.db.execute(
+            f"SELECT flatshare_id FROM listings WHERE flatshare_id IN ({placeholders})", list(flatshare_ids)
+        )
+        return {row[0] for row in rows}
+
+    def due(self):
+        """Active listings never fetched, or last fetched before the refresh interval."""
+        now = time.time()
+        rows = self.db.execute(
+            "SELECT flatshare_id FROM listings "
+            "WHERE last_seen >= ? AND (last_fetched IS NULL OR last_fetched < ?) "
+            "ORDER BY first_seen DESC",
+            (now - self.active_for, now - self.refresh_after),
+        )
+        return [row[0] for row in rows]
+
+    def record_fetch(self, flatshare_id, listing):
+        """Store a fetched listing; returns True if its content changed.
+
+        A detail page that still loads means the listing is live, so this also
+        counts as seeing it: paging stops at known listings and would otherwise
+        never see older ones again.
+        """
+        content_hash = listing_hash(listing)
+        now = time.time()
+        with self.db:
+            row = self.db.execute(
+                "SELECT content_hash FROM listings WHERE flatshare_id = ?", (flatshare_id,)
+            ).fetchone()
+            self.db.execute(
+                "UPDATE listings SET last_seen = ?, last_fetched = ?, content_hash = ?, data = ? "
+                "WHERE flatshare_id = ?",
+                (now, now, content_hash, json.dumps(listing), flatshare_id),
+            )
+        return row is None or row[0] != content_hash
+
+    def active_listings(self):
+        """Parsed listings seen within the active window, newest first."""
+        rows = self.db.execute(
+            "SELECT data FROM listings WHERE data IS NOT NULL AND last_seen >= ? ORDER BY first_seen DESC",
+            (time.time() - self.active_for,),
+        )
+        return [json.loads(row[0]) for row in rows]
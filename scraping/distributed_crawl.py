@@ -0,0 +1,345 @@
+"""Distributed crawl: a producer fills a Redis frontier, any number of workers drain it.
+
+    python scraping/distributed_crawl.py produce [--reset]
+    python scraping/distributed_crawl.py work [--concurrency N]
+    python scraping/distributed_crawl.py status
+    python scraping/distributed_crawl.py export [--csv]
+
+The producer walks the search pages and pushes each flatshare ID once (a
+shared seen-set dedupes across producers and runs). Workers pop an ID, which
+moves it to a processing set with a visibility deadline, fetch and parse the
+listing, then ack by storing the result. IDs whose deadline passes (a crashed
+or stuck worker) go back on the frontier; IDs that fail or time out
+MAX_ATTEMPTS times go to a dead set. The deadline doubles as the lease: a
+worker whose lease has expired can no longer ack or fail the ID. Every request, from every process, takes a token from a per-host bucket
+in Redis, so the combined rate stays polite whatever the worker count.
+
+Point CRAWL_REDIS_URL at a local Redis and SPAREROOM_BASE_URL at a local
+fixture server to try it without touching the live site.
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+
+from redis.asyncio import Redis
+
+from listing_parser import DEFAULT_ENGINE, ENGINES, get_parser
+from scrape import (
+    DEFAULT_HOST_CONCURRENCY,
+    DEFAULT_HOST_RATE,
+    SEARCH_ID,
+    fetch_listing_details,
+    ids_to_fetch,
+    make_client,
+    write_listings_csv,
+)
+
+KEY_PREFIX = f"crawl:{SEARCH_ID}"
+# Not per search: the politeness budget covers everything we send to a host
+RATE_KEY_PREFIX = "crawl:rate"
+VISIBILITY_TIMEOUT_SECONDS = 300
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 2.0
+# Burst allowed on top of the steady per-host rate
+BUCKET_CAPACITY = 2
+
+# Seen-set and frontier are updated together so an ID is queued at most once
+ENQUEUE_SCRIPT = """
+local added = 0
+for _, id in ipairs(ARGV) do
+    if redis.call('SADD', KEYS[1], id) == 1 then
+        redis.call('RPUSH', KEYS[2], id)
+        added = added + 1
+    end
+end
+return added
+"""
+
+# Requeue expired IDs (an expiry counts as a failed attempt), then move the
+# next ID to the processing set with a deadline
+POP_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+    redis.call('ZREM', KEYS[2], id)
+    if redis.call('HINCRBY', KEYS[3], id, 1) >= tonumber(ARGV[2]) then
+        redis.call('SADD', KEYS[4], id)
+    else
+        redis.call('RPUSH', KEYS[1], id)
+    end
+end
+local id = redis.call('LPOP', KEYS[1])
+if not id then
+    return false
+end
+local deadline = now + tonumber(ARGV[1])
+redis.call('ZADD', KEYS[2], deadline, id)
+return {id, deadline}
+"""
+
+# Store the result and release the ID, if the caller's lease (its deadline) is still current
+ACK_SCRIPT = """
+if tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1])) ~= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+return 1
+"""
+
+# Requeue a failed ID, or move it to the dead set after max attempts, if the lease is still current
+FAIL_SCRIPT = """
+if tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1])) ~= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('HINCRBY', KEYS[2], ARGV[1], 1) >= tonumber(ARGV[3]) then
+    redis.call('SADD', KEYS[4], ARGV[1])
+else
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+end
+return 1
+"""
+
+# Token bucket shared by every process; returns ms to wait (0 = token taken)
+TOKEN_SCRIPT = """
+local pause = redis.call('PTTL', KEYS[2])
+if pause > 0 then
+    return pause
+end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 60000)
+return wait
+"""
+
+
+def crawl_redis_url():
+    if url := os.getenv("CRAWL_REDIS_URL"):
+        return url
+    from index_listings_redisvl import redis_url
+    return redis_url()
+
+
+class Frontier:
+    """Redis keys and operations for one search's crawl."""
+
+    def __init__(self, redis, prefix=KEY_PREFIX, visibility_timeout=VISIBILITY_TIMEOUT_SECONDS,
+                 max_attempts=MAX_ATTEMPTS):
+        self.redis = redis
+        self.visibility_ms = int(visibility_timeout * 1000)
+        self.max_attempts = max_attempts
+        self.seen = f"{prefix}:seen"
+        self.queue = f"{prefix}:frontier"
+        self.processing = f"{prefix}:processing"
+        self.attempts = f"{prefix}:attempts"
+        self.dead = f"{prefix}:dead"
+        self.results = f"{prefix}:results"
+        self._enqueue = redis.register_script(ENQUEUE_SCRIPT)
+        self._pop = redis.register_script(POP_SCRIPT)
+        self._ack = redis.register_script(ACK_SCRIPT)
+        self._fail = redis.register_script(FAIL_SCRIPT)
+
+    async def reset(self):
+        await self.redis.delete(self.seen, self.queue, self.processing, self.attempts, self.dead, self.results)
+
+    async def enqueue(self, flatshare_ids):
+        """Queue IDs not seen before; returns how many were added."""
+        if not flatshare_ids:
+            return 0
+        return await self._enqueue(keys=[self.seen, self.queue], args=list(flatshare_ids))
+
+    async def pop(self):
+        """Lease the next ID; returns (flatshare_id, lease) or None when the frontier is empty."""
+        leased = await self._pop(
+            keys=[self.queue, self.processing, self.attempts, self.dead],
+            args=[self.visibility_ms, self.max_attempts],
+        )
+        if not leased:
+            return None
+        flatshare_id, lease = leased
+        return flatshare_id.decode() if isinstance(flatshare_id, bytes) else flatshare_id, int(lease)
+
+    async def ack(self, flatshare_id, lease, listing):
+        """Store the result; returns False (and stores nothing) if the lease has expired."""
+        stored = await self._ack(
+            keys=[self.processing, self.attempts, self.results],
+            args=[flatshare_id, lease, json.dumps(listing)],
+        )
+        return bool(stored)
+
+    async def fail(self, flatshare_id, lease):
+        """Requeue a failed ID, or park it in the dead set after max_attempts.
+
+        Returns False and leaves the ID alone if the lease has expired: it has
+        already been requeued and may be leased to another worker.
+        """
+        released = await self._fail(
+            keys=[self.processing, self.attempts, self.queue, self.dead],
+            args=[flatshare_id, lease, self.max_attempts],
+        )
+        return bool(released)
+
+    async def idle(self):
+        """Nothing queued and nothing in flight."""
+        queued, in_flight = await asyncio.gather(self.redis.llen(self.queue), self.redis.zcard(self.processing))
+        return queued == 0 and in_flight == 0
+
+    async def status(self):
+        seen, queued, in_flight, done, dead = await asyncio.gather(
+            self.redis.scard(self.seen),
+            self.redis.llen(self.queue),
+            self.redis.zcard(self.processing),
+            self.redis.hlen(self.results),
+            self.redis.scard(self.dead),
+        )
+        return {"seen": seen, "queued": queued, "in_flight": in_flight, "done": done, "dead": dead}
+
+    async def listings(self):
+        return [json.loads(value) for value in (await self.redis.hgetall(self.results)).values()]
+
+
+class RedisScheduler:
+    """HostScheduler with the rate budget held in Redis, shared by every worker process.
+
+    Concurrency is still capped per process; the request rate is global.
+    """
+
+    def __init__(self, redis, rate=DEFAULT_HOST_RATE, concurrency=DEFAULT_HOST_CONCURRENCY,
+                 capacity=BUCKET_CAPACITY):
+        self.redis = redis
+        self.rate = rate
+        self.capacity = capacity
+        self.concurrency = concurrency
+        self._semaphores = {}
+        self._take = redis.register_script(TOKEN_SCRIPT)
+
+    def slot(self, host):
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[host]
+
+    async def wait_turn(self, host):
+        while True:
+            wait_ms = await self._take(
+                keys=[f"{RATE_KEY_PREFIX}:{host}", f"{RATE_KEY_PREFIX}:{host}:pause"],
+                args=[self.rate, self.capacity],
+            )
+            if wait_ms <= 0:
+                return
+            await asyncio.sleep(wait_ms / 1000)
+
+    async def pause(self, host, seconds):
+        """Hold back every worker's requests to a host (e.g. after a 429)."""
+        await self.redis.set(f"{RATE_KEY_PREFIX}:{host}:pause", 1, px=max(1, int(seconds * 1000)))
+
+
+async def produce(frontier, scheduler):
+    started = time.monotonic()
+    added = 0
+    async with make_client(scheduler.concurrency) as client:
+        async for flatshare_id in ids_to_fetch(client, scheduler):
+            added += await frontier.enqueue([flatshare_id])
+    print(f"Queued {added} new IDs in {time.monotonic() - started:.0f}s")
+
+
+async def work(frontier, scheduler, engine, exit_when_idle):
+    done = 0
+    failed = 0
+
+    async def worker(client):
+        nonlocal done, failed
+        while True:
+            leased = await frontier.pop()
+            if leased is None:
+                if exit_when_idle and await frontier.idle():
+                    return
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+            flatshare_id, lease = leased
+            try:
+                listing = await fetch_listing_details(client, scheduler, flatshare_id, engine)
+            except Exception as e:
+                # Parser bugs included: release the ID rather than let it sit out its lease
+                failed += 1
+                print(f"  Error fetching {flatshare_id}: {e}")
+                await frontier.fail(flatshare_id, lease)
+                continue
+            if not await frontier.ack(flatshare_id, lease, listing):
+                print(f"  Lease on {flatshare_id} expired before it was fetched; dropping the result")
+                continue
+            done += 1
+            print(f"Fetched listing {flatshare_id} ({done} by this worker)")
+
+    async with make_client(scheduler.concurrency) as client:
+        await asyncio.gather(*(worker(client) for _ in range(scheduler.concurrency)))
+    print(f"Worker finished: {done} fetched, {failed} failed")
+
+
+async def run(args):
+    redis = Redis.from_url(crawl_redis_url())
+    frontier = Frontier(redis, visibility_timeout=args.visibility_timeout)
+    scheduler = RedisScheduler(redis, args.rate, args.concurrency)
+    try:
+        if args.command == "produce":
+            if args.reset:
+                await frontier.reset()
+            await produce(frontier, scheduler)
+        elif args.command == "work":
+            await work(frontier, scheduler, args.parser, not args.forever)
+        elif args.command == "status":
+            print(await frontier.status())
+        elif args.command == "export":
+            listings = await frontier.listings()
+            if args.csv:
+                write_listings_csv(listings)
+            else:
+                from listing_store import write_listings
+                write_listings(listings, args.store)
+    finally:
+        await redis.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed crawl over a Redis frontier.")
+    parser.add_argument("command", choices=["produce", "work", "status", "export"])
+    parser.add_argument("--rate", type=float, default=DEFAULT_HOST_RATE,
+                        help="max requests per second per host, across all workers")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_HOST_CONCURRENCY,
+                        help="max requests in flight per host in this process")
+    parser.add_argument("--parser", choices=list(ENGINES), default=DEFAULT_ENGINE,
+                        help="HTML parser engine for listing pages")
+    parser.add_argument("--visibility-timeout", type=float, default=VISIBILITY_TIMEOUT_SECONDS,
+                        help="seconds before an unacked ID is handed to another worker")
+    parser.add_argument("--reset", action="store_true",
+                        help="produce: clear the seen-set, frontier and results first")
+    parser.add_argument("--forever", action="store_true",
+                        help="work: keep polling when the frontier is empty")
+    parser.add_argument("--store", default='scraping/listings',
+                        help="export: Parquet listing store to append to")
+    parser.add_argument("--csv", action="store_true",
+                        help=f"export: write listings-{SEARCH_ID}.csv instead of the Parquet store")
+    args = parser.parse_args()
+    get_parser(args.parser)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,128 +1,328 @@
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 import json
 import os
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from redisvl.extensions.cache.embeddings import EmbeddingsCache
 from redisvl.index import SearchIndex
 from redisvl.schema import IndexSchema
 from redisvl.utils.vectorize import OpenAITextVectorizer
 
+from listing_schema import (
+    EMBED_COLUMNS,
+    INDEX_NAME,
+    VECTOR_DIMS,
+    VECTOR_DTYPE,
+    VECTOR_DTYPES,
+    VECTOR_FIELD,
+    build_schema,
+    normalized_fields,
+)
+
 # Load environment variables
 load_dotenv()
 
-def main():
-    print("Loading data...")
-    # Load the CSV
-    df = pd.read_csv('scraping/listings.csv')
-
-    # Define the columns to include (same as in convert_to_json.ipynb)
-    columns = [
-        'flatshare_id', 'age', 'ages', 'any_pets', 'available', 'bills_included', 'broadband_included','couples_ok', 'deposit', 'deposit(room_1)', 'deposit(room_2)', 'deposit(room_3)', 'deposit(room_4)', 'deposit(room_5)', 'disabled_access',
-        'detail', 'double_room', 'furnishings', 'garage', 'gender', 'living_room', 'location', 
-        'minimum_term', 'occupation', 'num_flatmates', 'parking', 'pets_ok', 
-        'postcode', 'property_type', 'rent', 'room_type'
-    ]
+EMBEDDING_CACHE_TTL = 60 * 60 * 24 * 30  # 30 days
+# Must match backend/clients/score_cache.py; bumping it invalidates cached listing scores
+SCORE_CACHE_GENERATION_KEY = "scorecache:generation"
+# Hash of the stored listing content, compared on the next run to skip unchanged rows
+CONTENT_HASH_FIELD = "content_hash"
+SCAN_BATCH_SIZE = 1000
+
+LISTINGS_CSV = 'scraping/listings.csv'
+# Parquet store written by the scrapers (listing_store.py); preferred over the CSV when present
+LISTINGS_STORE = 'scraping/listings'
+# Store rows older than this are treated as delisted
+MAX_AGE_DAYS = 30
+CHECKPOINT_PATH = 'scraping/.index_checkpoint.json'
+# CSV rows read, embedded and loaded per step; memory is bounded by this, not the catalog
+CHUNK_SIZE = 1000
+EMBED_BATCH_SIZE = 100
+# Parallel embedding requests; the vectorizer retries 429s with exponential backoff
+EMBED_CONCURRENCY = 4
+LOAD_BATCH_SIZE = 200
+
+
+def content_hash(record):
+    """Hash of everything written for a listing apart from its vector."""
+    payload = json.dumps([record['json_data'], record['images']])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
 
-    # Create new dataframe with selected columns
-    new_df = df[columns].copy()
+def build_record(row, images):
+    """Listing record with the json_data text to embed; `row` holds the EMBED_COLUMNS values."""
+    # Same serialization as in convert_to_json.ipynb, so cached embeddings stay valid
+    record = dict(row, json_data=json.dumps(row), images=images)
+    # Ensure ID is string for Redis
+    record['flatshare_id'] = str(record['flatshare_id'])
+    record[CONTENT_HASH_FIELD] = content_hash(record)
+    return record
 
+
+def build_records(chunk):
+    """Turn a CSV chunk into listing records."""
     # Fill NaNs to avoid JSON conversion issues or inconsistent data
-    new_df = new_df.fillna("Unknown")
+    rows = chunk[EMBED_COLUMNS].fillna("Unknown").to_dict(orient='records')
+    images = chunk['images'].fillna("Unknown").tolist()
+    return [build_record(row, row_images) for row, row_images in zip(rows, images)]
 
 
-    
-    # Replicating the logic from the notebook for json creation:
-    print("Creating JSON data for embedding...")
-    new_df['json_data'] = new_df.apply(lambda row: json.dumps(row.to_dict()), axis=1)
-    new_df['images'] = df['images']
+def vector_bytes(embedding, dtype=VECTOR_DTYPE):
+    return np.array(embedding, dtype=dtype).tobytes()
 
-    # Define RedisVL Schema
-    print("Defining schema...")
-    schema = IndexSchema.from_dict({
-        "index": {
-            "name": "idx_flatshares_json",
-            "prefix": "doc",
-            "storage_type": "hash",
-        },
-        "fields": [
-            # ID and Metadata fields
-            {"name": "flatshare_id", "type": "tag"},
-            {"name": "postcode", "type": "text"},
-            {"name": "rent", "type": "text"},
-            {"name": "room_type", "type": "text"},
-            {"name": "json_data", "type": "text"},
-            {"name": "images", "type": "text"},
-            
-            # The Vector Field
-            {
-                "name": "json_vector", 
-                "type": "vector", 
-                "attrs": {
-                    "dims": 1536,
-                    "algorithm": "hnsw",
-                    "distance_metric": "cosine",
-                    "datatype": "float32"
-                }
-            }
-        ]
-    })
 
-    # Initialize connection
+def embed_records(vectorizer, executor, records, dims=VECTOR_DIMS, dtype=VECTOR_DTYPE):
+    """Embed records in EMBED_BATCH_SIZE requests, running up to EMBED_CONCURRENCY at once."""
+    batches = [records[i:i + EMBED_BATCH_SIZE] for i in range(0, len(records), EMBED_BATCH_SIZE)]
+    futures = [
+        executor.submit(vectorizer.embed_many, [r['json_data'] for r in batch],
+                        batch_size=EMBED_BATCH_SIZE, dimensions=dims)
+        for batch in batches
+    ]
+    for batch, future in zip(batches, futures):
+        for record, embedding in zip(batch, future.result()):
+            record[VECTOR_FIELD] = vector_bytes(embedding, dtype)
+
+
+def is_store(source):
+    return os.path.isdir(source)
+
+
+def source_signature(source):
+    """Identifies the input a checkpoint belongs to; a changed input restarts the run."""
+    if is_store(source):
+        from listing_store import store_signature
+        return store_signature(source)
+    stat = os.stat(source)
+    return {"path": source, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def read_chunks(source, chunk_size, since=None):
+    """Yield DataFrame chunks with the EMBED_COLUMNS and images, from the store or the CSV."""
+    if not is_store(source):
+        # Scraped strings as written, with only empty cells missing, so json_data
+        # (and its content hash) matches the pipeline's and the store's
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[""])
+        return
+    from listing_store import iter_latest
+    # Only the embedded columns are read; the typed ones are recomputed by normalized_fields
+    for chunk in iter_latest(source, EMBED_COLUMNS + ['images'], chunk_size, since):
+        # Same JSON text the scraper produced, so content hashes match the pipeline's
+        chunk['images'] = chunk['images'].map(lambda urls: json.dumps(list(urls)) if urls is not None else None)
+        yield chunk
+
+
+def source_ids(source, since=None):
+    """Every flatshare_id currently in the input (only the id column is read)."""
+    if is_store(source):
+        from listing_store import latest_crawls, open_store
+        return set(latest_crawls(open_store(source), since))
+    return set(pd.read_csv(source, usecols=['flatshare_id'], dtype=str)['flatshare_id'])
+
+
+def load_checkpoint(path, signature, full):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != signature or checkpoint.get("full") != full:
+        print("Checkpoint is for a different input or mode, starting over")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def existing_hashes(index):
+    """Map flatshare_id -> content hash for every document currently under the index prefix."""
+    client = index.client
+    key_prefix = f"{index.prefix}{index.key_separator}"
+    keys = [key.decode() if isinstance(key, bytes) else key
+            for key in client.scan_iter(match=f"{key_prefix}*", count=SCAN_BATCH_SIZE)]
+    hashes = {}
+    for start in range(0, len(keys), SCAN_BATCH_SIZE):
+        batch = keys[start:start + SCAN_BATCH_SIZE]
+        pipe = client.pipeline(transaction=False)
+        for key in batch:
+            pipe.hget(key, CONTENT_HASH_FIELD)
+        for key, value in zip(batch, pipe.execute()):
+            hashes[key[len(key_prefix):]] = value.decode() if isinstance(value, bytes) else value
+    return hashes
+
+
+def redis_url():
     # Constructing Redis URL from env vars or hardcoded fallback based on notebook context
     redis_host = "redis-12746.c74.us-east-1-4.ec2.cloud.redislabs.com"
     redis_port = "12746"
     redis_password = os.getenv("REDIS_PASSWORD")
-    
+
     if not redis_password:
         print("Warning: REDIS_PASSWORD not found in environment variables.")
-    
-    redis_url = f"redis://default:{redis_password}@{redis_host}:{redis_port}"
 
-    print(f"Connecting to Redis at {redis_host}...")
+    return f"redis://default:{redis_password}@{redis_host}:{redis_port}"
+
+
+def indexed_vector_config(url):
+    """(dims, dtype) of the existing index's vector field, or None if there is no index yet."""
+    if not SearchIndex(IndexSchema.from_dict(build_schema()), redis_url=url).exists():
+        return None
+    attrs = SearchIndex.from_existing(INDEX_NAME, redis_url=url).schema.fields[VECTOR_FIELD].attrs
+    return attrs.dims, attrs.datatype.value.lower()
+
+
+def make_vectorizer(url, dims=VECTOR_DIMS):
+    # Embeddings are cached in Redis by (text, model) so unchanged listings are not re-embedded.
+    # The cache key ignores `dimensions`, so shortened embeddings get a cache of their own.
+    embeddings_cache = EmbeddingsCache(
+        name="listing_embeddings" if dims == VECTOR_DIMS else f"listing_embeddings_{dims}",
+        ttl=EMBEDDING_CACHE_TTL,
+        redis_url=url,
+    )
+    return OpenAITextVectorizer(
+        model="text-embedding-3-small",
+        cache=embeddings_cache,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index scraped listings into Redis.")
+    parser.add_argument("--full", action="store_true",
+                        help="drop and rebuild the index instead of upserting changed listings "
+                             "(needed after a schema change)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--load-batch-size", type=int, default=LOAD_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--source", default=LISTINGS_STORE if is_store(LISTINGS_STORE) else LISTINGS_CSV,
+                        help="Parquet store directory or CSV file")
+    parser.add_argument("--max-age-days", type=float, default=MAX_AGE_DAYS,
+                        help="store only: skip (and delete) listings not crawled within this many days")
+    parser.add_argument("--dims", type=int,
+                        help=f"embedding dimensions (default: the existing index's, else {VECTOR_DIMS})")
+    parser.add_argument("--dtype", choices=VECTOR_DTYPES,
+                        help=f"vector datatype in Redis (default: the existing index's, else {VECTOR_DTYPE})")
+    args = parser.parse_args()
+
+    url = redis_url()
+    # The backend reads dims and datatype back from the index, so queries always match it
+    current_config = indexed_vector_config(url)
+    dims, dtype = current_config or (VECTOR_DIMS, VECTOR_DTYPE)
+    dims, dtype = args.dims or dims, args.dtype or dtype
+    if current_config and current_config != (dims, dtype) and not args.full:
+        parser.error(f"the index holds {current_config[0]}-dim {current_config[1]} vectors; "
+                     f"pass --full to rebuild it with {dims}-dim {dtype}")
+
+    print(f"Reading listings from {args.source}")
+    signature = source_signature(args.source)
+    checkpoint = None if args.restart else load_checkpoint(args.checkpoint, signature, args.full)
+    if checkpoint:
+        print(f"Resuming after {checkpoint['rows_done']} rows")
+    else:
+        since = datetime.now(timezone.utc) - timedelta(days=args.max_age_days)
+        checkpoint = {
+            "source": signature,
+            "since": since.isoformat(),
+            "full": args.full,
+            "chunk_size": args.chunk_size,
+            "rows_done": 0,
+            "report": {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0},
+        }
+    # Chunk boundaries must match the run being resumed
+    chunk_size = checkpoint["chunk_size"]
+    since = datetime.fromisoformat(checkpoint["since"]) if is_store(args.source) else None
+    report = checkpoint["report"]
+
+    # Define RedisVL Schema
+    print("Defining schema...")
+    schema = IndexSchema.from_dict(build_schema(dims, dtype))
+
+    # Initialize connection
+    print(f"Connecting to Redis ({dims}-dim {dtype} vectors)...")
     index = SearchIndex(schema=schema)
-    index.connect(redis_url)
+    index.connect(url)
 
-    # Create the index
-    index.create(overwrite=True)
+    # Create the index; a full rebuild drops the old documents too (but not when resuming one)
+    if not index.exists() or (args.full and checkpoint["rows_done"] == 0):
+        index.create(overwrite=True, drop=True)
+        current = {}
+    else:
+        current = existing_hashes(index)
+        print(f"Found {len(current)} indexed listings")
 
     # Initialize Vectorizer
     print("Initializing OpenAI Vectorizer...")
-    vectorizer = OpenAITextVectorizer(
-        model="text-embedding-3-small"
-    )
+    vectorizer = make_vectorizer(url, dims)
 
-    # Prepare data for insertion
-    print("Vectorizing data (this may take a moment)...")
-    records = new_df.to_dict(orient='records')
-    
-    # Extract the texts we want to embed (the json_data strings)
-    texts_to_embed = [r['json_data'] for r in records]
-    
-    # Generate embeddings
-    embeddings = vectorizer.embed_many(texts_to_embed)
+    # Stream the input: each chunk is hashed, embedded and loaded before the next is read
+    rows_done = 0
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        for chunk in read_chunks(args.source, chunk_size, since):
+            if rows_done < checkpoint["rows_done"]:
+                rows_done += len(chunk)
+                continue
+
+            # Only new or changed listings are embedded and written
+            to_load = []
+            for record in build_records(chunk):
+                if record['flatshare_id'] not in current:
+                    report["added"] += 1
+                elif current[record['flatshare_id']] != record[CONTENT_HASH_FIELD]:
+                    report["updated"] += 1
+                else:
+                    report["unchanged"] += 1
+                    continue
+                # Typed fields, summary and image list are computed once here rather than per query
+                record.update(normalized_fields(record))
+                to_load.append(record)
+                # Later duplicates of the same id count as unchanged
+                current[record['flatshare_id']] = record[CONTENT_HASH_FIELD]
+
+            if to_load:
+                embed_records(vectorizer, executor, to_load, dims, dtype)
+                # Hash fields are overwritten in place, so search keeps working during the upsert
+                index.load(to_load, id_field="flatshare_id", batch_size=args.load_batch_size)
+
+            rows_done += len(chunk)
+            checkpoint["rows_done"] = rows_done
+            save_checkpoint(args.checkpoint, checkpoint)
+            print(f"Indexed {rows_done} rows ({len(to_load)} embedded in this chunk)")
 
-    # Attach embeddings to records
-    for i, record in enumerate(records):
-        record['json_vector'] = np.array(embeddings[i], dtype=np.float32).tobytes()
-        # Ensure ID is string for Redis
-        record['flatshare_id'] = str(record['flatshare_id'])
+    # Listings that are no longer in the input
+    stale = sorted(set(current) - source_ids(args.source, since))
+    if stale:
+        print(f"Deleting {len(stale)} stale listings...")
+        report["deleted"] = index.drop_keys([index.key(flatshare_id) for flatshare_id in stale])
 
-    # Load into Redis
-    print(f"Loading {len(records)} records into Redis...")
-    index.load(records, id_field="flatshare_id")
+    # Score cache keys include the listing contents, so only a rebuild needs a new generation
+    if args.full:
+        index.client.incr(SCORE_CACHE_GENERATION_KEY)
 
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    print("Index report: " + ", ".join(f"{count} {name}" for name, count in report.items()))
     print("Done! Data indexed successfully.")
     
     # Simple test
     print("\nTesting search...")
     query_text = "ensuite double room in chelsea"
-    query_vec = vectorizer.embed(query_text)
+    query_vec = vectorizer.embed(query_text, dimensions=dims)
     
     from redisvl.query import VectorQuery
     
     query = VectorQuery(
         vector=query_vec,
-        vector_field_name="json_vector",
+        vector_field_name=VECTOR_FIELD,
+        dtype=dtype,
         return_fields=["flatshare_id", "rent", "json_data"],
         num_results=2
     )
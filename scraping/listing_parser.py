@@ -0,0 +1,174 @@
+"""Listing detail page parsers.
+
+Every engine extracts the same fields (description, key features, feature
+sections, price section and photo gallery) and must return identical dicts;
+`benchmark_parsers.py` checks this against saved pages. `html.parser` needs
+only BeautifulSoup; `lxml` and `selectolax` are optional and much faster.
+"""
+
+import json
+
+DEFAULT_ENGINE = 'html.parser'
+
+
+def _feature_key(key_text):
+    # Clean up key names - normalize whitespace, remove special chars
+    key_name = ' '.join(key_text.split())  # Normalize whitespace
+    return key_name.lower().replace(' ', '_').replace('?', '').replace('#', 'num').replace('/', '_')
+
+
+def _station_name(text):
+    return text.split('Tube map')[0].strip()
+
+
+def _parse_bs4(flatshare_id, html, builder):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, builder)
+    listing = {'flatshare_id': flatshare_id}
+
+    # Detail (description)
+    desc_elem = soup.find('p', class_='detaildesc')
+    if desc_elem:
+        listing['detail'] = desc_elem.get_text(strip=True)
+
+    # Key features (property type, location, postcode, station)
+    key_features = soup.find('ul', class_='key-features')
+    if key_features:
+        features = key_features.find_all('li', class_='key-features__feature')
+        for i, f in enumerate(features):
+            text = f.get_text(strip=True)
+            if i == 0:
+                listing['property_type'] = text
+            elif i == 1:
+                listing['location'] = text
+            elif i == 2:
+                listing['postcode'] = text.split()[0] if text else text
+            elif i == 3:
+                listing['station'] = _station_name(text)
+                distance_elem = f.find('small', class_='key-features__station-distance')
+                if distance_elem:
+                    listing['station_distance'] = distance_elem.get_text(strip=True)
+
+    # Feature sections - extract all key/value pairs as flat features
+    feature_sections = soup.find_all('section', class_='feature')
+    for section in feature_sections:
+        # Special case: price section - the dt contains the rent, dd contains room type
+        if 'feature--price_room_only' in section.get('class', []):
+            feature_list = section.find('dl', class_='feature-list')
+            if feature_list:
+                key_elem = feature_list.find('dt', class_='feature-list__key')
+                value_elem = feature_list.find('dd', class_='feature-list__value')
+                if key_elem:
+                    listing['rent'] = key_elem.get_text(strip=True)
+                if value_elem:
+                    listing['room_type'] = value_elem.get_text(strip=True)
+            continue
+
+        feature_list = section.find('dl', class_='feature-list')
+        if feature_list:
+            keys = feature_list.find_all('dt', class_='feature-list__key')
+            values = feature_list.find_all('dd', class_='feature-list__value')
+            for k, v in zip(keys, values):
+                listing[_feature_key(k.get_text(strip=True))] = v.get_text(strip=True)
+
+    # Extract photo URLs from the photo gallery
+    photo_links = soup.find_all('a', class_='photo-gallery__thumbnail-link')
+    images = []
+    for link in photo_links:
+        href = link.get('href')
+        if href:
+            images.append(href)
+    listing['images'] = json.dumps(images)
+
+    return listing
+
+
+def parse_html_parser(flatshare_id, html):
+    return _parse_bs4(flatshare_id, html, 'html.parser')
+
+
+def parse_lxml(flatshare_id, html):
+    return _parse_bs4(flatshare_id, html, 'lxml')
+
+
+def parse_selectolax(flatshare_id, html):
+    """Same extraction as the BeautifulSoup engines, using selectolax's CSS selectors."""
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    listing = {'flatshare_id': flatshare_id}
+
+    # Matches BeautifulSoup's get_text(strip=True)
+    def text(node):
+        return node.text(deep=True, separator='', strip=True)
+
+    desc_elem = tree.css_first('p.detaildesc')
+    if desc_elem:
+        listing['detail'] = text(desc_elem)
+
+    key_features = tree.css_first('ul.key-features')
+    if key_features:
+        for i, f in enumerate(key_features.css('li.key-features__feature')):
+            value = text(f)
+            if i == 0:
+                listing['property_type'] = value
+            elif i == 1:
+                listing['location'] = value
+            elif i == 2:
+                listing['postcode'] = value.split()[0] if value else value
+            elif i == 3:
+                listing['station'] = _station_name(value)
+                distance_elem = f.css_first('small.key-features__station-distance')
+                if distance_elem:
+                    listing['station_distance'] = text(distance_elem)
+
+    for section in tree.css('section.feature'):
+        feature_list = section.css_first('dl.feature-list')
+        if 'feature--price_room_only' in (section.attributes.get('class') or '').split():
+            if feature_list:
+                key_elem = feature_list.css_first('dt.feature-list__key')
+                value_elem = feature_list.css_first('dd.feature-list__value')
+                if key_elem:
+                    listing['rent'] = text(key_elem)
+                if value_elem:
+                    listing['room_type'] = text(value_elem)
+            continue
+
+        if feature_list:
+            keys = feature_list.css('dt.feature-list__key')
+            values = feature_list.css('dd.feature-list__value')
+            for k, v in zip(keys, values):
+                listing[_feature_key(text(k))] = text(v)
+
+    images = []
+    for link in tree.css('a.photo-gallery__thumbnail-link'):
+        href = link.attributes.get('href')
+        if href:
+            images.append(href)
+    listing['images'] = json.dumps(images)
+
+    return listing
+
+
+ENGINES = {
+    'html.parser': parse_html_parser,
+    'lxml': parse_lxml,
+    'selectolax': parse_selectolax,
+}
+
+
+def get_parser(engine=DEFAULT_ENGINE):
+    """Return the parse function for an engine, failing early if its library is missing."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown parser engine {engine!r} (choose from {', '.join(ENGINES)})")
+    if engine == 'lxml':
+        import lxml  # noqa: F401
+    elif engine == 'selectolax':
+        import selectolax  # noqa: F401
+    return ENGINES[engine]
+
+
+def parse_listing(flatshare_id, html, engine=DEFAULT_ENGINE):
+    """Parse a listing detail page into a flat dict of features."""
+    return get_parser(engine)(flatshare_id, html)
@@ -0,0 +1,181 @@
+"""Redis index schema and per-listing field normalization.
+
+Shared by the indexer and query scripts. Must stay in sync with
+backend/clients/redis_client.py, which reads these hash fields back.
+"""
+
+import json
+import re
+from datetime import date, datetime
+
+INDEX_NAME = "idx_flatshares_json"
+INDEX_PREFIX = "doc"
+# text-embedding-3-small's full size; its `dimensions` parameter can shorten it (e.g. 512, 256)
+VECTOR_DIMS = 1536
+VECTOR_DTYPE = "float32"
+# float16 halves vector memory in Redis (needs Redis 7.4+)
+VECTOR_DTYPES = ["float32", "float16"]
+VECTOR_FIELD = "json_vector"
+
+# Columns serialized into json_data, the text that gets embedded
+EMBED_COLUMNS = [
+    'flatshare_id', 'age', 'ages', 'any_pets', 'available', 'bills_included', 'broadband_included','couples_ok', 'deposit', 'deposit(room_1)', 'deposit(room_2)', 'deposit(room_3)', 'deposit(room_4)', 'deposit(room_5)', 'disabled_access',
+    'detail', 'double_room', 'furnishings', 'garage', 'gender', 'living_room', 'location',
+    'minimum_term', 'occupation', 'num_flatmates', 'parking', 'pets_ok',
+    'postcode', 'property_type', 'rent', 'room_type'
+]
+
+# Fields indexed as tags so the backend can pre-filter KNN queries. Stored as
+# scraped (they're also displayed); RediSearch tags match case-insensitively.
+TAG_FIELDS = ['pets_ok', 'couples_ok', 'bills_included', 'parking', 'furnishings', 'property_type']
+
+MAX_IMAGES = 5
+SUMMARY_DETAIL_CHARS = 150
+
+
+def build_schema(dims=VECTOR_DIMS, dtype=VECTOR_DTYPE):
+    """RedisVL schema for the listings index."""
+    return {
+        "index": {
+            "name": INDEX_NAME,
+            "prefix": INDEX_PREFIX,
+            "storage_type": "hash",
+        },
+        "fields": [
+            # ID and Metadata fields
+            {"name": "flatshare_id", "type": "tag"},
+            {"name": "postcode", "type": "text"},
+            {"name": "rent", "type": "text"},
+            {"name": "room_type", "type": "text"},
+            {"name": "json_data", "type": "text"},
+            {"name": "images", "type": "text"},
+
+            # Typed fields for pre-filtered (hybrid) KNN
+            {"name": "rent_pcm", "type": "numeric"},
+            {"name": "deposit_gbp", "type": "numeric"},
+            {"name": "min_term_months", "type": "numeric"},
+            *({"name": field, "type": "tag"} for field in TAG_FIELDS),
+
+            # The Vector Field
+            {
+                "name": VECTOR_FIELD,
+                "type": "vector",
+                "attrs": {
+                    "dims": dims,
+                    "algorithm": "hnsw",
+                    "distance_metric": "cosine",
+                    "datatype": dtype
+                }
+            }
+        ]
+    }
+
+
+def _is_known(value):
+    return isinstance(value, str) and value.strip() and value != "Unknown"
+
+
+def parse_money(value):
+    """Parse '£1,195.00' to 1195 (0 if unknown)."""
+    if not _is_known(value):
+        return 0
+    match = re.search(r'\d[\d,]*(?:\.\d+)?', value)
+    return round(float(match.group().replace(',', ''))) if match else 0
+
+
+def parse_rent_pcm(rent):
+    """Parse a rent string like '£1,195 pcm' or '£190 pw' to monthly rent (0 if unknown)."""
+    value = parse_money(rent)
+    if value and ('pw' in rent.lower() or 'week' in rent.lower()):
+        return round(value * 52 / 12)
+    return value
+
+
+def parse_rent_period(rent):
+    """'pw' for weekly rents, otherwise 'pcm'."""
+    if _is_known(rent) and ('pw' in rent.lower() or 'week' in rent.lower()):
+        return 'pw'
+    return 'pcm'
+
+
+def parse_min_term_months(term):
+    """Parse '6 months', '1 year' or '2 weeks' to whole months (0 if none/unknown)."""
+    if not _is_known(term):
+        return 0
+    match = re.search(r'(\d+)\s*(week|month|year)', term.lower())
+    if not match:
+        return 0
+    count, unit = int(match.group(1)), match.group(2)
+    if unit == 'year':
+        return count * 12
+    if unit == 'week':
+        return max(1, round(count * 12 / 52))
+    return count
+
+
+def parse_available_date(available, today=None):
+    """Parse 'Now' or '12 Jan 2026' to a date (None if unknown)."""
+    if not _is_known(available):
+        return None
+    if available.strip().lower() == 'now':
+        return today or date.today()
+    for fmt in ('%d %b %Y', '%d %B %Y'):
+        try:
+            return datetime.strptime(available.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_images(images):
+    """Parse the scraped images JSON to a list of URLs."""
+    if not _is_known(images):
+        return []
+    try:
+        parsed = json.loads(images)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def build_title(row):
+    room_type = row['room_type'] if _is_known(row.get('room_type')) else 'Room'
+    location = row['location'] if _is_known(row.get('location')) else 'London'
+    return f"{room_type} in {location}"
+
+
+def build_summary(row):
+    """Short listing summary used for display and LLM scoring."""
+    parts = []
+    if _is_known(row.get('room_type')):
+        parts.append(row['room_type'])
+    if _is_known(row.get('location')):
+        parts.append(f"in {row['location']}")
+    if _is_known(row.get('rent')):
+        parts.append(f"- {row['rent']}")
+    if _is_known(row.get('detail')):
+        detail = row['detail'][:SUMMARY_DETAIL_CHARS]
+        if len(row['detail']) > SUMMARY_DETAIL_CHARS:
+            detail += "..."
+        parts.append(f". {detail}")
+    return " ".join(parts) if parts else "No description available"
+
+
+def normalized_fields(row):
+    """Derived fields written alongside the raw columns, computed once at index time.
+
+    `row` holds the scraped string values (with "Unknown" for missing ones).
+    """
+    deposit = row.get('deposit')
+    if not _is_known(deposit):
+        deposit = row.get('deposit(room_1)')
+    return {
+        'title': build_title(row),
+        'summary': build_summary(row),
+        'rent_pcm': parse_rent_pcm(row.get('rent')),
+        'rent_period': parse_rent_period(row.get('rent')),
+        'deposit_gbp': parse_money(deposit),
+        'min_term_months': parse_min_term_months(row.get('minimum_term')),
+        # Newline-separated so readers split instead of parsing JSON
+        'image_urls': "\n".join(parse_images(row.get('images'))[:MAX_IMAGES]),
+    }
@@ -0,0 +1,135 @@
+"""Partitioned Parquet store for scraped listings.
+
+Each crawl appends one set of files under `crawl_date=YYYY-MM-DD/`, so
+existing partitions are never rewritten. Raw scraped strings are kept as-is
+(null when missing) alongside typed columns: monthly rent, deposit, minimum
+term, available-from date and the image URLs as a list. Feature keys outside
+the schema are kept as JSON in `extra`.
+
+Readers take the most recent row per flatshare_id and read only the columns
+they ask for, memory-mapping the files.
+"""
+
+import json
+import uuid
+import hashlib
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from listing_schema import (
+    EMBED_COLUMNS,
+    parse_available_date,
+    parse_images,
+    parse_min_term_months,
+    parse_money,
+    parse_rent_pcm,
+    parse_rent_period,
+)
+
+STORE_PATH = 'scraping/listings'
+
+RAW_COLUMNS = EMBED_COLUMNS + ['station', 'station_distance']
+
+SCHEMA = pa.schema(
+    [pa.field(column, pa.string()) for column in RAW_COLUMNS]
+    + [
+        pa.field('rent_pcm', pa.int32()),
+        pa.field('rent_period', pa.string()),
+        pa.field('deposit_gbp', pa.int32()),
+        pa.field('min_term_months', pa.int16()),
+        pa.field('available_from', pa.date32()),
+        pa.field('images', pa.list_(pa.string())),
+        pa.field('extra', pa.string()),
+        pa.field('crawled_at', pa.timestamp('s', tz='UTC')),
+        pa.field('crawl_date', pa.string()),
+    ]
+)
+
+PARTITIONING = ds.partitioning(pa.schema([('crawl_date', pa.string())]), flavor='hive')
+
+
+def to_row(listing, crawled_at):
+    """Map a scraped listing dict (all strings) onto the store schema."""
+    row = {column: listing.get(column) for column in RAW_COLUMNS}
+    row['flatshare_id'] = str(listing['flatshare_id'])
+    deposit = listing.get('deposit') or listing.get('deposit(room_1)')
+    row.update(
+        rent_pcm=parse_rent_pcm(listing.get('rent')),
+        rent_period=parse_rent_period(listing.get('rent')),
+        deposit_gbp=parse_money(deposit),
+        min_term_months=parse_min_term_months(listing.get('minimum_term')),
+        available_from=parse_available_date(listing.get('available'), crawled_at.date()),
+        images=parse_images(listing.get('images')),
+        extra=json.dumps({k: v for k, v in listing.items() if k not in RAW_COLUMNS and k != 'images'}),
+        crawled_at=crawled_at,
+        crawl_date=crawled_at.date().isoformat(),
+    )
+    return row
+
+
+def write_listings(listings, root=STORE_PATH, crawled_at=None):
+    """Append listings as new files in today's partition; returns the row count."""
+    if not listings:
+        return 0
+    crawled_at = (crawled_at or datetime.now(timezone.utc)).replace(microsecond=0)
+    table = pa.Table.from_pylist([to_row(listing, crawled_at) for listing in listings], schema=SCHEMA)
+    ds.write_dataset(
+        table,
+        root,
+        format='parquet',
+        partitioning=PARTITIONING,
+        # Unique file names, so a second crawl on the same day adds files instead of replacing them
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+    )
+    print(f"\nSaved {table.num_rows} listings to {root}")
+    return table.num_rows
+
+
+def open_store(root=STORE_PATH):
+    return ds.dataset(
+        root,
+        schema=SCHEMA,
+        format='parquet',
+        partitioning=PARTITIONING,
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def latest_crawls(dataset, since=None):
+    """Map flatshare_id -> crawled_at of its most recent row (optionally only rows since `since`)."""
+    table = dataset.to_table(
+        columns=['flatshare_id', 'crawled_at'],
+        filter=None if since is None else pc.field('crawled_at') >= pa.scalar(since, SCHEMA.field('crawled_at').type),
+    )
+    latest = table.group_by('flatshare_id').aggregate([('crawled_at', 'max')])
+    return dict(zip(latest['flatshare_id'].to_pylist(), latest['crawled_at_max'].to_pylist()))
+
+
+def iter_latest(root=STORE_PATH, columns=None, batch_size=1000, since=None):
+    """Yield pandas chunks of the latest row per listing, reading only `columns`."""
+    dataset = open_store(root)
+    latest = latest_crawls(dataset, since)
+    columns = list(columns or SCHEMA.names)
+    read_columns = list(dict.fromkeys(columns + ['flatshare_id', 'crawled_at']))
+    emitted = set()
+    for batch in dataset.to_batches(columns=read_columns, batch_size=batch_size):
+        chunk = batch.to_pandas()
+        keep = [
+            latest.get(flatshare_id) == crawled_at and flatshare_id not in emitted
+            for flatshare_id, crawled_at in zip(chunk['flatshare_id'], chunk['crawled_at'])
+        ]
+        chunk = chunk[keep].drop_duplicates(subset='flatshare_id')
+        emitted.update(chunk['flatshare_id'])
+        if len(chunk):
+            yield chunk[columns]
+
+
+def store_signature(root=STORE_PATH):
+    """Changes whenever files are added to the store (used by indexer checkpoints)."""
+    files = sorted(open_store(root).files)
+    return {"path": root, "files": hashlib.sha256("\n".join(files).encode()).hexdigest()}
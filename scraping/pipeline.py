@@ -0,0 +1,240 @@
+"""Crawl, parse, embed and load listings into Redis in one streaming run.
+
+    fetch -> parse -> normalize -> embed (batched) -> load
+
+Stages are connected by bounded queues, so a slow embedder or Redis load
+makes the fetchers wait instead of piling listings up in memory. Each
+embedded batch is loaded as soon as it is ready, so new listings become
+searchable seconds after they are fetched. Unchanged listings (same content
+hash as the indexed document) are not re-embedded.
+
+Stale listings are not deleted here, since a crawl only sees the first
+search pages; run index_listings_redisvl.py for that.
+"""
+
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from redisvl.index import AsyncSearchIndex, SearchIndex
+from redisvl.schema import IndexSchema
+
+from index_listings_redisvl import (
+    CONTENT_HASH_FIELD,
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    build_record,
+    existing_hashes,
+    indexed_vector_config,
+    make_vectorizer,
+    redis_url,
+    vector_bytes,
+)
+from listing_parser import DEFAULT_ENGINE, ENGINES, get_parser
+from listing_schema import EMBED_COLUMNS, VECTOR_DIMS, VECTOR_DTYPE, VECTOR_FIELD, build_schema, normalized_fields
+from crawl_state import REFRESH_AFTER_SECONDS, STATE_PATH, CrawlState
+from scrape import (
+    DEFAULT_HOST_CONCURRENCY,
+    DEFAULT_HOST_RATE,
+    HostScheduler,
+    fetch_listing_details,
+    ids_to_fetch,
+    make_client,
+)
+
+QUEUE_SIZE = 200
+# A partial batch is embedded after this long, so quiet periods don't delay loading
+BATCH_WAIT_SECONDS = 2.0
+
+_DONE = object()
+
+
+class Stats:
+    def __init__(self):
+        self.fetched = 0
+        self.failed = 0
+        self.unchanged = 0
+        self.dropped = 0
+        self.loaded = 0
+        self.latencies = []
+
+    def summary(self):
+        lag = sorted(self.latencies)
+        median = lag[len(lag) // 2] if lag else 0.0
+        return (f"fetched {self.fetched}, failed {self.failed}, unchanged {self.unchanged}, "
+                f"loaded {self.loaded}, dropped {self.dropped}, median fetch-to-searchable {median:.1f}s")
+
+
+async def produce_ids(client, scheduler, state, stop_at_known, ids):
+    """Queue the flatshare IDs to fetch as the search pages are walked."""
+    async for flatshare_id in ids_to_fetch(client, scheduler, state, stop_at_known):
+        await ids.put(flatshare_id)
+
+
+async def fetch_and_parse(client, scheduler, engine, parse_pool, state, current, ids, records, stats):
+    """Fetch and parse listings, passing new or changed records downstream."""
+    while (flatshare_id := await ids.get()) is not _DONE:
+        try:
+            listing = await fetch_listing_details(client, scheduler, flatshare_id, engine, parse_pool)
+        except Exception as e:
+            stats.failed += 1
+            print(f"  Error fetching {flatshare_id}: {e}")
+            continue
+        stats.fetched += 1
+        row = {column: listing.get(column, "Unknown") for column in EMBED_COLUMNS}
+        record = build_record(row, listing.get('images', "Unknown"))
+        if current.get(record['flatshare_id']) == record[CONTENT_HASH_FIELD]:
+            stats.unchanged += 1
+            if state is not None:
+                state.record_fetch(flatshare_id, listing)
+            continue
+        # Typed fields, summary and image list are computed once here rather than per query
+        record.update(normalized_fields(record))
+        # The listing rides along so the crawl state is only updated once it's searchable
+        await records.put((time.monotonic(), record, listing))
+
+
+async def batch_records(records, batches, workers):
+    """Group records into embedding batches of up to EMBED_BATCH_SIZE."""
+    batch = []
+    done = False
+    while not done:
+        try:
+            item = await asyncio.wait_for(records.get(), timeout=BATCH_WAIT_SECONDS if batch else None)
+        except asyncio.TimeoutError:
+            item = None
+        if item is _DONE:
+            done = True
+        elif item is not None:
+            batch.append(item)
+        if batch and (done or item is None or len(batch) >= EMBED_BATCH_SIZE):
+            await batches.put(batch)
+            batch = []
+    for _ in range(workers):
+        await batches.put(_DONE)
+
+
+async def embed_batches(vectorizer, batches, loads, stats, dims, dtype):
+    while (batch := await batches.get()) is not _DONE:
+        texts = [record['json_data'] for _, record, _ in batch]
+        try:
+            embeddings = await vectorizer.aembed_many(texts, batch_size=EMBED_BATCH_SIZE, dimensions=dims)
+        except Exception as e:
+            # The vectorizer has already retried; keep the pipeline draining
+            stats.dropped += len(batch)
+            print(f"  Error embedding {len(batch)} listings: {e}")
+            continue
+        for (_, record, _), embedding in zip(batch, embeddings):
+            record[VECTOR_FIELD] = vector_bytes(embedding, dtype)
+        await loads.put(batch)
+
+
+async def load_batches(index, loads, state, stats):
+    while (batch := await loads.get()) is not _DONE:
+        try:
+            await index.load([record for _, record, _ in batch], id_field="flatshare_id")
+        except Exception as e:
+            # Left unrecorded in the crawl state, so the next run fetches them again
+            stats.dropped += len(batch)
+            print(f"  Error loading {len(batch)} listings: {e}")
+            continue
+        if state is not None:
+            for _, record, listing in batch:
+                state.record_fetch(record['flatshare_id'], listing)
+        now = time.monotonic()
+        stats.loaded += len(batch)
+        stats.latencies.extend(now - fetched_at for fetched_at, _, _ in batch)
+        print(f"Loaded {len(batch)} listings ({stats.loaded} total)")
+
+
+async def run(scheduler, engine, parse_pool, queue_size, state=None, stop_at_known=True):
+    url = redis_url()
+    # Vectors must match the existing index (see index_listings_redisvl.py --dims/--dtype)
+    dims, dtype = indexed_vector_config(url) or (VECTOR_DIMS, VECTOR_DTYPE)
+    schema = IndexSchema.from_dict(build_schema(dims, dtype))
+
+    # Change detection reads the current hashes once, up front
+    sync_index = SearchIndex(schema=schema)
+    sync_index.connect(url)
+    if not sync_index.exists():
+        sync_index.create()
+    current = existing_hashes(sync_index)
+    print(f"Found {len(current)} indexed listings")
+
+    index = AsyncSearchIndex(schema=schema, redis_url=url)
+    vectorizer = make_vectorizer(url, dims)
+    stats = Stats()
+
+    ids = asyncio.Queue(queue_size)
+    records = asyncio.Queue(queue_size)
+    batches = asyncio.Queue(EMBED_CONCURRENCY)
+    loads = asyncio.Queue(EMBED_CONCURRENCY)
+
+    async with make_client(scheduler.concurrency) as client:
+        fetchers = [
+            asyncio.create_task(fetch_and_parse(client, scheduler, engine, parse_pool, state, current, ids, records, stats))
+            for _ in range(scheduler.concurrency)
+        ]
+        batcher = asyncio.create_task(batch_records(records, batches, EMBED_CONCURRENCY))
+        embedders = [asyncio.create_task(embed_batches(vectorizer, batches, loads, stats, dims, dtype)) for _ in range(EMBED_CONCURRENCY)]
+        loader = asyncio.create_task(load_batches(index, loads, state, stats))
+
+        # Shut down stage by stage so every queued listing is flushed
+        await produce_ids(client, scheduler, state, stop_at_known, ids)
+        for _ in fetchers:
+            await ids.put(_DONE)
+        await asyncio.gather(*fetchers)
+        await records.put(_DONE)
+        await batcher
+        await asyncio.gather(*embedders)
+        await loads.put(_DONE)
+        await loader
+
+    if state is not None:
+        state.finish_run()
+    await index.disconnect()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl listings straight into the Redis index.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_HOST_RATE,
+                        help="max requests per second per host")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_HOST_CONCURRENCY,
+                        help="max requests in flight per host")
+    parser.add_argument("--parser", choices=list(ENGINES), default=DEFAULT_ENGINE,
+                        help="HTML parser engine for listing pages")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parse in this many worker processes (0 parses in the crawl loop)")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="max listings buffered between stages")
+    parser.add_argument("--state", default=STATE_PATH,
+                        help="SQLite crawl state used to skip known listings")
+    parser.add_argument("--no-state", action="store_true",
+                        help="crawl every page and listing without reading or writing the state")
+    parser.add_argument("--all-pages", action="store_true",
+                        help="page through every search page instead of stopping at known listings")
+    parser.add_argument("--refresh-days", type=float, default=REFRESH_AFTER_SECONDS / 86400,
+                        help="re-fetch known listings last fetched longer ago than this")
+    args = parser.parse_args()
+    get_parser(args.parser)
+
+    started = time.monotonic()
+    scheduler = HostScheduler(args.rate, args.concurrency)
+    state = None if args.no_state else CrawlState(args.state, refresh_after=args.refresh_days * 86400)
+    stop_at_known = not args.all_pages
+    try:
+        if args.parse_workers:
+            with ProcessPoolExecutor(max_workers=args.parse_workers) as parse_pool:
+                stats = asyncio.run(run(scheduler, args.parser, parse_pool, args.queue_size, state, stop_at_known))
+        else:
+            stats = asyncio.run(run(scheduler, args.parser, None, args.queue_size, state, stop_at_known))
+    finally:
+        if state is not None:
+            state.close()
+    print(f"Done in {time.monotonic() - started:.0f}s: {stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
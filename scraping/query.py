@@ -2,10 +2,11 @@ import os
 import json
 from dotenv import load_dotenv
 from redisvl.index import SearchIndex
-from redisvl.schema import IndexSchema
 from redisvl.query import VectorQuery
 from redisvl.utils.vectorize import OpenAITextVectorizer
 
+from listing_schema import INDEX_NAME, VECTOR_FIELD
+
 # Load environment variables
 load_dotenv()
 
@@ -21,37 +22,11 @@ def main():
 
     redis_url = f"redis://default:{redis_password}@{redis_host}:{redis_port}"
 
-    # 2. Define/Load Schema
-    # We need to provide the schema so RedisVL knows how to parse the fields back
-    schema = IndexSchema.from_dict({
-        "index": {
-            "name": "idx_flatshares_json",
-            "prefix": "doc",
-            "storage_type": "hash",
-        },
-        "fields": [
-            {"name": "flatshare_id", "type": "tag"},
-            {"name": "postcode", "type": "text"},
-            {"name": "rent", "type": "text"},
-            {"name": "room_type", "type": "text"},
-            {"name": "json_data", "type": "text"},
-            {"name": "images", "type": "text"},
-            {
-                "name": "json_vector", 
-                "type": "vector", 
-                "attrs": {
-                    "dims": 1536,
-                    "algorithm": "hnsw",
-                    "distance_metric": "cosine",
-                    "datatype": "float32"
-                }
-            }
-        ]
-    })
-
+    # 2. Load Schema
+    # The existing index's schema says how many dims and which datatype the query vector needs
     print(f"Connecting to Redis at {redis_host}...")
-    index = SearchIndex(schema=schema)
-    index.connect(redis_url)
+    index = SearchIndex.from_existing(INDEX_NAME, redis_url=redis_url)
+    vector_attrs = index.schema.fields[VECTOR_FIELD].attrs
 
     # 3. Initialize Vectorizer for the query
     print("Initializing OpenAI Vectorizer...")
@@ -63,11 +38,12 @@ def main():
     query_text = "Single or studio room in Bethnal Green"
     print(f"\nQuerying for: '{query_text}'")
     
-    query_vec = vectorizer.embed(query_text)
+    query_vec = vectorizer.embed(query_text, dimensions=vector_attrs.dims)
     
     query = VectorQuery(
         vector=query_vec,
-        vector_field_name="json_vector",
+        vector_field_name=VECTOR_FIELD,
+        dtype=vector_attrs.datatype.value.lower(),
         return_fields=["flatshare_id", "rent", "json_data"],
         num_results=3
     )
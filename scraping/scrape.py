@@ -1,11 +1,34 @@
+import os
 import re
 import csv
-import json
 import time
+import random
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
 import requests
-from bs4 import BeautifulSoup
+
+from crawl_state import REFRESH_AFTER_SECONDS, STATE_PATH, CrawlState
+from listing_parser import DEFAULT_ENGINE, ENGINES, get_parser, parse_listing
 
 SEARCH_ID = '1400760814'
+# Overridable so crawls can be tested against a local fixture server
+BASE_URL = os.getenv('SPAREROOM_BASE_URL', 'https://www.spareroom.co.uk')
+SEARCH_URL = f'{BASE_URL}/flatshare/'
+DETAIL_URL = f'{BASE_URL}/flatshare/flatshare_detail.pl'
+SEARCH_OFFSETS = range(0, 990, 10)
+
+# Politeness budget per host: at most RATE requests/second and CONCURRENCY in flight
+DEFAULT_HOST_RATE = 1.0
+DEFAULT_HOST_CONCURRENCY = 4
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 # Shared cookies and headers
 cookies = {
@@ -52,166 +75,315 @@ headers = {
 }
 
 
-def get_flatshare_ids(offset):
-    """Fetch flatshare IDs from a search results page."""
-    params = {
+def search_params(offset):
+    return {
         'offset': str(offset),
         'search_id': SEARCH_ID,
         'sort_by': 'by_day',
         'mode': 'list',
     }
+
+
+def detail_params(flatshare_id):
+    return {
+        'flatshare_id': flatshare_id,
+        'search_id': '1400724683',
+    }
+
+
+def parse_flatshare_ids(html):
+    """Extract the flatshare IDs linked from a search results page."""
+    flatshare_ids = re.findall(r'flatshare_id=(\d+)', html)
+    return list(set(flatshare_ids))
+
+
+def get_flatshare_ids(offset):
+    """Fetch flatshare IDs from a search results page."""
     response = requests.get(
-        'https://www.spareroom.co.uk/flatshare/',
-        params=params,
+        SEARCH_URL,
+        params=search_params(offset),
         cookies=cookies,
         headers=headers
     )
-    flatshare_ids = re.findall(r'flatshare_id=(\d+)', response.text)
-    return list(set(flatshare_ids))
+    return parse_flatshare_ids(response.text)
 
 
 def get_listing_details(flatshare_id):
     """Fetch and parse listing details for a specific flatshare ID."""
-    params = {
-        'flatshare_id': flatshare_id,
-        'search_id': '1400724683',
-    }
     response = requests.get(
-        'https://www.spareroom.co.uk/flatshare/flatshare_detail.pl',
-        params=params,
+        DETAIL_URL,
+        params=detail_params(flatshare_id),
         cookies=cookies,
         headers=headers,
     )
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    listing = {'flatshare_id': flatshare_id}
-    
-    # Detail (description)
-    desc_elem = soup.find('p', class_='detaildesc')
-    if desc_elem:
-        listing['detail'] = desc_elem.get_text(strip=True)
-    
-    # Key features (property type, location, postcode, station)
-    key_features = soup.find('ul', class_='key-features')
-    if key_features:
-        features = key_features.find_all('li', class_='key-features__feature')
-        for i, f in enumerate(features):
-            text = f.get_text(strip=True)
-            if i == 0:
-                listing['property_type'] = text
-            elif i == 1:
-                listing['location'] = text
-            elif i == 2:
-                listing['postcode'] = text.split()[0] if text else text
-            elif i == 3:
-                station_name = f.get_text(strip=True).split('Tube map')[0].strip()
-                listing['station'] = station_name
-                distance_elem = f.find('small', class_='key-features__station-distance')
-                if distance_elem:
-                    listing['station_distance'] = distance_elem.get_text(strip=True)
-    
-    # Feature sections - extract all key/value pairs as flat features
-    feature_sections = soup.find_all('section', class_='feature')
-    for section in feature_sections:
-        # Special case: price section - the dt contains the rent, dd contains room type
-        if 'feature--price_room_only' in section.get('class', []):
-            feature_list = section.find('dl', class_='feature-list')
-            if feature_list:
-                key_elem = feature_list.find('dt', class_='feature-list__key')
-                value_elem = feature_list.find('dd', class_='feature-list__value')
-                if key_elem:
-                    listing['rent'] = key_elem.get_text(strip=True)
-                if value_elem:
-                    listing['room_type'] = value_elem.get_text(strip=True)
-            continue
-        
-        feature_list = section.find('dl', class_='feature-list')
-        if feature_list:
-            keys = feature_list.find_all('dt', class_='feature-list__key')
-            values = feature_list.find_all('dd', class_='feature-list__value')
-            for k, v in zip(keys, values):
-                key_text = k.get_text(strip=True)
-                value_text = v.get_text(strip=True)
-                # Clean up key names - normalize whitespace, remove special chars
-                key_name = ' '.join(key_text.split())  # Normalize whitespace
-                key_name = key_name.lower().replace(' ', '_').replace('?', '').replace('#', 'num').replace('/', '_')
-                listing[key_name] = value_text
-    
-    # Extract photo URLs from the photo gallery
-    photo_links = soup.find_all('a', class_='photo-gallery__thumbnail-link')
-    images = []
-    for link in photo_links:
-        href = link.get('href')
-        if href:
-            images.append(href)
-    listing['images'] = json.dumps(images)
-    
-    return listing
+    return parse_listing_details(flatshare_id, response.text)
 
 
-def main():
-    # Step 1: Collect all flatshare IDs
-    print("=== Step 1: Collecting flatshare IDs ===")
-    all_flatshare_ids = []
-    
-    for offset in range(0, 990, 10):
-        print(f"Fetching offset {offset}...")
-        ids = get_flatshare_ids(offset)
-        all_flatshare_ids.extend(ids)
-        print(f"  Found {len(ids)} IDs (total so far: {len(all_flatshare_ids)})")
-        
-        if offset < 990:  # Don't sleep after the last request
-            time.sleep(5)
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_ids = []
-    for id in all_flatshare_ids:
-        if id not in seen:
-            seen.add(id)
-            unique_ids.append(id)
-    
-    print(f"\nTotal unique flatshare IDs: {len(unique_ids)}")
-    
-    # Save IDs to CSV
-    with open('flatshare_ids.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['flatshare_id'])
-        for id in unique_ids:
-            writer.writerow([id])
-    print("Saved flatshare IDs to flatshare_ids.csv")
-    
-    # Step 2: Fetch details for each listing
-    print("\n=== Step 2: Fetching listing details ===")
-    all_listings = []
+def parse_listing_details(flatshare_id, html, engine=DEFAULT_ENGINE):
+    """Parse a listing detail page into a flat dict of features."""
+    return parse_listing(flatshare_id, html, engine)
+
+
+class HostScheduler:
+    """Per-host politeness: spaces request starts by 1/rate and caps requests in flight."""
+
+    def __init__(self, rate=DEFAULT_HOST_RATE, concurrency=DEFAULT_HOST_CONCURRENCY):
+        self.interval = 1.0 / rate
+        self.concurrency = concurrency
+        self._semaphores = {}
+        self._next_start = {}
+        self._locks = {}
+
+    def _host_state(self, host):
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+            self._locks[host] = asyncio.Lock()
+            self._next_start[host] = 0.0
+        return self._semaphores[host], self._locks[host]
+
+    async def wait_turn(self, host):
+        """Sleep until this host's next request slot."""
+        _, lock = self._host_state(host)
+        async with lock:
+            now = time.monotonic()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def pause(self, host, seconds):
+        """Push back every pending request to a host (e.g. after a 429)."""
+        self._next_start[host] = max(self._next_start.get(host, 0.0), time.monotonic() + seconds)
+
+    def slot(self, host):
+        semaphore, _ = self._host_state(host)
+        return semaphore
+
+
+def _retry_after(response):
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+async def fetch(client, scheduler, url, params, retries=MAX_RETRIES):
+    """GET a page within the host's budget, retrying transient failures with jittered backoff."""
+    host = urlsplit(url).hostname
+    for attempt in range(retries + 1):
+        async with scheduler.slot(host):
+            await scheduler.wait_turn(host)
+            response = None
+            try:
+                response = await client.get(url, params=params)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.text
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+        if attempt == retries:
+            raise RuntimeError(f"{url} failed after {retries + 1} attempts ({error})")
+        delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if response is not None and response.status_code == 429:
+            # The host asked us to slow down; hold back every worker, not just this one
+            await scheduler.pause(host, delay)
+        print(f"  Retrying {params} in {delay:.1f}s ({error})")
+        await asyncio.sleep(delay)
+
+
+async def fetch_flatshare_ids(client, scheduler, offset):
+    """Async get_flatshare_ids."""
+    return parse_flatshare_ids(await fetch(client, scheduler, SEARCH_URL, search_params(offset)))
+
+
+async def fetch_listing_details(client, scheduler, flatshare_id, engine=DEFAULT_ENGINE, parse_pool=None):
+    """Async get_listing_details; with a parse_pool, parsing runs in a worker process."""
+    html = await fetch(client, scheduler, DETAIL_URL, detail_params(flatshare_id))
+    if parse_pool is None:
+        return parse_listing_details(flatshare_id, html, engine)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parse_pool, parse_listing, flatshare_id, html, engine)
+
+
+def make_client(concurrency):
+    """One pooled client for the whole crawl, so connections are reused across requests."""
+    return httpx.AsyncClient(
+        cookies=cookies,
+        headers=headers,
+        timeout=REQUEST_TIMEOUT_SECONDS,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    )
+
+
+async def search_page(client, scheduler, offset):
+    """IDs on one search page ([] on failure, after retries)."""
+    try:
+        ids = await fetch_flatshare_ids(client, scheduler, offset)
+    except Exception as e:
+        print(f"  Error fetching offset {offset}: {e}")
+        return []
+    print(f"Fetched offset {offset}: found {len(ids)} IDs")
+    return ids
+
+
+async def ids_to_fetch(client, scheduler, state=None, stop_at_known=True):
+    """Yield the flatshare IDs whose detail pages should be fetched.
+
+    Without a state store every search page is fetched and every ID yielded.
+    With one, pages are fetched a window at a time and paging stops at the
+    first page with no new listings (results are sorted by day); new IDs are
+    yielded as they are found, then known listings due for a refresh.
+    """
+    if state is None:
+        pages = await asyncio.gather(*(search_page(client, scheduler, offset) for offset in SEARCH_OFFSETS))
+        # Remove duplicates while preserving page order
+        for id in dict.fromkeys(id for ids in pages for id in ids):
+            yield id
+        return
+
+    start = state.start_run()
+    offsets = [offset for offset in SEARCH_OFFSETS if offset >= start]
+    yielded = set()
+    stopped = False
+    for i in range(0, len(offsets), scheduler.concurrency):
+        if stopped:
+            break
+        window = offsets[i:i + scheduler.concurrency]
+        pages = await asyncio.gather(*(search_page(client, scheduler, offset) for offset in window))
+        for offset, ids in zip(window, pages):
+            new_ids = state.mark_seen(ids)
+            for id in new_ids:
+                yielded.add(id)
+                yield id
+            if stop_at_known and ids and not new_ids:
+                print(f"Offset {offset} has no new listings, stopping")
+                stopped = True
+                # A resumed run must not page past this point either
+                state.page_done(SEARCH_OFFSETS.stop)
+                break
+            state.page_done(offset + SEARCH_OFFSETS.step)
+
+    for id in state.due():
+        if id not in yielded:
+            yield id
+
+
+async def crawl(scheduler, engine=DEFAULT_ENGINE, parse_pool=None, state=None, stop_at_known=True):
+    async with make_client(scheduler.concurrency) as client:
+        # Step 1: Collect the flatshare IDs to fetch
+        print("=== Step 1: Collecting flatshare IDs ===")
+        unique_ids = [id async for id in ids_to_fetch(client, scheduler, state, stop_at_known)]
+        print(f"\nFlatshare IDs to fetch: {len(unique_ids)}")
+
+        # Save IDs to CSV
+        with open('flatshare_ids.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['flatshare_id'])
+            for id in unique_ids:
+                writer.writerow([id])
+        print("Saved flatshare IDs to flatshare_ids.csv")
+
+        # Step 2: Fetch details for each listing
+        print("\n=== Step 2: Fetching listing details ===")
+        done = 0
+        changed = 0
+
+        async def listing(flatshare_id):
+            nonlocal done, changed
+            try:
+                result = await fetch_listing_details(client, scheduler, flatshare_id, engine, parse_pool)
+            except Exception as e:
+                print(f"  Error fetching {flatshare_id}: {e}")
+                return None
+            done += 1
+            # Committed per listing, so an interrupted run skips it on resume
+            if state is not None and state.record_fetch(flatshare_id, result):
+                changed += 1
+            print(f"Fetched listing {done}/{len(unique_ids)}: {flatshare_id}")
+            return result
+
+        results = await asyncio.gather(*(listing(flatshare_id) for flatshare_id in unique_ids))
+
+    if state is not None:
+        state.finish_run()
+        print(f"{changed} new or changed listings")
+    return [r for r in results if r is not None]
+
+
+def write_listings_csv(all_listings, path=f'listings-{SEARCH_ID}.csv'):
     all_keys = set()
-    
-    for i, flatshare_id in enumerate(unique_ids):
-        print(f"Fetching listing {i+1}/{len(unique_ids)}: {flatshare_id}...")
-        try:
-            listing = get_listing_details(flatshare_id)
-            all_listings.append(listing)
-            all_keys.update(listing.keys())
-        except Exception as e:
-            print(f"  Error fetching {flatshare_id}: {e}")
-        
-        if i < len(unique_ids) - 1:  # Don't sleep after the last request
-            time.sleep(1)
-    
+    for listing in all_listings:
+        all_keys.update(listing.keys())
+
     # Save listings to CSV
     # Sort keys for consistent column order, but keep flatshare_id first
     sorted_keys = ['flatshare_id'] + sorted(k for k in all_keys if k != 'flatshare_id')
-    
-    with open(f'listings-{SEARCH_ID}.csv', 'w', newline='', encoding='utf-8') as f:
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=sorted_keys, extrasaction='ignore')
         writer.writeheader()
         for listing in all_listings:
             writer.writerow(listing)
-    
-    print(f"\nSaved {len(all_listings)} listings to listings.csv")
-    print("Done!")
+
+    print(f"\nSaved {len(all_listings)} listings to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl SpareRoom search results and listing details.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_HOST_RATE,
+                        help="max requests per second per host")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_HOST_CONCURRENCY,
+                        help="max requests in flight per host")
+    parser.add_argument("--parser", choices=list(ENGINES), default=DEFAULT_ENGINE,
+                        help="HTML parser engine for listing pages")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parse in this many worker processes (0 parses in the crawl loop)")
+    parser.add_argument("--state", default=STATE_PATH,
+                        help="SQLite crawl state used to skip known listings")
+    parser.add_argument("--no-state", action="store_true",
+                        help="crawl every page and listing without reading or writing the state")
+    parser.add_argument("--all-pages", action="store_true",
+                        help="page through every search page instead of stopping at known listings")
+    parser.add_argument("--refresh-days", type=float, default=REFRESH_AFTER_SECONDS / 86400,
+                        help="re-fetch known listings last fetched longer ago than this")
+    parser.add_argument("--store", default='scraping/listings',
+                        help="Parquet listing store the fetched listings are appended to (needs pyarrow)")
+    parser.add_argument("--no-store", action="store_true",
+                        help="don't write the Parquet listing store")
+    parser.add_argument("--csv", action="store_true",
+                        help=f"also write listings-{SEARCH_ID}.csv (every active listing when using state)")
+    args = parser.parse_args()
+    get_parser(args.parser)
+    if not args.no_store:
+        # Imported before crawling so a missing pyarrow fails fast, not after the crawl
+        from listing_store import write_listings
+
+    started = time.monotonic()
+    scheduler = HostScheduler(args.rate, args.concurrency)
+    state = None if args.no_state else CrawlState(args.state, refresh_after=args.refresh_days * 86400)
+    stop_at_known = not args.all_pages
+    try:
+        if args.parse_workers:
+            with ProcessPoolExecutor(max_workers=args.parse_workers) as parse_pool:
+                all_listings = asyncio.run(crawl(scheduler, args.parser, parse_pool, state, stop_at_known))
+        else:
+            all_listings = asyncio.run(crawl(scheduler, args.parser, None, state, stop_at_known))
+        if not args.no_store:
+            # Only this crawl's fetches are appended; earlier partitions hold the rest
+            write_listings(all_listings, args.store)
+        if args.csv:
+            write_listings_csv(state.active_listings() if state is not None else all_listings)
+    finally:
+        if state is not None:
+            state.close()
+    print(f"Done in {time.monotonic() - started:.0f}s!")
 
 
 if __name__ == '__main__':
     main()
-
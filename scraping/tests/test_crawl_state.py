@@ -0,0 +1,45 @@
+import unittest
+
+from crawl_state import ACTIVE_SECONDS, REFRESH_AFTER_SECONDS, CrawlState
+
+DAY = 24 * 3600
+
+
+class CrawlStateTest(unittest.TestCase):
+    def setUp(self):
+        self.state = CrawlState(":memory:")
+
+    def tearDown(self):
+        self.state.close()
+
+    def _age(self, seconds):
+        """Move every recorded timestamp `seconds` into the past."""
+        with self.state.db:
+            self.state.db.execute(
+                "UPDATE listings SET first_seen = first_seen - ?, last_seen = last_seen - ?, "
+                "last_fetched = last_fetched - ?",
+                (seconds, seconds, seconds),
+            )
+
+    def test_listing_only_refreshed_stays_active(self):
+        # Seen once in search results, then only reached through refreshes
+        self.state.mark_seen(["1"])
+        self.state.record_fetch("1", {"flatshare_id": "1"})
+        for _ in range(ACTIVE_SECONDS // REFRESH_AFTER_SECONDS + 1):
+            self._age(REFRESH_AFTER_SECONDS + DAY)
+            self.assertEqual(self.state.due(), ["1"])
+            self.state.record_fetch("1", {"flatshare_id": "1"})
+
+        self.assertEqual(self.state.active_listings(), [{"flatshare_id": "1"}])
+
+    def test_listing_gone_from_search_and_detail_expires(self):
+        self.state.mark_seen(["1"])
+        self.state.record_fetch("1", {"flatshare_id": "1"})
+        self._age(ACTIVE_SECONDS + DAY)
+
+        self.assertEqual(self.state.due(), [])
+        self.assertEqual(self.state.active_listings(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from distributed_crawl import Frontier
+
+
+@unittest.skipIf(fakeredis is None, "needs fakeredis[lua]")
+class FrontierLeaseTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeAsyncRedis()
+        self.frontier = Frontier(self.redis, prefix="test", visibility_timeout=0.05, max_attempts=3)
+        await self.frontier.enqueue(["1"])
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def test_late_fail_after_lease_expiry_is_ignored(self):
+        _, stale = await self.frontier.pop()
+        await asyncio.sleep(0.1)
+        # The expired lease is requeued and picked up by a second worker
+        flatshare_id, current = await self.frontier.pop()
+
+        self.assertFalse(await self.frontier.fail(flatshare_id, stale))
+        status = await self.frontier.status()
+        self.assertEqual((status["queued"], status["in_flight"]), (0, 1))
+        self.assertEqual(int(await self.redis.hget(self.frontier.attempts, "1")), 1)
+
+        self.assertTrue(await self.frontier.ack(flatshare_id, current, {"flatshare_id": "1"}))
+        self.assertEqual(await self.frontier.listings(), [{"flatshare_id": "1"}])
+
+    async def test_late_ack_after_lease_expiry_is_ignored(self):
+        flatshare_id, stale = await self.frontier.pop()
+        await asyncio.sleep(0.1)
+        await self.frontier.pop()
+
+        self.assertFalse(await self.frontier.ack(flatshare_id, stale, {"flatshare_id": "1"}))
+        self.assertEqual(await self.frontier.listings(), [])
+        self.assertEqual((await self.frontier.status())["in_flight"], 1)
+
+    async def test_fail_requeues_then_dead_letters(self):
+        for _ in range(2):
+            flatshare_id, lease = await self.frontier.pop()
+            self.assertTrue(await self.frontier.fail(flatshare_id, lease))
+        self.assertEqual((await self.frontier.status())["queued"], 1)
+
+        flatshare_id, lease = await self.frontier.pop()
+        self.assertTrue(await self.frontier.fail(flatshare_id, lease))
+        status = await self.frontier.status()
+        self.assertEqual((status["queued"], status["in_flight"], status["dead"]), (0, 0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()